@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AnimeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'anime'
+
+    def ready(self):
+        # Dirty-tracking for materialized recommendations.
+        from . import signals  # noqa: F401
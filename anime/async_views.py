@@ -0,0 +1,211 @@
+"""
+Async versions of the AniList-bound views, routed instead of the sync ones when
+settings.ASYNC_VIEWS is on (gunicorn.conf.py sets it for GUNICORN_ASGI deployments).
+
+A request waiting on AniList awaits the shared httpx client instead of holding a worker
+thread; reads of the recommendation and genre caches use the async ORM. Writes and the
+recommendation recompute stay sync and run through sync_to_async.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.anilist import AniListAPI
+from core.async_views import AsyncAPIView
+from core.conditional import not_modified, set_cache_headers
+from core.debuglog import log_payload
+from users.authentication import NO_GENRES_DIGEST, aclaimed_genres_digest, aget_profile, genres_digest
+
+from .genres import aensure_genre_catalog
+from .ingest import upsert_media
+from .models import UserRecommendationCache
+from .projection import AnimeProjection, ProjectionError
+from .recommendations import aranked_anime, refresh_recommendations
+from .response_cache import get_recommendation_response_cache
+from .search import alocal_search
+from .views import AnimeGenresView, AnimeRecommendationsView, AnimeSearchView
+
+logger = logging.getLogger(__name__)
+
+
+def schema_of(handler):
+    """Document an async handler with its sync counterpart's swagger_auto_schema."""
+    def decorator(func):
+        func._swagger_auto_schema = handler._swagger_auto_schema
+        return func
+    return decorator
+
+
+class AsyncAnimeSearchView(AsyncAPIView, AnimeSearchView):
+
+    @schema_of(AnimeSearchView.get)
+    async def get(self, request):
+        try:
+            projection = AnimeProjection.from_request(request)
+        except ProjectionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            search_query = request.query_params.get('q', '')
+            genre = request.query_params.get('genre', '')
+            page = int(request.query_params.get('page', 1))
+
+            logger.info(f"Searching for anime with query: {search_query}, genre: {genre}, page: {page}")
+
+            # Answer from the local catalog when it has enough matches for this page
+            if getattr(settings, 'LOCAL_SEARCH_ENABLED', True):
+                local = await alocal_search(search_query, genre, page, projection=projection)
+                if local is not None:
+                    page_info, cached_anime = local
+                    return self.results_response(
+                        request, projection, page_info, cached_anime, 'local', (search_query, genre, page)
+                    )
+
+            # Search AniList API; the event loop serves other requests meanwhile
+            response = await AniListAPI.asearch_anime(
+                search=search_query,
+                genre=genre,
+                page=page
+            )
+
+            log_payload(logger, "AniList API response", response)
+
+            if not response.get('data'):
+                logger.error("No data in AniList search response: %s", response.get('errors'))
+                return Response({'error': 'No results found'}, status=status.HTTP_404_NOT_FOUND)
+
+            page_data = response.get('data', {}).get('Page', {})
+            media_list = page_data.get('media', [])
+
+            if not media_list:
+                logger.warning(f"No media found in response for query: {search_query}")
+                return Response({
+                    'page_info': page_data.get('pageInfo', {}),
+                    'results': [],
+                    'source': 'anilist'
+                })
+
+            # Cache the results
+            cached_anime = await sync_to_async(upsert_media)(media_list)
+
+            return self.results_response(
+                request, projection, page_data.get('pageInfo', {}), cached_anime, 'anilist',
+                (search_query, genre, page)
+            )
+
+        except Exception as e:
+            logger.error(f"Error in anime search: {str(e)}", exc_info=True)
+            return Response(
+                {'error': 'Failed to fetch anime data. Please try again later.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class AsyncAnimeRecommendationsView(AsyncAPIView, AnimeRecommendationsView):
+
+    async def arevalidate(self, user_id):
+        # Scheduling takes a lock in the shared cache: file or network I/O.
+        await sync_to_async(self.revalidate, thread_sensitive=False)(user_id)
+
+    async def aranked_response(self, request, cache, user_id, projection):
+        if self.serves_snapshot(cache):
+            return self.snapshot_response(request, cache, user_id, projection)
+        return self.list_response(await aranked_anime(cache.ranked_anime_ids, user_id, projection), projection)
+
+    async def abuild_response(self, request, user_id, projection):
+        cache = await UserRecommendationCache.objects.filter(user_id=user_id).afirst()
+        age = timezone.now() - cache.updated_at if cache is not None else None
+
+        if cache is not None and cache.ranked_anime_ids and not cache.dirty and age < self.hard_expiry():
+            if age >= self.CACHE_DURATION:
+                await self.arevalidate(user_id)
+            return await self.aranked_response(request, cache, user_id, projection)
+
+        digest = await aclaimed_genres_digest(request.user)
+        if digest == NO_GENRES_DIGEST:
+            return self.no_genres_response()
+        if (digest is not None and cache is not None and cache.ranked_anime_ids
+                and digest == genres_digest(cache.favorite_genres) and age < self.hard_expiry()):
+            await self.arevalidate(user_id)
+            return await self.aranked_response(request, cache, user_id, projection)
+
+        favorite_genres = (await aget_profile(request.user)).favorite_genres
+
+        if not favorite_genres:
+            return self.no_genres_response()
+
+        if cache is None:
+            cache, _ = await UserRecommendationCache.objects.aget_or_create(
+                user_id=user_id,
+                defaults={'favorite_genres': favorite_genres}
+            )
+            age = timezone.now() - cache.updated_at
+
+        genres_unchanged = set(cache.favorite_genres) == set(favorite_genres)
+        if cache.ranked_anime_ids and genres_unchanged and age < self.hard_expiry():
+            await self.arevalidate(user_id)
+            return await self.aranked_response(request, cache, user_id, projection)
+
+        # Recomputing reads the user's history, may call AniList and writes the row;
+        # rare enough to run as one sync block in a thread.
+        recommended_anime = await sync_to_async(refresh_recommendations)(cache, favorite_genres)
+
+        if recommended_anime is None:
+            return Response({'error': 'No recommendations found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return self.list_response(recommended_anime, projection)
+
+    @schema_of(AnimeRecommendationsView.get)
+    async def get(self, request):
+        try:
+            projection = AnimeProjection.from_request(request)
+        except ProjectionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user_id = request.user.id
+            variant = self.response_variant(request, projection)
+            if variant is not None:
+                cached = await get_recommendation_response_cache().aget(user_id, variant)
+                if cached is not None:
+                    return self.cached_response(request, cached)
+                version = await get_recommendation_response_cache().aversion(user_id)
+
+            response = await self.abuild_response(request, user_id, projection)
+            if variant is not None and response.status_code == status.HTTP_200_OK:
+                await get_recommendation_response_cache().astore(user_id, version, variant, self.cache_entry(response))
+            return response
+
+        except Exception as e:
+            logger.error(f"Error in anime recommendations: {str(e)}")
+            return Response(
+                {'error': 'Failed to fetch recommendations. Please try again later.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class AsyncAnimeGenresView(AsyncAPIView, AnimeGenresView):
+
+    @schema_of(AnimeGenresView.get)
+    async def get(self, request):
+        try:
+            catalog = await aensure_genre_catalog()
+
+            etag = catalog.etag(request)
+            response = not_modified(request, etag, catalog.last_modified, self.CACHE_CONTROL)
+            if response is not None:
+                return response
+
+            response = Response(catalog.body)
+            return set_cache_headers(response, etag, catalog.last_modified, self.CACHE_CONTROL)
+
+        except Exception as e:
+            logger.error(f"Error fetching genres: {str(e)}", exc_info=True)
+            return Response(
+                {'error': 'Failed to fetch genres. Please try again later.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
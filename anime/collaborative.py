@@ -0,0 +1,186 @@
+import logging
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from users.models import AnimePreference
+
+from .models import AnimeNeighbors
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+NeighborTable = Dict[int, Tuple[List[int], List[float]]]
+
+
+class RatingMatrix:
+    """
+    Sparse user x anime rating matrix in CSR form.
+
+    Ratings are mean-centred per user (adjusted cosine), so a 9 from a generous rater
+    and a 6 from a harsh one can point in the same direction.
+    """
+
+    def __init__(self, matrix: 'sparse.csr_matrix', user_ids: np.ndarray, anime_ids: np.ndarray):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        self.anime_ids = anime_ids
+        self.column_of = {int(anime_id): column for column, anime_id in enumerate(anime_ids)}
+
+    @classmethod
+    def from_triples(cls, user_ids: np.ndarray, anime_ids: np.ndarray, ratings: np.ndarray) -> 'RatingMatrix':
+        unique_users, rows = np.unique(user_ids, return_inverse=True)
+        unique_anime, columns = np.unique(anime_ids, return_inverse=True)
+        values = ratings.astype(np.float32)
+
+        counts = np.bincount(rows, minlength=len(unique_users))
+        means = np.bincount(rows, weights=values, minlength=len(unique_users)) / np.maximum(counts, 1)
+        values = values - means[rows].astype(np.float32)
+
+        # scipy is only needed to build neighbours offline; keep it out of web workers.
+        from scipy import sparse
+
+        matrix = sparse.csr_matrix(
+            (values, (rows, columns)),
+            shape=(len(unique_users), len(unique_anime)),
+            dtype=np.float32,
+        )
+        matrix.eliminate_zeros()
+        return cls(matrix, unique_users, unique_anime)
+
+    @classmethod
+    def from_preferences(cls) -> 'RatingMatrix':
+        triples = np.array(
+            list(AnimePreference.objects.values_list('user_id', 'anime_id', 'rating').iterator(chunk_size=10000)),
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        return cls.from_triples(triples[:, 0], triples[:, 1], triples[:, 2])
+
+    def item_neighbors(self, top_n: int = 50, anime_ids: Optional[Iterable[int]] = None,
+                       chunk_size: int = 512, min_similarity: float = 0.0) -> NeighborTable:
+        """
+        Top-N cosine neighbours for each requested anime (all anime by default).
+
+        Similarities are computed a column chunk at a time (chunk x items dense block), so
+        memory stays bounded regardless of catalog size.
+        """
+        from scipy import sparse
+
+        matrix = self.matrix.tocsc()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+        normalized = (matrix @ sparse.diags(1.0 / np.maximum(norms, 1e-9))).astype(np.float32).tocsc()
+        normalized_t = normalized.T.tocsr()
+
+        if anime_ids is None:
+            columns = np.arange(len(self.anime_ids))
+        else:
+            columns = np.array([self.column_of[a] for a in anime_ids if a in self.column_of], dtype=np.int64)
+
+        n_items = len(self.anime_ids)
+        k = min(top_n, n_items - 1)
+        table: NeighborTable = {}
+        if k <= 0:
+            return table
+
+        for start in range(0, len(columns), chunk_size):
+            chunk = columns[start:start + chunk_size]
+            similarities = (normalized_t[chunk] @ normalized).toarray()
+            similarities[np.arange(len(chunk)), chunk] = -np.inf
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(similarities, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for row, column in enumerate(chunk):
+                keep = top_scores[row] > min_similarity
+                table[int(self.anime_ids[column])] = (
+                    self.anime_ids[top[row][keep]].tolist(),
+                    top_scores[row][keep].round(6).tolist(),
+                )
+        return table
+
+
+def store_neighbors(table: NeighborTable, batch_size: int = 1000) -> int:
+    """Upsert the neighbour table with one INSERT ... ON CONFLICT per batch."""
+    rows = [
+        AnimeNeighbors(anime_id=anime_id, neighbor_ids=neighbor_ids, similarities=similarities)
+        for anime_id, (neighbor_ids, similarities) in table.items()
+    ]
+    AnimeNeighbors.objects.bulk_create(
+        rows,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['anime_id'],
+        update_fields=['neighbor_ids', 'similarities', 'updated_at'],
+    )
+    return len(rows)
+
+
+def rebuild_neighbors(top_n: int = 50, incremental: bool = False) -> int:
+    """
+    Recompute the neighbour table from AnimePreference.
+
+    With incremental=True only anime rated since the last build are recomputed; their
+    neighbours' rows catch up on the next full build.
+    """
+    started = time.perf_counter()
+    anime_ids = None
+    if incremental:
+        last_build = AnimeNeighbors.objects.order_by('-updated_at').values_list('updated_at', flat=True).first()
+        if last_build is not None:
+            anime_ids = set(
+                AnimePreference.objects.filter(updated_at__gt=last_build).values_list('anime_id', flat=True)
+            )
+            if not anime_ids:
+                return 0
+
+    ratings = RatingMatrix.from_preferences()
+    table = ratings.item_neighbors(top_n=top_n, anime_ids=anime_ids)
+    stored = store_neighbors(table)
+    logger.info(
+        f"Stored neighbours for {stored} anime from {ratings.matrix.nnz} ratings "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return stored
+
+
+def score_from_neighbors(ratings: Dict[int, int], neighbors: NeighborTable,
+                         exclude: Iterable[int] = (), k: int = 10) -> List[Tuple[int, float]]:
+    """
+    Item-item prediction: each rated anime votes for its neighbours with
+    similarity x (rating - user's mean rating).
+    """
+    if not ratings:
+        return []
+    mean = sum(ratings.values()) / len(ratings)
+    scores = defaultdict(float)
+    for anime_id, rating in ratings.items():
+        neighbor_ids, similarities = neighbors.get(anime_id, ((), ()))
+        weight = rating - mean
+        if weight == 0:
+            # A single rating (or a flat rater) carries no relative signal; treat it as a like.
+            weight = 1.0 if rating >= 6 else -1.0
+        for neighbor_id, similarity in zip(neighbor_ids, similarities):
+            scores[neighbor_id] += similarity * weight
+
+    skip = set(exclude) | set(ratings)
+    ranked = sorted(
+        ((anime_id, score) for anime_id, score in scores.items() if score > 0 and anime_id not in skip),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return ranked[:k]
+
+
+def load_neighbors(anime_ids: Iterable[int]) -> NeighborTable:
+    """Precomputed neighbour lists for the given anime, in one query."""
+    return {
+        anime_id: (neighbor_ids, similarities)
+        for anime_id, neighbor_ids, similarities in AnimeNeighbors.objects.filter(
+            anime_id__in=list(anime_ids)
+        ).values_list('anime_id', 'neighbor_ids', 'similarities')
+    }
@@ -0,0 +1,92 @@
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.anilist import AniListAPI
+from core.swr import get_revalidator
+
+from .ingest import upsert_media
+from .models import CachedAnime
+from .projection import AnimeProjection
+
+logger = logging.getLogger(__name__)
+
+# How long a CachedAnime row is trusted, by AniList status: airing shows change weekly
+# (episodes, scores), finished ones hardly at all.
+DEFAULT_MAX_AGES = {
+    'RELEASING': timedelta(hours=6),
+    'NOT_YET_RELEASED': timedelta(days=1),
+    'default': timedelta(days=7),
+}
+
+
+def max_age(anime: CachedAnime) -> timedelta:
+    ages = {**DEFAULT_MAX_AGES, **getattr(settings, 'ANIME_DETAIL_MAX_AGES', {})}
+    return ages.get(anime.status, ages['default'])
+
+
+def is_stale(anime: CachedAnime, now=None) -> bool:
+    checked = anime.fetched_at or anime.updated_at
+    return checked is None or (now or timezone.now()) - checked > max_age(anime)
+
+
+def refresh_anime(anime_ids: List[int], use_cache: bool = True, refetch: Iterable[int] = ()) -> Dict[int, CachedAnime]:
+    """
+    Fetch anime from AniList in batched id_in requests and upsert them; {anime_id: row}.
+
+    Ids in refetch (and all ids with use_cache=False) bypass the AniList response cache:
+    upsert_media stamps rows fetched now, so they must not come from an old response.
+    """
+    media = AniListAPI.get_anime_details_batch(anime_ids, use_cache=use_cache, refetch=refetch)
+    return {anime.anime_id: anime for anime in upsert_media(list(media.values()))}
+
+
+def revalidate_anime(anime_ids: List[int]):
+    get_revalidator().submit(
+        f'anime-details:{",".join(map(str, sorted(anime_ids)))}',
+        lambda: refresh_anime(anime_ids, use_cache=False)
+    )
+
+
+def load_anime(anime_ids: List[int], projection: Optional[AnimeProjection] = None
+               ) -> Tuple[List[CachedAnime], List[int], List[int]]:
+    """
+    CachedAnime for the given AniList ids, in request order, plus the ids AniList does
+    not know (missing) and the ids that could not be fetched because the AniList request
+    failed (unavailable).
+
+    Rows come from one in_bulk. Ids not cached yet are fetched (together with any stale
+    ones) in one batched AniList request; when everything is cached, stale rows are
+    served as they are and refreshed in the background. A failed fetch never turns an
+    id into missing: callers must not present an unavailable id as nonexistent, nor
+    cache a result that has unavailable ids.
+    """
+    anime_ids = list(dict.fromkeys(anime_ids))
+    queryset = CachedAnime.objects.all()
+    if projection is not None:
+        queryset = projection.apply(queryset)
+    found = queryset.in_bulk(anime_ids, field_name='anime_id')
+
+    now = timezone.now()
+    missing = [anime_id for anime_id in anime_ids if anime_id not in found]
+    stale = [anime_id for anime_id, anime in found.items() if is_stale(anime, now)]
+
+    unavailable = []
+    if missing:
+        # Missing ids may come from the response cache; stale rows need AniList itself.
+        try:
+            found.update(refresh_anime(missing + stale, refetch=stale))
+        except Exception as e:
+            logger.error(f"Error fetching anime details from AniList: {str(e)}")
+            unavailable = missing
+            if stale:
+                revalidate_anime(stale)
+    elif stale:
+        revalidate_anime(stale)
+
+    return [found[anime_id] for anime_id in anime_ids if anime_id in found], \
+        [anime_id for anime_id in anime_ids if anime_id not in found and anime_id not in unavailable], \
+        unavailable
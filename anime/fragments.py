@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+from core.renderers import RenderedJSON, dumps, join_rendered
+from core.timing import record_cache, timed
+
+from .models import CachedAnime
+from .projection import AnimeProjection
+
+
+class AnimeFragmentCache:
+    """
+    Per-process LRU of CachedAnimeSerializer output rendered to JSON bytes.
+
+    Entries are keyed by (projection, anime_id) and tagged with the row's updated_at, so
+    a row changed by upsert_media misses and is re-serialized. List responses are
+    assembled by joining fragments, which renders byte-for-byte what JSONRenderer would
+    for serializer.data.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fragments(self, anime_list: Iterable[CachedAnime],
+                  projection: Optional[AnimeProjection] = None) -> List[bytes]:
+        """Rendered JSON object per anime, in input order."""
+        projection = projection or AnimeProjection.full()
+        anime_list = list(anime_list)
+        rendered: List[bytes] = [b''] * len(anime_list)
+        missing = []
+        with self._lock:
+            for index, anime in enumerate(anime_list):
+                key = (projection.key, anime.anime_id)
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == anime.updated_at:
+                    self._entries.move_to_end(key)
+                    rendered[index] = entry[1]
+                else:
+                    missing.append(index)
+            self.hits += len(anime_list) - len(missing)
+            self.misses += len(missing)
+        record_cache('fragment', 'hit', len(anime_list) - len(missing))
+        record_cache('fragment', 'miss', len(missing))
+
+        if missing:
+            fresh = {}
+            with timed('serialize'):
+                data = projection.serializer([anime_list[index] for index in missing], many=True).data
+                for index, item in zip(missing, data):
+                    anime = anime_list[index]
+                    rendered[index] = dumps(item)
+                    fresh[(projection.key, anime.anime_id)] = (anime.updated_at, rendered[index])
+            with self._lock:
+                self._entries.update(fresh)
+                for key in fresh:
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return rendered
+
+    def render_list(self, anime_list: Iterable[CachedAnime],
+                    projection: Optional[AnimeProjection] = None) -> RenderedJSON:
+        """The JSON array projection.serializer(anime_list, many=True) would render to."""
+        return join_rendered(self.fragments(anime_list, projection))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+_fragment_cache = None
+_fragment_cache_lock = threading.Lock()
+
+
+def get_fragment_cache() -> AnimeFragmentCache:
+    global _fragment_cache
+    if _fragment_cache is None:
+        with _fragment_cache_lock:
+            if _fragment_cache is None:
+                _fragment_cache = AnimeFragmentCache(getattr(settings, 'ANIME_FRAGMENT_CACHE_SIZE', 10000))
+    return _fragment_cache
+
+
+def render_anime(anime: CachedAnime, projection: Optional[AnimeProjection] = None) -> RenderedJSON:
+    return RenderedJSON(get_fragment_cache().fragments([anime], projection)[0])
+
+
+def render_anime_list(anime_list: Iterable[CachedAnime],
+                      projection: Optional[AnimeProjection] = None) -> RenderedJSON:
+    return get_fragment_cache().render_list(anime_list, projection)
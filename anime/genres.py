@@ -0,0 +1,166 @@
+import threading
+import time
+import uuid
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from core.anilist import AniListAPI
+from core.conditional import make_etag
+from core.renderers import RenderedJSON, dumps
+
+from .models import Genre
+from .serializers import GenreSerializer
+
+VERSION_KEY = 'genre-catalog:version'
+
+
+class GenreCatalog:
+    """
+    Immutable snapshot of the Genre table: a name -> id map and the rendered
+    GenreSerializer list. Replaced wholesale, never mutated, so readers need no lock.
+    """
+
+    def __init__(self, genres: Iterable[Genre], version: Optional[str]):
+        genres = list(genres)
+        self.version = version
+        self.id_by_name: Dict[str, int] = {genre.name: genre.id for genre in genres}
+        self.names: FrozenSet[str] = frozenset(self.id_by_name)
+        self.last_modified = max((genre.updated_at for genre in genres), default=None)
+        self.body = RenderedJSON(dumps(GenreSerializer(genres, many=True).data))
+
+    def __len__(self):
+        return len(self.id_by_name)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def etag(self, request) -> str:
+        return make_etag(request, 'genres', self.version, len(self), self.last_modified)
+
+
+class GenreCatalogStore:
+    """
+    Per-process holder of the current GenreCatalog.
+
+    The catalog's version lives in the shared 'anilist' cache. Each worker compares it
+    with its own at most every check_interval seconds and reloads (one query) when
+    another worker has refreshed the genres.
+    """
+
+    def __init__(self, alias: str = 'anilist', check_interval: float = 5.0):
+        self.alias = alias
+        self.check_interval = check_interval
+        self._catalog: Optional[GenreCatalog] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get(self) -> GenreCatalog:
+        catalog = self._catalog
+        now = time.monotonic()
+        if catalog is not None and now - self._checked < self.check_interval:
+            return catalog
+        version = self.shared.get(VERSION_KEY)
+        self._checked = now
+        if catalog is None or version != catalog.version:
+            catalog = self.load(version)
+        return catalog
+
+    async def aget(self) -> GenreCatalog:
+        """get() for async views: the version check and any reload go through async APIs."""
+        catalog = self._catalog
+        now = time.monotonic()
+        if catalog is not None and now - self._checked < self.check_interval:
+            return catalog
+        version = await self.shared.aget(VERSION_KEY)
+        self._checked = now
+        if catalog is None or version != catalog.version:
+            genres = [genre async for genre in Genre.objects.order_by('id')]
+            catalog = self._install(GenreCatalog(genres, version))
+        return catalog
+
+    def load(self, version: Optional[str] = None) -> GenreCatalog:
+        return self._install(GenreCatalog(Genre.objects.order_by('id'), version))
+
+    def reload(self) -> GenreCatalog:
+        """Reload now, without waiting out check_interval (one query)."""
+        return self.load(self.shared.get(VERSION_KEY))
+
+    def _install(self, catalog: GenreCatalog) -> GenreCatalog:
+        with self._lock:
+            self._catalog = catalog
+            self._checked = time.monotonic()
+            return catalog
+
+    def refresh(self, names: Iterable[str]) -> GenreCatalog:
+        """Upsert genres by name in one statement and invalidate every worker's catalog."""
+        now = timezone.now()
+        Genre.objects.bulk_create(
+            [Genre(name=name, created_at=now, updated_at=now) for name in dict.fromkeys(names) if name],
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['updated_at'],
+        )
+        return self.load(self.invalidate())
+
+    def invalidate(self) -> str:
+        """Publish a new version; every worker reloads on its next check."""
+        version = uuid.uuid4().hex
+        self.shared.set(VERSION_KEY, version, None)
+        return version
+
+    def reset(self):
+        self._catalog = None
+        self._checked = 0.0
+
+
+_store = None
+
+
+def get_genre_store() -> GenreCatalogStore:
+    global _store
+    if _store is None:
+        _store = GenreCatalogStore(
+            alias=getattr(settings, 'ANILIST_CACHE_ALIAS', 'anilist'),
+            check_interval=getattr(settings, 'GENRE_CATALOG_CHECK_INTERVAL', 5.0),
+        )
+    return _store
+
+
+def get_genre_catalog() -> GenreCatalog:
+    return get_genre_store().get()
+
+
+def refresh_genres(names: Optional[Iterable[str]] = None) -> GenreCatalog:
+    """Upsert the given genre names (AniList's list by default) and publish the new catalog."""
+    if names is None:
+        names = AniListAPI.get_genre_list()
+    return get_genre_store().refresh(names)
+
+
+def ensure_genre_catalog() -> GenreCatalog:
+    """The current catalog, seeded from AniList when the Genre table is empty."""
+    catalog = get_genre_catalog()
+    if not len(catalog):
+        catalog = refresh_genres()
+    return catalog
+
+
+async def aensure_genre_catalog() -> GenreCatalog:
+    """ensure_genre_catalog for async views; only the one-off seeding runs in a thread."""
+    catalog = await get_genre_store().aget()
+    if not len(catalog):
+        catalog = await sync_to_async(refresh_genres)()
+    return catalog
+
+
+def warm_genre_catalog() -> GenreCatalog:
+    """Load the catalog now (worker start) so the first request doesn't pay for it."""
+    return get_genre_store().reload()
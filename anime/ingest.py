@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+from typing import Dict, List, Optional
+
+from django.utils import timezone
+
+from .models import CachedAnime
+from .recommender import get_recommender
+
+logger = logging.getLogger(__name__)
+
+# Columns written from AniList media; everything else on CachedAnime is bookkeeping.
+MEDIA_FIELDS = (
+    'title_romaji', 'title_english', 'title_native', 'description', 'genres',
+    'average_score', 'popularity', 'episodes', 'status', 'cover_image',
+)
+
+
+def normalize_media(media: Dict) -> Optional[Dict]:
+    """Map an AniList media dict onto CachedAnime column values."""
+    if not media or media.get('id') is None:
+        return None
+
+    title = media.get('title') or {}
+    cover_image = media.get('coverImage') or {}
+    return {
+        'anime_id': media['id'],
+        'title_romaji': title.get('romaji') or '',
+        'title_english': title.get('english'),
+        'title_native': title.get('native'),
+        'description': media.get('description'),
+        'genres': media.get('genres') or [],
+        'average_score': media.get('averageScore'),
+        'popularity': media.get('popularity') or 0,
+        'episodes': media.get('episodes'),
+        'status': media.get('status') or 'UNKNOWN',
+        'cover_image': cover_image.get('large'),
+    }
+
+
+def content_hash(values: Dict) -> str:
+    """Stable digest of the AniList-derived columns of a row."""
+    payload = json.dumps(
+        [values.get(field) for field in MEDIA_FIELDS],
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def upsert_media(media_list: List[Dict]) -> List[CachedAnime]:
+    """
+    Persist a page of AniList media in one round trip and return the rows in input order.
+
+    Rows whose content hash matches the stored one are not rewritten (only their
+    fetched_at is bumped, in one UPDATE). Everything else goes through a single
+    INSERT ... ON CONFLICT (anime_id) DO UPDATE.
+    """
+    normalized = {}
+    for media in media_list or []:
+        values = normalize_media(media)
+        if values is None:
+            continue
+        # ON CONFLICT cannot touch the same row twice in one statement; keep the last copy.
+        normalized[values['anime_id']] = values
+
+    if not normalized:
+        return []
+
+    existing = CachedAnime.objects.in_bulk(list(normalized), field_name='anime_id')
+    now = timezone.now()
+
+    persisted = {}
+    to_write = []
+    for anime_id, values in normalized.items():
+        digest = content_hash(values)
+        current = existing.get(anime_id)
+        if current is not None and current.content_hash == digest:
+            current.fetched_at = now
+            persisted[anime_id] = current
+            continue
+        to_write.append(CachedAnime(content_hash=digest, fetched_at=now, **values))
+
+    if persisted:
+        CachedAnime.objects.filter(pk__in=[anime.pk for anime in persisted.values()]).update(fetched_at=now)
+
+    if to_write:
+        CachedAnime.objects.bulk_create(
+            to_write,
+            update_conflicts=True,
+            unique_fields=['anime_id'],
+            update_fields=list(MEDIA_FIELDS) + ['content_hash', 'fetched_at', 'updated_at'],
+        )
+        for anime in to_write:
+            current = existing.get(anime.anime_id)
+            if current is not None:
+                # Backends without RETURNING on conflict leave pk unset for updated rows.
+                anime.pk = anime.pk or current.pk
+                anime.created_at = current.created_at
+            persisted[anime.anime_id] = anime
+        get_recommender().apply(to_write)
+        logger.debug("Upserted %d of %d AniList media rows", len(to_write), len(normalized))
+
+    ordered = []
+    seen = set()
+    for media in media_list:
+        anime_id = media.get('id') if media else None
+        if anime_id in persisted and anime_id not in seen:
+            seen.add(anime_id)
+            ordered.append(persisted[anime_id])
+    return ordered
@@ -0,0 +1,126 @@
+import itertools
+import shutil
+import tempfile
+import threading
+import uuid
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from anime.management.commands.bench_suite import bench_users
+from core.anilist_stub import CatalogFixtureResponder, StubAniListServer, synthetic_catalog
+from core.benchmark import GunicornServer, LoadGenerator, Scenario, write_results
+
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrent-connection capacity of the WSGI (gthread) and ASGI (uvicorn workers, async '
+        'views) configurations: N connections held open by searches waiting on a slow AniList '
+        'stub, while a few other users load the genre list. Needs a migrated database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=float, default=2.0, help='Stub latency in seconds')
+        parser.add_argument('--connections', type=int, nargs='+', default=[8, 32, 128],
+                            help='Concurrent slow connections to test')
+        parser.add_argument('--fast-users', type=int, default=4, help='Users loading the genre list meanwhile')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds per connection level')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Client timeout per request')
+        parser.add_argument('--workers', type=int, default=1, help='gunicorn workers')
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--catalog-size', type=int, default=500)
+        parser.add_argument('--output', default='benchmarks/async_capacity.json', help='Where to write JSON results')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        max_connections = max(options['connections'])
+        try:
+            tokens = bench_users(max_connections + options['fast_users'], options['seed'])
+        except Exception as e:
+            raise CommandError(f'Capacity test needs a migrated database: {e}')
+
+        results = {}
+        responder = CatalogFixtureResponder(synthetic_catalog(options['catalog_size'], options['seed']))
+        with StubAniListServer(latency=options['latency'], responder=responder, seed=options['seed']) as stub:
+            for mode in options['modes']:
+                cache_dir = tempfile.mkdtemp(prefix='anilist-capacity-')
+                try:
+                    with GunicornServer(workers=options['workers'],
+                                        env=self.server_env(mode, stub.url, cache_dir, max_connections)) as server:
+                        # Seed the genre catalog so the fast users never wait on the stub.
+                        requests.get(f'{server.url}/api/anime/genres/', timeout=options['timeout'],
+                                     headers={'Authorization': f'Bearer {tokens[0]}'})
+                        for connections in options['connections']:
+                            self.stdout.write(f"{mode}: {connections} slow connections for {options['duration']:.0f}s")
+                            results.update(self.run_level(server.url, mode, connections, tokens, options))
+                finally:
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+
+        self.report(results, options)
+        parameters = {key: options[key] for key in (
+            'latency', 'connections', 'fast_users', 'duration', 'timeout', 'workers', 'modes', 'seed',
+        )}
+        document = write_results(options['output'], results, parameters)
+        self.stdout.write(f"Results for {document['revision']} written to {options['output']}")
+
+    def server_env(self, mode, stub_url, cache_dir, max_connections):
+        # Lift the AniList governor and pool limits so the server model is what gets measured.
+        return {
+            'GUNICORN_ASGI': 'true' if mode == 'asgi' else 'false',
+            'GUNICORN_PROFILE_STARTUP': 'false',
+            'GUNICORN_WORKER_CONNECTIONS': str(max_connections * 2),
+            'ANILIST_API_URL': stub_url,
+            'ANILIST_CACHE_LOCATION': cache_dir,
+            'ANILIST_RATE_LIMIT': '1000000',
+            'ANILIST_MAX_CONCURRENCY': str(max_connections),
+            'ANILIST_ASYNC_POOL_SIZE': str(max_connections),
+            'ANILIST_QUEUE_TIMEOUT': '60',
+            'ANILIST_MAX_RETRIES': '0',
+            'LOCAL_SEARCH_ENABLED': 'False',
+        }
+
+    def run_level(self, base_url, mode, connections, tokens, options):
+        run_id = uuid.uuid4().hex[:8]
+        counter = itertools.count()
+
+        def search_path(iteration):
+            # A query nobody has asked before: it misses every cache and waits on the stub.
+            return f'/api/anime/search/?q={run_id}-{next(counter)}'
+
+        slow = LoadGenerator(base_url, tokens[:connections], [Scenario('slow', search_path)],
+                             duration=options['duration'], timeout=options['timeout'])
+        fast = LoadGenerator(base_url, tokens[-options['fast_users']:], [Scenario('fast', '/api/anime/genres/')],
+                             duration=options['duration'], timeout=options['timeout'])
+        fast_results = {}
+        fast_thread = threading.Thread(target=lambda: fast_results.update(fast.run()), daemon=True)
+        fast_thread.start()
+        slow_results = slow.run()
+        fast_thread.join()
+
+        prefix = f'capacity.{mode}.c{connections}'
+        return {
+            f'{prefix}.slow': slow_results['load.slow'],
+            f'{prefix}.fast': fast_results['load.fast'],
+        }
+
+    def report(self, results, options):
+        ideal = options['latency'] * 1000
+        self.stdout.write(
+            f"{'mode':<6} {'conns':>6} {'slow req/s':>11} {'slow p50':>9} {'slow p99':>9} {'slow err':>9} "
+            f"{'fast req/s':>11} {'fast p50':>9} {'fast p99':>9} {'fast err':>9}"
+        )
+        for mode in options['modes']:
+            for connections in options['connections']:
+                slow = results[f'capacity.{mode}.c{connections}.slow']
+                fast = results[f'capacity.{mode}.c{connections}.fast']
+                self.stdout.write(
+                    f"{mode:<6} {connections:>6} {slow.get('throughput_rps', 0):>11.1f} {slow['p50_ms']:>9.0f} "
+                    f"{slow['p99_ms']:>9.0f} {slow['errors']:>9} {fast.get('throughput_rps', 0):>11.1f} "
+                    f"{fast['p50_ms']:>9.1f} {fast['p99_ms']:>9.1f} {fast['errors']:>9}"
+                )
+        self.stdout.write(
+            f'Slow requests cannot finish faster than the stub latency ({ideal:.0f} ms); at full capacity '
+            f'slow req/s is connections / {options["latency"]:g}s.'
+        )
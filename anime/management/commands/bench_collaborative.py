@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from anime.collaborative import RatingMatrix, score_from_neighbors
+
+
+class Command(BaseCommand):
+    help = 'Benchmark item-item collaborative filtering on synthetic ratings (no database needed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--anime', type=int, default=20000)
+        parser.add_argument('--ratings-per-user', type=int, default=20)
+        parser.add_argument('--top-n', type=int, default=50)
+        parser.add_argument('--queries', type=int, default=1000, help='Per-user recommendation calls to time')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        users, anime, per_user = options['users'], options['anime'], options['ratings_per_user']
+
+        # Zipf-ish popularity so a few titles are rated by many users, like the real catalog.
+        popularity = 1.0 / np.arange(1, anime + 1) ** 0.8
+        popularity /= popularity.sum()
+        user_ids = np.repeat(np.arange(users), per_user)
+        anime_ids = rng.choice(anime, size=users * per_user, p=popularity)
+        ratings = rng.integers(1, 11, size=users * per_user)
+
+        started = time.perf_counter()
+        matrix = RatingMatrix.from_triples(user_ids, anime_ids, ratings)
+        self._report('build CSR matrix', started, f'{matrix.matrix.nnz} ratings')
+
+        started = time.perf_counter()
+        table = matrix.item_neighbors(top_n=options['top_n'])
+        self._report('precompute neighbours', started, f'{len(table)} anime')
+
+        dirty = rng.choice(matrix.anime_ids, size=min(100, len(matrix.anime_ids)), replace=False)
+        started = time.perf_counter()
+        matrix.item_neighbors(top_n=options['top_n'], anime_ids=dirty.tolist())
+        self._report('incremental (100 anime)', started)
+
+        sample = rng.choice(users, size=options['queries'])
+        csr = matrix.matrix
+        started = time.perf_counter()
+        for row in sample:
+            lo, hi = csr.indptr[row], csr.indptr[row + 1]
+            user_ratings = {
+                int(matrix.anime_ids[column]): int(rng.integers(1, 11)) for column in csr.indices[lo:hi]
+            }
+            score_from_neighbors(user_ratings, table, k=10)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{"serve per user":<28} {elapsed / len(sample) * 1000:9.3f} ms')
+
+    def _report(self, label, started, detail=''):
+        self.stdout.write(f'{label:<28} {time.perf_counter() - started:9.2f} s  {detail}')
@@ -0,0 +1,164 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from anime.models import CachedAnime, UserRecommendationCache
+from anime.query import RECOMMENDATION_ORDERING
+from anime.recommendations import build_snapshots, ranked_anime, recommendation_fingerprint
+from anime.response_cache import get_recommendation_response_cache
+from anime.serializers import CachedAnimeSerializer
+from anime.views import AnimeRecommendationsView
+from users.models import AnimePreference, UserProfile
+from users.signals import preferences_changed
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark recommendation cache hits: join-style read vs in_bulk vs JSON snapshot vs the '
+        'per-user response cache, and check that profile changes invalidate it (rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ranked', type=int, default=50, help='Length of the materialized ranking')
+        parser.add_argument('--watched', type=int, default=500, help='Watched entries for the test user')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _time(self, label, run, repeat):
+        run()  # warm up
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(f'{label:<44} p50 {statistics.median(timings):7.3f} ms  p95 {p95:7.3f} ms')
+
+    def _run(self, options):
+        ranked_ids = list(
+            CachedAnime.objects.order_by(*RECOMMENDATION_ORDERING).values_list('anime_id', flat=True)[:options['ranked']]
+        )
+        if len(ranked_ids) < 10:
+            raise CommandError('Need at least 10 CachedAnime rows; run sync_catalog first')
+
+        user = User.objects.create_user(username='bench-recommendation-cache', password=None)
+        profile = UserProfile.objects.create(user=user, favorite_genres=['Action'])
+        watched = list(range(10_000_000, 10_000_000 + options['watched']))
+        profile.add_watched(watched)
+        UserRecommendationCache.objects.update_or_create(user=user, defaults={
+            'favorite_genres': ['Action'],
+            'ranked_anime_ids': ranked_ids,
+            'ranked_scores': [1.0 - i / len(ranked_ids) for i in range(len(ranked_ids))],
+            'fingerprint': recommendation_fingerprint(['Action'], watched),
+            'snapshot': build_snapshots({user.id: ranked_ids})[user.id],
+            'dirty': False,
+        })
+        renderer = JSONRenderer()
+
+        def join_style():
+            # Shape of the old M2M hit: row read, then a join filtered by a literal watch list.
+            cache = UserRecommendationCache.objects.get(user_id=user.id)
+            queryset = CachedAnime.objects.filter(anime_id__in=cache.ranked_anime_ids).exclude(anime_id__in=watched)
+            renderer.render(CachedAnimeSerializer(queryset[:10], many=True).data)
+
+        def in_bulk():
+            cache = UserRecommendationCache.objects.get(user_id=user.id)
+            recommendations = ranked_anime(cache.ranked_anime_ids, user.id)[:10]
+            renderer.render(CachedAnimeSerializer(recommendations, many=True).data)
+
+        def snapshot():
+            cache = UserRecommendationCache.objects.get(user_id=user.id)
+            renderer.render(cache.snapshot[:10])
+
+        repeat = options['repeat']
+        self.stdout.write(f'{len(ranked_ids)} ranked, {len(watched)} watched, {repeat} hits each')
+        self._time('join + exclude(watched list) + serialize', join_style, repeat)
+        self._time('in_bulk + anti-join + serialize (dirty row)', in_bulk, repeat)
+        self._time('snapshot (clean row)', snapshot, repeat)
+
+        # The whole view, without and with the rendered-response cache.
+        view = AnimeRecommendationsView.as_view()
+        factory = APIRequestFactory()
+        # Keep the background refresh (another connection) away from rolled-back rows.
+        AnimeRecommendationsView.revalidate = lambda self, user_id: None
+        response_cache = get_recommendation_response_cache()
+
+        def get():
+            request = factory.get('/api/anime/recommendations/', HTTP_HOST='localhost')
+            force_authenticate(request, user)
+            response = view(request)
+            response.render()
+            return response
+
+        ttl = response_cache.ttl
+        response_cache.ttl = 0
+        try:
+            self._time('view, snapshot (response cache off)', get, repeat)
+            self._count_queries('view, snapshot (response cache off)', get)
+        finally:
+            response_cache.ttl = ttl
+        self._time('view, response cache hit', get, repeat)
+        self._count_queries('view, response cache hit', get)
+
+        self._check_invalidation(user, profile, ranked_ids, get)
+
+    def _count_queries(self, label, run):
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        self.stdout.write(f'{label:<44} {len(queries)} queries')
+
+    def _check_invalidation(self, user, profile, ranked_ids, get):
+        """A warm entry must be dropped by every kind of profile change, and by a racing bump."""
+        response_cache = get_recommendation_response_cache()
+        failures = []
+
+        def served_from_cache():
+            with CaptureQueriesContext(connection) as queries:
+                response = get()
+            return len(queries) == 0, [anime['anime_id'] for anime in json.loads(response.content)]
+
+        changes = [
+            ('rating saved', lambda: AnimePreference.objects.create(user=user, anime_id=ranked_ids[1], rating=9)),
+            ('ratings written in bulk', lambda: preferences_changed.send(sender=AnimePreference, user_id=user.id)),
+            ('anime watched', lambda: profile.add_watched([ranked_ids[0]])),
+            ('genres saved', lambda: profile.save()),
+        ]
+        for name, change in changes:
+            get()
+            if not served_from_cache()[0]:
+                failures.append(f'not cached before "{name}"')
+            change()
+            cached, anime_ids = served_from_cache()
+            if cached:
+                failures.append(f'stale response served after "{name}"')
+            if name == 'anime watched' and ranked_ids[0] in anime_ids:
+                failures.append('watched anime still recommended')
+
+        version = response_cache.version(user.id)
+        response_cache.bump(user.id)
+        response_cache.store(user.id, version, ('race',), (b'[]', None, None))
+        if response_cache.get(user.id, ('race',)) is not None:
+            failures.append('response built before a bump was kept')
+
+        if failures:
+            raise CommandError('Response cache invalidation failed: ' + '; '.join(failures))
+        self.stdout.write(f'Response cache invalidation: {len(changes) + 1} checks passed')
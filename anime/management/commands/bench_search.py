@@ -0,0 +1,46 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from anime.ingest import upsert_media
+from anime.search import local_search
+from core.anilist import AniListAPI
+
+
+class Command(BaseCommand):
+    help = 'Compare /api/anime/search/ latency for the local catalog path and the AniList path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--q', action='append', dest='queries', help='Title query (repeatable)')
+        parser.add_argument('--genre', default='')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--api-url', help='Override ANILIST_API_URL, e.g. a local stub server')
+
+    def handle(self, *args, **options):
+        api_url = options['api_url']
+        queries = options['queries'] or ['naruto', 'one piece', 'attack on titan', 'gintama']
+        genre = options['genre']
+
+        def local(query):
+            return local_search(query, genre)
+
+        def anilist(query):
+            # Uncached upstream call plus the upsert the view does, as on a cache miss.
+            response = AniListAPI.search_anime(search=query, genre=genre, use_cache=False, api_url=api_url)
+            return upsert_media(((response.get('data') or {}).get('Page') or {}).get('media') or [])
+
+        for query in queries:
+            answered = local(query) is not None
+            self.stdout.write(f'{query!r}: local {"answers" if answered else "falls back"}')
+            for label, run in (('local', local), ('anilist', anilist)):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    run(query)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f'  {label:<8} p50 {statistics.median(timings):8.2f} ms  '
+                    f'p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms'
+                )
@@ -0,0 +1,111 @@
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from anime.fragments import AnimeFragmentCache
+from anime.models import CachedAnime
+from anime.projection import AnimeProjection, COMPACT_FIELDS
+from anime.serializers import CachedAnimeSerializer
+from core.renderers import FastJSONRenderer
+
+GENRES = ['Action', 'Adventure', 'Comedy', 'Drama', 'Fantasy', 'Romance', 'Sci-Fi', 'Slice of Life']
+
+
+def synthetic_anime(count, seed=0):
+    """Unsaved CachedAnime rows shaped like AniList data (no database needed)."""
+    rng = random.Random(seed)
+    updated_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        CachedAnime(
+            id=index + 1,
+            anime_id=100000 + index,
+            title_romaji=f'Sakura no Monogatari {index}',
+            title_english=f'Tale of the Cherry Blossom {index}',
+            title_native=f'桜の物語 {index}',
+            description=('A young swordsman sets out on a journey. <br><br>' * rng.randint(5, 40)).strip(),
+            genres=rng.sample(GENRES, 3),
+            average_score=float(rng.randint(40, 95)),
+            popularity=rng.randint(0, 500000),
+            episodes=rng.choice([None, 12, 24, 26]),
+            status='FINISHED',
+            cover_image=f'https://s4.anilist.co/file/anilistcdn/media/anime/cover/large/bx{index}.jpg',
+            updated_at=updated_at,
+        )
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark list rendering: DRF serializer + JSONRenderer vs cached orjson fragments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--views', action='store_true',
+                            help='Also compare full vs compact/truncated projections (bytes and warm render)')
+
+    def _time(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write(f'{"items":>6} {"DRF":>10} {"orjson":>10} {"cold":>10} {"warm":>10} {"bytes":>10}')
+        for size in options['sizes']:
+            anime_list = synthetic_anime(size)
+            drf = JSONRenderer()
+            fast = FastJSONRenderer()
+
+            def serializer_and_renderer():
+                return drf.render(CachedAnimeSerializer(anime_list, many=True).data)
+
+            def serializer_and_orjson():
+                return fast.render(CachedAnimeSerializer(anime_list, many=True).data)
+
+            def cold_fragments():
+                return AnimeFragmentCache().render_list(anime_list)
+
+            warm = AnimeFragmentCache()
+            warm.render_list(anime_list)
+
+            expected = serializer_and_renderer()
+            for label, body in (('orjson', serializer_and_orjson()), ('fragments', fast.render(warm.render_list(anime_list)))):
+                if body != expected:
+                    raise CommandError(f'{label} output differs from JSONRenderer for {size} items')
+
+            self.stdout.write(
+                f'{size:>6} '
+                f'{self._time(serializer_and_renderer, repeat):>8.2f}ms '
+                f'{self._time(serializer_and_orjson, repeat):>8.2f}ms '
+                f'{self._time(cold_fragments, repeat):>8.2f}ms '
+                f'{self._time(lambda: fast.render(warm.render_list(anime_list)), repeat):>8.2f}ms '
+                f'{len(expected):>10}'
+            )
+
+        if options['views']:
+            self._compare_views(options['sizes'], repeat)
+
+    def _compare_views(self, sizes, repeat):
+        projections = [
+            ('full', AnimeProjection.full()),
+            ('full, truncated', AnimeProjection.list_max()),
+            ('compact', AnimeProjection(COMPACT_FIELDS, AnimeProjection.list_max().description_length)),
+        ]
+        self.stdout.write(f'\n{"items":>6} {"projection":<16} {"bytes":>10} {"cold":>10} {"warm":>10}')
+        fast = FastJSONRenderer()
+        for size in sizes:
+            anime_list = synthetic_anime(size)
+            for label, projection in projections:
+                warm = AnimeFragmentCache()
+                body = fast.render(warm.render_list(anime_list, projection))
+                cold = self._time(lambda: AnimeFragmentCache().render_list(anime_list, projection), repeat)
+                hot = self._time(lambda: fast.render(warm.render_list(anime_list, projection)), repeat)
+                self.stdout.write(f'{size:>6} {label:<16} {len(body):>10} {cold:>8.2f}ms {hot:>8.2f}ms')
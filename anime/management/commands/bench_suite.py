@@ -0,0 +1,172 @@
+import json
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from anime.fragments import AnimeFragmentCache
+from anime.ingest import content_hash, normalize_media
+from anime.management.commands.bench_serialization import synthetic_anime
+from anime.projection import COMPACT_FIELDS, AnimeProjection, description_truncate_length
+from anime.recommender import GenreRecommender
+from core.anilist_stub import (
+    GENRES, CatalogFixtureResponder, ReplayResponder, StubAniListServer, synthetic_catalog,
+)
+from core.benchmark import GunicornServer, LoadGenerator, Scenario, compare_results, summarize, time_calls, write_results
+from core.renderers import dumps
+from users.authentication import ProfileRefreshToken
+from users.models import AnimePreference, UserProfile
+
+SEARCH_TERMS = ['sakura', 'blade', 'star', 'ghost', 'summer', 'iron', 'moon', 'dragon', 'tokyo', 'dream']
+
+
+def bench_users(count, seed):
+    """Bench users with profiles, favourite genres and ratings; returns access tokens."""
+    rng = random.Random(seed)
+    tokens = []
+    for index in range(count):
+        user, created = User.objects.get_or_create(username=f'bench_user_{index}')
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        UserProfile.objects.update_or_create(user=user, defaults={'favorite_genres': rng.sample(GENRES, 3)})
+        AnimePreference.objects.bulk_create(
+            [AnimePreference(user=user, anime_id=anime_id, rating=rng.randint(1, 10))
+             for anime_id in rng.sample(range(1, 500), 10)],
+            ignore_conflicts=True,
+        )
+        tokens.append(str(ProfileRefreshToken.for_user(user).access_token))
+    return tokens
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark suite: micro-benchmarks (ingest, serialization, ranking) and a multi-user '
+        'load test through gunicorn.conf.py against a local AniList stub. Writes JSON results.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--micro', action='store_true', help='Run the micro-benchmarks')
+        parser.add_argument('--load', action='store_true', help='Run the load test (needs the database)')
+        parser.add_argument('--output', default='benchmarks/results.json', help='Where to write JSON results')
+        parser.add_argument('--baseline', help='Earlier results file to compare against')
+        parser.add_argument('--repeat', type=int, default=200, help='Timed calls per micro-benchmark')
+        # Upstream stub
+        parser.add_argument('--fixtures', help='Recorded AniList responses (JSON) to replay')
+        parser.add_argument('--catalog', help='Recorded catalog (JSON list of media); synthetic if omitted')
+        parser.add_argument('--catalog-size', type=int, default=2000)
+        parser.add_argument('--latency', type=float, default=0.05, help='Stub latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub requests answered 500')
+        parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth stub request with 429')
+        # Load
+        parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load after ramp-up')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+        parser.add_argument('--worker-class', help='Override gunicorn worker_class')
+        parser.add_argument('--asgi', action='store_true', help='Serve the ASGI app and async views (GUNICORN_ASGI)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not options['micro'] and not options['load']:
+            options['micro'] = options['load'] = True
+        results = {}
+        if options['micro']:
+            results.update(self.micro(options))
+        if options['load']:
+            results.update(self.load(options))
+
+        self.report(results)
+        parameters = {key: options[key] for key in (
+            'repeat', 'catalog_size', 'latency', 'error_rate', 'throttle_every', 'users', 'duration',
+            'workers', 'worker_class', 'asgi', 'seed', 'fixtures', 'catalog',
+        )}
+        document = write_results(options['output'], results, parameters)
+        self.stdout.write(f"Results for {document['revision']} written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            self.stdout.write(f"Compared with {baseline.get('revision', '?')}:")
+            for name, key, before, after, change in compare_results(baseline, document):
+                self.stdout.write(f'  {name:<36} {key:<15} {before:10.2f} -> {after:10.2f}  {change:+7.1%}')
+
+    def report(self, results):
+        self.stdout.write(f"{'benchmark':<36} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+        for name, summary in results.items():
+            throughput = f"{summary['throughput_rps']:.1f}" if 'throughput_rps' in summary else '-'
+            self.stdout.write(
+                f"{name:<36} {summary['count']:>7} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} "
+                f"{summary['p99_ms']:>9.3f} {throughput:>9} {summary['errors']:>7}"
+            )
+
+    def catalog(self, options):
+        if options['catalog']:
+            with open(options['catalog'], encoding='utf-8') as f:
+                return json.load(f)
+        return synthetic_catalog(options['catalog_size'], options['seed'])
+
+    def micro(self, options):
+        """DB-free benchmarks of the CPU-bound pieces of the hot paths."""
+        repeat = options['repeat']
+        rng = random.Random(options['seed'])
+        catalog = self.catalog(options)
+        page = catalog[:50]
+        results = {}
+
+        results['micro.ingest.normalize_page50'] = summarize(time_calls(
+            lambda: [content_hash(normalize_media(media)) for media in page], repeat))
+        results['micro.ingest.dumps_page50'] = summarize(time_calls(
+            lambda: dumps({'data': {'Page': {'media': page}}}), repeat))
+
+        rows = synthetic_anime(20, options['seed'])
+        projection = AnimeProjection(COMPACT_FIELDS, description_truncate_length())
+        renderer = JSONRenderer()
+        results['micro.serialize.drf_list20'] = summarize(time_calls(
+            lambda: renderer.render(projection.serializer(rows, many=True).data), repeat))
+        fragments = AnimeFragmentCache()
+        results['micro.serialize.fragments_list20'] = summarize(time_calls(
+            lambda: fragments.render_list(rows, projection), repeat))
+
+        recommender = GenreRecommender()
+        recommender._apply_rows(
+            (media['id'], media['genres'], media['averageScore'], media['popularity'], None) for media in catalog
+        )
+        # Benchmark the in-memory ranking only; never go to the database for new rows.
+        recommender.sync = lambda force=False: None
+        watched = rng.sample([media['id'] for media in catalog], min(200, len(catalog)))
+        results['micro.ranking.genre_recommender'] = summarize(time_calls(
+            lambda: recommender.recommend(rng.sample(GENRES, 3), exclude=watched, k=50), repeat))
+        return results
+
+    def load(self, options):
+        responder = CatalogFixtureResponder(self.catalog(options))
+        if options['fixtures']:
+            responder = ReplayResponder.from_file(options['fixtures'], fallback=responder)
+        try:
+            tokens = bench_users(options['users'], options['seed'])
+        except Exception as e:
+            raise CommandError(f'Load test needs a migrated database: {e}')
+
+        def search_path(iteration):
+            term = SEARCH_TERMS[iteration % len(SEARCH_TERMS)]
+            return f'/api/anime/search/?q={term}&page={1 + iteration % 3}'
+
+        scenarios = [
+            Scenario('search', search_path, weight=4),
+            Scenario('recommendations', '/api/anime/recommendations/', weight=3),
+            Scenario('preferences.get', '/api/user/preferences/', weight=2),
+            Scenario('preferences.put', '/api/user/preferences/', weight=1, method='PUT',
+                     json_body=lambda iteration: {'favorite_genres': random.Random(iteration).sample(GENRES, 3)}),
+        ]
+        with StubAniListServer(latency=options['latency'], responder=responder,
+                               error_rate=options['error_rate'], throttle_every=options['throttle_every'],
+                               seed=options['seed']) as stub:
+            env = {'ANILIST_API_URL': stub.url, 'GUNICORN_PROFILE_STARTUP': 'false',
+                   'GUNICORN_ASGI': 'true' if options['asgi'] else 'false'}
+            extra_args = ['--worker-class', options['worker_class']] if options['worker_class'] else []
+            with GunicornServer(workers=options['workers'], env=env, extra_args=extra_args) as server:
+                self.stdout.write(f"Load: {options['users']} users x {options['duration']:.0f}s against {server.url}")
+                results = LoadGenerator(server.url, tokens, scenarios, duration=options['duration']).run()
+            results['load.all']['upstream_requests'] = stub.requests
+        return results
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from anime.collaborative import rebuild_neighbors
+
+
+class Command(BaseCommand):
+    help = 'Precompute item-item collaborative filtering neighbours from AnimePreference ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=50, help='Neighbours kept per anime')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only recompute anime rated since the last build'
+        )
+
+    def handle(self, *args, **options):
+        stored = rebuild_neighbors(top_n=options['top_n'], incremental=options['incremental'])
+        self.stdout.write(self.style.SUCCESS(f'Stored neighbours for {stored} anime'))
@@ -0,0 +1,88 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.models import Q
+from django.utils import timezone
+
+from anime.models import UserRecommendationCache
+from anime.recommendations import materialize_users
+from anime.recommender import get_recommender
+from users.models import UserProfile
+
+
+def _materialize_chunk(user_ids):
+    # Runs in a pool process; it keeps one database connection for its lifetime.
+    close_old_connections()
+    return materialize_users(user_ids)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute recommendations for users whose genres, watch list or ratings changed '
+        '(or that are older than --max-age), in chunks across a process pool'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Pool processes (1 = run inline)')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Users per chunk')
+        parser.add_argument('--max-age', type=int, default=None,
+                            help='Also refresh clean rows materialized more than this many seconds ago')
+        parser.add_argument('--all', action='store_true', help='Materialize every user with a profile')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for dirty users')
+        parser.add_argument('--interval', type=float, default=10.0, help='Seconds between polls with --loop')
+        parser.add_argument('--limit', type=int, default=10000, help='Users picked up per pass')
+
+    def pending_users(self, options):
+        if options['all']:
+            return list(UserProfile.objects.order_by('user_id').values_list('user_id', flat=True))
+        pending = Q(dirty=True)
+        if options['max_age']:
+            pending |= Q(updated_at__lt=timezone.now() - timedelta(seconds=options['max_age']))
+        return list(
+            UserRecommendationCache.objects.filter(pending)
+            .order_by('dirtied_at')
+            .values_list('user_id', flat=True)[:options['limit']]
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        chunk_size = max(1, options['chunk_size'])
+
+        executor = None
+        if workers > 1:
+            # Build the genre matrix once so forked workers share it copy-on-write, and
+            # never hand an open database connection to a child process.
+            get_recommender().sync(force=True)
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+
+        try:
+            while True:
+                started = time.perf_counter()
+                user_ids = self.pending_users(options)
+                chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+                if executor is not None:
+                    connections.close_all()
+                    done = sum(executor.map(_materialize_chunk, chunks))
+                else:
+                    done = sum(materialize_users(chunk) for chunk in chunks)
+                elapsed = time.perf_counter() - started
+
+                if user_ids:
+                    rate = done / elapsed if elapsed else 0.0
+                    self.stdout.write(
+                        f'Materialized {done}/{len(user_ids)} users in {len(chunks)} chunks '
+                        f'in {elapsed:.2f}s ({rate:.0f} users/sec)'
+                    )
+                if not options['loop']:
+                    break
+                if len(user_ids) < options['limit']:
+                    time.sleep(options['interval'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from anime.genres import refresh_genres
+
+
+class Command(BaseCommand):
+    help = "Upsert AniList's genre list into the Genre table and publish the new catalog to every worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Genre names to upsert instead of fetching them from AniList')
+
+    def handle(self, *args, **options):
+        catalog = refresh_genres(options['names'] or None)
+        self.stdout.write(self.style.SUCCESS(f'{len(catalog)} genres, catalog version {catalog.version}'))
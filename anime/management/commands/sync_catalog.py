@@ -0,0 +1,135 @@
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+
+from anime.ingest import upsert_media
+from anime.models import CatalogSyncState
+from core.anilist import AniListAPI
+from core.anilist_client import get_client
+from core.ratelimit import get_governor
+
+
+class Command(BaseCommand):
+    help = 'Page through the AniList anime catalog into CachedAnime, resuming from the last checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-page', type=int, default=50, help='Media per AniList page (max 50)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Pages fetched in parallel')
+        parser.add_argument(
+            '--rate', type=int, default=None,
+            help='Request budget per minute (defaults to ANILIST_RATE_LIMIT, shared with the web workers)'
+        )
+        parser.add_argument('--max-pages', type=int, default=None, help='Stop after this many pages (resumable)')
+        parser.add_argument('--full', action='store_true', help='Ignore the checkpoint and resync everything')
+        parser.add_argument('--api-url', help='Override ANILIST_API_URL, e.g. a local stub server')
+        parser.add_argument('--record', metavar='PATH', help='Also write fetched media to a JSON fixture')
+        parser.add_argument('--name', default='anime', help='Checkpoint name')
+
+    def handle(self, *args, **options):
+        api_url = options['api_url'] or AniListAPI.api_url()
+
+        state, _ = CatalogSyncState.objects.get_or_create(name=options['name'])
+        if options['full']:
+            state.synced_until = None
+            state.in_progress = False
+        if not state.in_progress:
+            state.since = state.synced_until
+            state.last_page = 0
+            state.high_water = state.synced_until
+            state.in_progress = True
+            state.save()
+        elif state.last_page:
+            self.stdout.write(f'Resuming from page {state.last_page + 1}')
+
+        per_page = options['per_page']
+        concurrency = max(1, options['concurrency'])
+        if options['rate']:
+            get_governor().per_minute = options['rate']
+        # A batch job can wait out a whole rate-limit window instead of failing the page.
+        get_client(api_url).queue_timeout = 90.0
+        first_page = state.last_page + 1
+        last_allowed = first_page + options['max_pages'] - 1 if options['max_pages'] else None
+        recorded = [] if options['record'] else None
+
+        def fetch(page):
+            return AniListAPI.get_catalog_page(
+                page=page, per_page=per_page, updated_after=state.since, api_url=api_url
+            )
+
+        started = time.perf_counter()
+        rows = 0
+        pages = 0
+        done = set()
+        end_page = None
+        next_page = first_page
+        pending = {}
+        failed = None
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                while len(pending) < concurrency and (end_page is None or next_page <= end_page) \
+                        and (last_allowed is None or next_page <= last_allowed):
+                    pending[executor.submit(fetch, next_page)] = next_page
+                    next_page += 1
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    page = pending.pop(future)
+                    if end_page is not None and page > end_page:
+                        continue
+                    result = future.result()
+                    if result.get('errors'):
+                        # Not an empty page: the checkpoint stops before it and the run ends.
+                        failed = failed or (page, result['errors'])
+                        continue
+                    page_data = (result.get('data') or {}).get('Page') or {}
+                    media = page_data.get('media') or []
+                    if not media or not (page_data.get('pageInfo') or {}).get('hasNextPage'):
+                        end_page = page if end_page is None else min(end_page, page)
+
+                    rows += len(upsert_media(media))
+                    pages += 1
+                    done.add(page)
+                    updated = [item['updatedAt'] for item in media if item.get('updatedAt')]
+                    if updated:
+                        state.high_water = max(updated + [state.high_water or 0])
+                    if recorded is not None:
+                        recorded.extend(media)
+
+                # Only advance the checkpoint over contiguous completed pages.
+                while state.last_page + 1 in done:
+                    state.last_page += 1
+                state.save(update_fields=['last_page', 'high_water', 'updated_at'])
+                if failed is not None:
+                    raise CommandError(
+                        f'AniList returned errors for page {failed[0]}: {failed[1]}; '
+                        f'stopped at page {state.last_page}, re-run to resume'
+                    )
+
+        complete = end_page is not None and state.last_page >= end_page
+        if complete:
+            state.synced_until = state.high_water
+            state.since = None
+            state.last_page = 0
+            state.in_progress = False
+            state.save()
+
+        if recorded is not None:
+            with open(options['record'], 'w', encoding='utf-8') as fixture:
+                json.dump(recorded, fixture, ensure_ascii=False)
+
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0.0
+        governor = get_governor().metrics()
+        summary = (
+            f'{rows} rows from {pages} pages in {elapsed:.1f}s ({rate:.0f} rows/sec, '
+            f'{governor["throttled"]} throttled, {governor["queue_wait_seconds_avg"] * 1000:.0f} ms avg queue wait)'
+        )
+        if complete:
+            self.stdout.write(self.style.SUCCESS(f'Catalog synced: {summary}'))
+        else:
+            self.stdout.write(f'Stopped at page {state.last_page}: {summary}; re-run to resume')
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0002_userrecommendationcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedanime',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
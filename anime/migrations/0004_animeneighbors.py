@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:15
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0003_cachedanime_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimeNeighbors',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anime_id', models.IntegerField(unique=True)),
+                ('neighbor_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('similarities', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), default=list, size=None)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0004_animeneighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('synced_until', models.IntegerField(blank=True, null=True)),
+                ('since', models.IntegerField(blank=True, null=True)),
+                ('last_page', models.IntegerField(default=0)),
+                ('high_water', models.IntegerField(blank=True, null=True)),
+                ('in_progress', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:19
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0005_catalogsyncstate'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='cachedanime',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title_romaji'], name='anime_title_romaji_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='cachedanime',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title_english'], name='anime_title_english_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='cachedanime',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title_native'], name='anime_title_native_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='cachedanime',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('description', config='english'), name='anime_description_fts'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:20
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0006_local_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cachedanime',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['genres'], name='anime_genres_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='cachedanime',
+            index=models.Index(models.OrderBy(models.F('average_score'), descending=True, nulls_last=True), models.OrderBy(models.F('popularity'), descending=True), name='anime_score_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cachedanime',
+            index=models.Index(models.OrderBy(models.F('popularity'), descending=True), models.F('anime_id'), name='anime_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cachedanime',
+            index=models.Index(fields=['updated_at'], name='anime_updated_at_idx'),
+        ),
+    ]
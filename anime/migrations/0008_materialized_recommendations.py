@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:24
+
+import django.contrib.postgres.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0007_ordering_and_genre_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userrecommendationcache',
+            name='dirtied_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userrecommendationcache',
+            name='dirty',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='userrecommendationcache',
+            name='ranked_anime_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='userrecommendationcache',
+            name='ranked_scores',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='userrecommendationcache',
+            index=models.Index(condition=models.Q(('dirty', True)), fields=['dirtied_at'], name='rec_cache_dirty_idx'),
+        ),
+    ]
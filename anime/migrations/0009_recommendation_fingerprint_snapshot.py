@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0008_materialized_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userrecommendationcache',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='userrecommendationcache',
+            name='snapshot',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
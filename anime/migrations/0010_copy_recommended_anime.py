@@ -0,0 +1,54 @@
+from django.db import migrations
+
+
+def copy_recommended_anime(apps, schema_editor):
+    """
+    Carry M2M recommendations over into ranked_anime_ids until the rows are re-materialized.
+
+    The join table kept no rank, so rows are ordered the way AniList ranked them
+    (score, then popularity). They stay dirty, so the materializer recomputes them.
+    """
+    UserRecommendationCache = apps.get_model('anime', 'UserRecommendationCache')
+    Through = UserRecommendationCache.recommended_anime.through
+    ranked = {}
+    for cache_id, anime_id, score in Through.objects.order_by(
+        'userrecommendationcache_id', '-cachedanime__average_score', '-cachedanime__popularity'
+    ).values_list('userrecommendationcache_id', 'cachedanime__anime_id', 'cachedanime__average_score'):
+        ranked.setdefault(cache_id, []).append((anime_id, (score or 0) / 100))
+
+    batch = []
+    for cache in UserRecommendationCache.objects.filter(pk__in=list(ranked)).iterator():
+        cache.ranked_anime_ids = [anime_id for anime_id, _ in ranked[cache.pk]]
+        cache.ranked_scores = [score for _, score in ranked[cache.pk]]
+        batch.append(cache)
+        if len(batch) >= 1000:
+            UserRecommendationCache.objects.bulk_update(batch, ['ranked_anime_ids', 'ranked_scores'])
+            batch = []
+    UserRecommendationCache.objects.bulk_update(batch, ['ranked_anime_ids', 'ranked_scores'])
+
+
+def restore_recommended_anime(apps, schema_editor):
+    UserRecommendationCache = apps.get_model('anime', 'UserRecommendationCache')
+    CachedAnime = apps.get_model('anime', 'CachedAnime')
+    Through = UserRecommendationCache.recommended_anime.through
+    pks = dict(CachedAnime.objects.values_list('anime_id', 'pk'))
+    Through.objects.bulk_create(
+        [
+            Through(userrecommendationcache_id=cache_id, cachedanime_id=pks[anime_id])
+            for cache_id, ranked_anime_ids in UserRecommendationCache.objects.values_list('pk', 'ranked_anime_ids')
+            for anime_id in ranked_anime_ids
+            if anime_id in pks
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0009_recommendation_fingerprint_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_recommended_anime, restore_recommended_anime),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0010_copy_recommended_anime'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userrecommendationcache',
+            name='recommended_anime',
+        ),
+    ]
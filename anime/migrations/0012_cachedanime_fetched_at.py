@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0011_remove_userrecommendationcache_recommended_anime'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedanime',
+            name='fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.contrib.auth.models import User
 
 class CachedAnime(models.Model):
@@ -14,12 +17,35 @@ class CachedAnime(models.Model):
     episodes = models.IntegerField(null=True, blank=True)
     status = models.CharField(max_length=50)
     cover_image = models.URLField(null=True, blank=True)
+    content_hash = models.CharField(max_length=40, blank=True, default='')
+    # Last time AniList data for this row was seen, even when it did not change (and so
+    # did not bump updated_at); drives the detail endpoints' freshness policy.
+    fetched_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title_english or self.title_romaji
 
+    class Meta:
+        indexes = [
+            # Local title search (anime.search): trigram word similarity needs pg_trgm.
+            GinIndex(fields=['title_romaji'], opclasses=['gin_trgm_ops'], name='anime_title_romaji_trgm'),
+            GinIndex(fields=['title_english'], opclasses=['gin_trgm_ops'], name='anime_title_english_trgm'),
+            GinIndex(fields=['title_native'], opclasses=['gin_trgm_ops'], name='anime_title_native_trgm'),
+            GinIndex(SearchVector('description', config='english'), name='anime_description_fts'),
+            # genres__overlap / genres__contains filters
+            GinIndex(fields=['genres'], name='anime_genres_gin'),
+            # "best first" orderings; NULLS LAST must match the ORDER BY for the index to apply
+            models.Index(
+                F('average_score').desc(nulls_last=True), F('popularity').desc(),
+                name='anime_score_popularity_idx',
+            ),
+            models.Index(F('popularity').desc(), F('anime_id'), name='anime_popularity_idx'),
+            # GenreRecommender.sync() pulls rows changed since its high-water mark
+            models.Index(fields=['updated_at'], name='anime_updated_at_idx'),
+        ]
+
 class Genre(models.Model):
     name = models.CharField(max_length=50, unique=True)
     description = models.TextField(null=True, blank=True)
@@ -29,10 +55,36 @@ class Genre(models.Model):
     def __str__(self):
         return self.name
 
+class AnimeNeighbors(models.Model):
+    """Precomputed item-item neighbours from AnimePreference ratings, most similar first."""
+    anime_id = models.IntegerField(unique=True)
+    neighbor_ids = ArrayField(models.IntegerField(), default=list)
+    similarities = ArrayField(models.FloatField(), default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Neighbours of anime {self.anime_id}"
+
 class UserRecommendationCache(models.Model):
+    """
+    Materialized recommendations for one user.
+
+    ranked_anime_ids / ranked_scores hold the ranking best first and snapshot the
+    serialized top of it. dirty is set (by the
+    anime.signals receivers) whenever the user's genres, watch list or ratings change,
+    and cleared by manage.py materialize_recommendations once it has recomputed the row;
+    dirtied_at lets it avoid clearing a change that arrived mid-computation.
+    """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    recommended_anime = models.ManyToManyField(CachedAnime)
     favorite_genres = ArrayField(models.CharField(max_length=50), blank=True, default=list)
+    ranked_anime_ids = ArrayField(models.IntegerField(), blank=True, default=list)
+    ranked_scores = ArrayField(models.FloatField(), blank=True, default=list)
+    # Digest of the ranking inputs (genres, watch list, ratings, ranking version).
+    fingerprint = models.CharField(max_length=40, blank=True, default='')
+    # Serialized CachedAnime for the head of the ranking, served as-is on a clean hit.
+    snapshot = models.JSONField(blank=True, default=list)
+    dirty = models.BooleanField(default=True)
+    dirtied_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -42,4 +94,25 @@ class UserRecommendationCache(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['updated_at']),
+            # The materializer's work queue; stays small because clean rows are not indexed.
+            models.Index(fields=['dirtied_at'], condition=models.Q(dirty=True), name='rec_cache_dirty_idx'),
         ]
+
+class CatalogSyncState(models.Model):
+    """
+    Checkpoint for manage.py sync_catalog.
+
+    synced_until is the AniList updatedAt watermark of the last completed run. An
+    interrupted run records the filter it was using (since) and the last contiguous page
+    it ingested, so a re-run resumes from there instead of starting over.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    synced_until = models.IntegerField(null=True, blank=True)
+    since = models.IntegerField(null=True, blank=True)
+    last_page = models.IntegerField(default=0)
+    high_water = models.IntegerField(null=True, blank=True)
+    in_progress = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Catalog sync '{self.name}' at page {self.last_page}"
@@ -0,0 +1,106 @@
+from typing import Dict, Iterable, Optional, Sequence
+
+from django.conf import settings
+from django.db.models.functions import Substr
+
+from .serializers import CachedAnimeSerializer, truncate_description
+
+ALL_FIELDS = CachedAnimeSerializer.Meta.fields
+# What the dashboard cards render (frontend/src/components/Dashboard.js).
+COMPACT_FIELDS = ('id', 'anime_id', 'title_romaji', 'title_english', 'description', 'genres', 'cover_image')
+VIEWS = ('compact', 'full')
+
+
+class ProjectionError(ValueError):
+    """Invalid view= or fields= query parameter."""
+
+
+def description_truncate_length() -> int:
+    return getattr(settings, 'ANIME_DESCRIPTION_TRUNCATE', 300)
+
+
+class AnimeProjection:
+    """
+    Which CachedAnime fields a response includes and how much description it carries.
+
+    Drives the queryset (.only() plus a SUBSTR excerpt instead of the full description),
+    the serializer's dynamic field set and the fragment cache key, so every layer agrees.
+    description_length None means the full text.
+    """
+
+    def __init__(self, fields: Sequence[str] = ALL_FIELDS, description_length: Optional[int] = None):
+        self.fields = tuple(name for name in ALL_FIELDS if name in set(fields))
+        self.description_length = description_length if 'description' in self.fields else None
+        self.key = (self.fields, self.description_length)
+
+    def __eq__(self, other):
+        return isinstance(other, AnimeProjection) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f'AnimeProjection(fields={self.fields!r}, description_length={self.description_length!r})'
+
+    @classmethod
+    def full(cls) -> 'AnimeProjection':
+        return cls()
+
+    @classmethod
+    def list_max(cls) -> 'AnimeProjection':
+        """The most any list endpoint returns: every field, description truncated."""
+        return cls(ALL_FIELDS, description_truncate_length())
+
+    @classmethod
+    def from_request(cls, request, default: str = 'compact') -> 'AnimeProjection':
+        """
+        Parse ?view=compact|full and ?fields=a,b,c (which overrides view).
+
+        List endpoints truncate the description in either view; pass default='full' from
+        detail endpoints to serve the whole text. Raises ProjectionError for unknown values.
+        """
+        params = request.query_params
+        view = params.get('view') or default
+        if view not in VIEWS:
+            raise ProjectionError(f"view must be one of: {', '.join(VIEWS)}")
+        truncate = None if default == 'full' and view == 'full' else description_truncate_length()
+
+        requested = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+        if requested:
+            unknown = sorted(set(requested).difference(ALL_FIELDS))
+            if unknown:
+                raise ProjectionError(f"Unknown fields: {', '.join(unknown)}")
+            return cls(requested, truncate)
+        return cls(COMPACT_FIELDS if view == 'compact' else ALL_FIELDS, truncate)
+
+    def apply(self, queryset):
+        """
+        Load only the projected columns, plus the small ones every caller relies on:
+        anime_id/updated_at key the fragment cache, status/fetched_at the freshness policy.
+        """
+        columns = {'anime_id', 'updated_at', 'status', 'fetched_at'}.union(self.fields)
+        columns -= {'id', 'description'}
+        if 'description' in self.fields and self.description_length is None:
+            columns.add('description')
+        queryset = queryset.only(*columns)
+        if self.description_length is not None:
+            # One character past the limit is enough to know whether it was cut.
+            queryset = queryset.annotate(
+                description_excerpt=Substr('description', 1, self.description_length + 1)
+            )
+        return queryset
+
+    def serializer(self, instance=None, **kwargs) -> CachedAnimeSerializer:
+        return CachedAnimeSerializer(
+            instance, fields=self.fields, description_length=self.description_length, **kwargs
+        )
+
+    def project(self, items: Iterable[Dict]) -> list:
+        """Apply this projection to already-serialized (wider) anime dicts."""
+        projected = []
+        for item in items:
+            item = {name: item[name] for name in self.fields if name in item}
+            if 'description' in item:
+                item['description'] = truncate_description(item['description'], self.description_length)
+            projected.append(item)
+        return projected
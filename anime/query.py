@@ -0,0 +1,17 @@
+from django.db.models import Exists, F, OuterRef
+
+from users.models import WatchedAnime
+
+# Matches the anime_score_popularity_idx index (Postgres sorts NULLs first on DESC by default).
+RECOMMENDATION_ORDERING = (F('average_score').desc(nulls_last=True), F('popularity').desc())
+
+
+def unwatched_by(user_id: int, anime_ref: str = 'anime_id'):
+    """
+    Filter expression keeping anime the user has not watched.
+
+    Compiles to ``NOT EXISTS (SELECT 1 FROM users_watchedanime WHERE user_id = %s AND
+    anime_id = <outer anime_id>)``, an anti-join probing the (user_id, anime_id) unique
+    index, so the watch list is never shipped to the database as a literal list.
+    """
+    return ~Exists(WatchedAnime.objects.filter(user_id=user_id, anime_id=OuterRef(anime_ref)))
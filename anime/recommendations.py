@@ -0,0 +1,295 @@
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from core.anilist import AniListAPI
+from users.models import AnimePreference, UserProfile, WatchedAnime
+
+from .collaborative import NeighborTable, load_neighbors, score_from_neighbors
+from .ingest import upsert_media
+from .models import CachedAnime, UserRecommendationCache
+from .projection import AnimeProjection
+from .query import unwatched_by
+from .recommender import get_recommender
+from .response_cache import bump_profile_version
+
+logger = logging.getLogger(__name__)
+
+
+# Bump when the ranking changes in a way that should invalidate stored fingerprints.
+RANKING_VERSION = 2
+
+
+def materialized_size() -> int:
+    return getattr(settings, 'RECOMMENDATIONS_MATERIALIZED_SIZE', 50)
+
+
+def snapshot_size() -> int:
+    return getattr(settings, 'RECOMMENDATIONS_SNAPSHOT_SIZE', 10)
+
+
+def collaborative_weight() -> float:
+    return getattr(settings, 'RECOMMENDATIONS_CF_WEIGHT', 0.5)
+
+
+def recommendation_fingerprint(favorite_genres: List[str], watched_anime: Iterable[int],
+                               ratings: Optional[Dict[int, int]] = None) -> str:
+    """Order-independent digest of everything a user's ranking is computed from."""
+    payload = json.dumps(
+        [RANKING_VERSION, sorted(favorite_genres), sorted(watched_anime), sorted((ratings or {}).items())],
+        separators=(',', ':'),
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def build_snapshots(rankings: Dict[int, List[int]]) -> Dict[int, List[Dict]]:
+    """
+    Serialized CachedAnime for the head of each ranking, keyed like rankings.
+
+    Snapshots use the widest list projection (every field, truncated description), so
+    any requested projection can be cut from them. One in_bulk for the whole batch; each
+    anime is serialized once however many users it is recommended to.
+    """
+    size = snapshot_size()
+    projection = AnimeProjection.list_max()
+    wanted = {anime_id for ranked_ids in rankings.values() for anime_id in ranked_ids[:size]}
+    serialized = {
+        anime_id: dict(projection.serializer(anime).data)
+        for anime_id, anime in projection.apply(CachedAnime.objects.all()).in_bulk(
+            wanted, field_name='anime_id').items()
+    }
+    return {
+        key: [serialized[anime_id] for anime_id in ranked_ids[:size] if anime_id in serialized]
+        for key, ranked_ids in rankings.items()
+    }
+
+
+def local_ranking(favorite_genres: List[str], watched_anime: Iterable[int],
+                  ratings: Optional[Dict[int, int]] = None,
+                  k: int = 20) -> Optional[List[Tuple[int, float]]]:
+    """
+    Rank the local CachedAnime catalog without calling AniList.
+
+    Returns None while the catalog is too small to be trusted, so callers fall back to
+    AniList's genre_in ranking.
+    """
+    recommender = get_recommender()
+    recommender.sync()
+    if len(recommender) < getattr(settings, 'RECOMMENDER_MIN_CATALOG', 500):
+        return None
+
+    ranked = recommender.recommend(favorite_genres, exclude=watched_anime, ratings=ratings, k=k)
+    return ranked or None
+
+
+def anilist_ranking(favorite_genres: List[str], watched_anime: Iterable[int],
+                    k: int = 20) -> Optional[List[Tuple[int, float]]]:
+    """
+    Rank by AniList's genre_in / SCORE_DESC ordering, caching the media on the way.
+
+    Scores are AniList's averageScore scaled to 0..1. Returns None when AniList returned
+    no data.
+    """
+    response = AniListAPI.get_recommendations_by_genres(
+        genres=favorite_genres,
+        per_page=min(max(k, 20), 50)
+    )
+
+    if not response.get('data'):
+        return None
+
+    media_list = response.get('data', {}).get('Page', {}).get('media', [])
+    watched = set(watched_anime)
+    recommended_anime = upsert_media(
+        [media for media in media_list if media and media['id'] not in watched]
+    )
+    return [(anime.anime_id, (anime.average_score or 0) / 100) for anime in recommended_anime[:k]]
+
+
+def blend_rankings(content: List[Tuple[int, float]], collaborative: List[Tuple[int, float]],
+                   weight: float, k: int) -> List[Tuple[int, float]]:
+    """
+    Weighted sum of two rankings, each scaled so its best score is 1; an anime only one
+    of them ranks scores 0 on the other.
+    """
+    scores = defaultdict(float)
+    for ranking, share in ((content, 1 - weight), (collaborative, weight)):
+        top = max((score for _, score in ranking), default=0)
+        for anime_id, score in ranking:
+            scores[anime_id] += share * (score / top if top > 0 else 0)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def rank_recommendations(favorite_genres: List[str], watched_anime: Iterable[int],
+                         ratings: Optional[Dict[int, int]] = None,
+                         k: Optional[int] = None,
+                         neighbors: Optional[NeighborTable] = None) -> Optional[List[Tuple[int, float]]]:
+    """
+    (anime_id, score) pairs best first: local recommender if warm, else AniList, blended
+    with item-item collaborative filtering for users who rated anything
+    (RECOMMENDATIONS_CF_WEIGHT; 0 turns it off). neighbors, when given, must cover the
+    rated anime; otherwise they are loaded here.
+    """
+    k = k or materialized_size()
+    watched_anime = list(watched_anime)
+    ranked = local_ranking(favorite_genres, watched_anime, ratings, k=k)
+    if ranked is None:
+        ranked = anilist_ranking(favorite_genres, watched_anime, k=k)
+
+    weight = collaborative_weight()
+    if weight > 0 and ratings:
+        if neighbors is None:
+            neighbors = load_neighbors(ratings)
+        collaborative = score_from_neighbors(ratings, neighbors, exclude=watched_anime, k=k)
+        if collaborative:
+            ranked = blend_rankings(ranked or [], collaborative, weight, k)
+    return ranked
+
+
+def ranked_anime(ranked_ids: List[int], user_id: Optional[int] = None,
+                 projection: Optional[AnimeProjection] = None) -> List[CachedAnime]:
+    """
+    CachedAnime rows for a materialized ranking, in ranking order.
+
+    With user_id, anime the user has watched since the ranking was computed are dropped
+    (NOT EXISTS anti-join on WatchedAnime). With a projection, only its columns are loaded.
+    """
+    if not ranked_ids:
+        return []
+    queryset = CachedAnime.objects.all()
+    if projection is not None:
+        queryset = projection.apply(queryset)
+    if user_id is not None:
+        queryset = queryset.filter(unwatched_by(user_id))
+    anime_by_id = queryset.in_bulk(ranked_ids, field_name='anime_id')
+    return [anime_by_id[anime_id] for anime_id in ranked_ids if anime_id in anime_by_id]
+
+
+async def aranked_anime(ranked_ids: List[int], user_id: Optional[int] = None,
+                        projection: Optional[AnimeProjection] = None) -> List[CachedAnime]:
+    """ranked_anime through the async ORM, for async views."""
+    if not ranked_ids:
+        return []
+    queryset = CachedAnime.objects.all()
+    if projection is not None:
+        queryset = projection.apply(queryset)
+    if user_id is not None:
+        queryset = queryset.filter(unwatched_by(user_id))
+    anime_by_id = await queryset.ain_bulk(ranked_ids, field_name='anime_id')
+    return [anime_by_id[anime_id] for anime_id in ranked_ids if anime_id in anime_by_id]
+
+
+def mark_dirty(user_id: int):
+    """Queue a user for re-materialization, creating their cache row if needed."""
+    UserRecommendationCache.objects.bulk_create(
+        [UserRecommendationCache(user_id=user_id, dirty=True, dirtied_at=timezone.now())],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['dirty', 'dirtied_at'],
+    )
+
+
+def _clear_dirty(user_ids: List[int], started_at):
+    # A change marked after this run read the profile keeps the row dirty.
+    UserRecommendationCache.objects.filter(user_id__in=user_ids, dirty=True).filter(
+        Q(dirtied_at__isnull=True) | Q(dirtied_at__lte=started_at)
+    ).update(dirty=False)
+
+
+def refresh_recommendations(cache: UserRecommendationCache,
+                            favorite_genres: List[str]) -> Optional[List[CachedAnime]]:
+    """
+    Recompute recommendations and store them on the user's cache row.
+
+    Uses the local recommender when the catalog is warm, otherwise AniList's genre-based
+    ranking. Returns the ranked list, or None when AniList returned no data.
+    """
+    started_at = timezone.now()
+    watched_anime = list(WatchedAnime.objects.filter(user_id=cache.user_id).values_list('anime_id', flat=True))
+    ratings = dict(AnimePreference.objects.filter(user_id=cache.user_id).values_list('anime_id', 'rating'))
+    ranked = rank_recommendations(favorite_genres, watched_anime, ratings)
+    if ranked is None:
+        return None
+
+    cache.ranked_anime_ids = [anime_id for anime_id, _ in ranked]
+    cache.ranked_scores = [score for _, score in ranked]
+    cache.snapshot = build_snapshots({cache.user_id: cache.ranked_anime_ids})[cache.user_id]
+    cache.fingerprint = recommendation_fingerprint(favorite_genres, watched_anime, ratings)
+    cache.favorite_genres = favorite_genres
+    cache.save(update_fields=[
+        'ranked_anime_ids', 'ranked_scores', 'snapshot', 'fingerprint', 'favorite_genres', 'updated_at'
+    ])
+    _clear_dirty([cache.user_id], started_at)
+    bump_profile_version(cache.user_id)
+    return ranked_anime(cache.ranked_anime_ids)
+
+
+def materialize_users(user_ids: List[int]) -> int:
+    """
+    Recompute and store recommendations for a batch of users.
+
+    Profiles, watch lists, ratings and the rated anime's neighbours for the whole batch are
+    loaded in four queries, the snapshots in one more, and the rankings written back with one upsert. Users whose ranking could not be computed
+    (AniList unavailable) stay dirty. Returns the number of users materialized.
+    """
+    started_at = timezone.now()
+    profiles = dict(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'favorite_genres'))
+    watched = defaultdict(list)
+    for user_id, anime_id in WatchedAnime.objects.filter(user_id__in=user_ids).values_list('user_id', 'anime_id'):
+        watched[user_id].append(anime_id)
+    ratings = defaultdict(dict)
+    for user_id, anime_id, rating in AnimePreference.objects.filter(
+            user_id__in=user_ids).values_list('user_id', 'anime_id', 'rating'):
+        ratings[user_id][anime_id] = rating
+    neighbors = {}
+    if collaborative_weight() > 0:
+        neighbors = load_neighbors({anime_id for rated in ratings.values() for anime_id in rated})
+
+    rows = []
+    for user_id in user_ids:
+        favorite_genres = profiles.get(user_id) or []
+        ranked = []
+        if favorite_genres:
+            try:
+                ranked = rank_recommendations(favorite_genres, watched[user_id], ratings[user_id],
+                                              neighbors=neighbors)
+            except Exception as e:
+                logger.error(f"Error materializing recommendations for user {user_id}: {str(e)}")
+                ranked = None
+        if ranked is None:
+            continue
+        rows.append(UserRecommendationCache(
+            user_id=user_id,
+            favorite_genres=favorite_genres,
+            ranked_anime_ids=[anime_id for anime_id, _ in ranked],
+            ranked_scores=[score for _, score in ranked],
+            fingerprint=recommendation_fingerprint(favorite_genres, watched[user_id], ratings[user_id]),
+        ))
+
+    if rows:
+        snapshots = build_snapshots({row.user_id: row.ranked_anime_ids for row in rows})
+        for row in rows:
+            row.snapshot = snapshots[row.user_id]
+        UserRecommendationCache.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[
+                'favorite_genres', 'ranked_anime_ids', 'ranked_scores', 'fingerprint', 'snapshot', 'updated_at'
+            ],
+        )
+        _clear_dirty([row.user_id for row in rows], started_at)
+        for row in rows:
+            bump_profile_version(row.user_id)
+    return len(rows)
+
+
+def refresh_user_recommendations(user_id: int):
+    """Background entry point: recompute recommendations for a user from their current profile."""
+    materialize_users([user_id])
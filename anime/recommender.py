@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .models import CachedAnime
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FIELDS = ('anime_id', 'genres', 'average_score', 'popularity', 'updated_at')
+
+
+class GenreRecommender:
+    """
+    In-process ranking over the CachedAnime catalog.
+
+    Keeps a multi-hot genre matrix (rows = anime, columns = genres) plus score and
+    popularity vectors. Candidates are ranked by weighted genre overlap with the user's
+    genre weights, AniList average score and log popularity; watched/rated anime are
+    masked out and the top k are picked with argpartition.
+
+    The matrix is built once and then kept current incrementally: upserts in this
+    process call apply() directly, and sync() pulls rows changed since the newest
+    updated_at it has itself read.
+    """
+
+    GENRE_WEIGHT = 0.6
+    SCORE_WEIGHT = 0.3
+    POPULARITY_WEIGHT = 0.1
+    PREFERENCE_WEIGHT = 0.5
+
+    def __init__(self, sync_interval: float = 5.0):
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._built = False
+        self._last_sync = 0.0
+        self._high_water = None
+        self._size = 0
+        self._row_of: Dict[int, int] = {}
+        self._genre_index: Dict[str, int] = {}
+        self._anime_ids = np.zeros(0, dtype=np.int64)
+        self._genres = np.zeros((0, 0), dtype=np.float32)
+        self._scores = np.zeros(0, dtype=np.float32)
+        self._popularity = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, rows: int, columns: int):
+        """Grow the backing arrays geometrically so appends stay amortised O(1)."""
+        capacity, width = self._genres.shape
+        if rows <= capacity and columns <= width:
+            return
+        new_capacity = max(rows, capacity * 2, 64) if rows > capacity else capacity
+        new_width = max(columns, width)
+        genres = np.zeros((new_capacity, new_width), dtype=np.float32)
+        genres[:self._size, :width] = self._genres[:self._size]
+        self._genres = genres
+        if new_capacity != capacity:
+            for name in ('_anime_ids', '_scores', '_popularity'):
+                current = getattr(self, name)
+                grown = np.zeros(new_capacity, dtype=current.dtype)
+                grown[:self._size] = current[:self._size]
+                setattr(self, name, grown)
+
+    def _apply_rows(self, rows: Iterable[Tuple]):
+        rows = list(rows)
+        if not rows:
+            return
+        for _, genres, *_ in rows:
+            for genre in genres or ():
+                if genre not in self._genre_index:
+                    self._genre_index[genre] = len(self._genre_index)
+        new_ids = {row[0] for row in rows if row[0] not in self._row_of}
+        self._reserve(self._size + len(new_ids), len(self._genre_index))
+
+        for anime_id, genres, average_score, popularity, _ in rows:
+            row = self._row_of.get(anime_id)
+            if row is None:
+                row = self._size
+                self._row_of[anime_id] = row
+                self._anime_ids[row] = anime_id
+                self._size += 1
+            self._genres[row] = 0.0
+            columns = [self._genre_index[genre] for genre in genres or ()]
+            if columns:
+                self._genres[row, columns] = 1.0
+            self._scores[row] = (average_score or 0) / 100.0
+            self._popularity[row] = np.log1p(popularity or 0)
+
+    def apply(self, anime_list: Sequence[CachedAnime]):
+        """Fold freshly upserted rows into the matrix (only once it has been built)."""
+        if not self._built:
+            return
+        with self._lock:
+            self._apply_rows(
+                (anime.anime_id, anime.genres, anime.average_score, anime.popularity, anime.updated_at)
+                for anime in anime_list
+            )
+
+    def sync(self, force: bool = False):
+        """Build the matrix on first use, then pull rows changed since the last sync."""
+        now = time.monotonic()
+        if not force and self._built and now - self._last_sync < self.sync_interval:
+            return
+        with self._lock:
+            queryset = CachedAnime.objects.all()
+            if self._built and self._high_water is not None:
+                # >= rather than >: rows sharing the high-water timestamp are re-applied idempotently.
+                queryset = queryset.filter(updated_at__gte=self._high_water)
+            started = time.perf_counter()
+            rows = list(queryset.values_list(*CATALOG_FIELDS).iterator(chunk_size=2000))
+            self._apply_rows(rows)
+            # Only rows read here move the high-water mark: a local apply() can carry a
+            # timestamp newer than rows other workers have yet to be synced from.
+            seen = [row[-1] for row in rows if row[-1] is not None]
+            if seen and (self._high_water is None or max(seen) > self._high_water):
+                self._high_water = max(seen)
+            if not self._built:
+                logger.info(
+                    f"Built genre matrix: {self._size} anime x {len(self._genre_index)} genres "
+                    f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+                )
+            self._built = True
+            self._last_sync = now
+
+    def genre_weights(self, favorite_genres: Sequence[str],
+                      ratings: Optional[Dict[int, int]] = None) -> np.ndarray:
+        """
+        Per-genre weights: 1 for each favourite genre, shifted by the genres of rated anime
+        (ratings above 5.5 pull a genre up, below push it down).
+        """
+        weights = np.zeros(len(self._genre_index), dtype=np.float32)
+        for genre in favorite_genres:
+            column = self._genre_index.get(genre)
+            if column is not None:
+                weights[column] = 1.0
+        rated_rows = [
+            (self._row_of[anime_id], rating)
+            for anime_id, rating in (ratings or {}).items()
+            if anime_id in self._row_of
+        ]
+        if rated_rows:
+            rows = np.fromiter((row for row, _ in rated_rows), dtype=np.int64, count=len(rated_rows))
+            centred = np.fromiter(
+                ((rating - 5.5) / 4.5 for _, rating in rated_rows), dtype=np.float32, count=len(rated_rows)
+            )
+            preference = centred @ self._genres[rows, :weights.shape[0]] / len(rated_rows)
+            weights += self.PREFERENCE_WEIGHT * preference
+        return weights
+
+    def recommend(self, favorite_genres: Sequence[str], exclude: Iterable[int] = (),
+                  ratings: Optional[Dict[int, int]] = None, k: int = 20) -> List[Tuple[int, float]]:
+        """Return up to k (anime_id, score) pairs, best first."""
+        self.sync()
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return []
+            weights = self.genre_weights(favorite_genres, ratings)
+            positive = weights.clip(min=0).sum()
+            if positive <= 0:
+                return []
+
+            genres = self._genres[:n, :weights.shape[0]]
+            overlap = genres @ weights / positive
+            popularity = self._popularity[:n]
+            max_popularity = popularity.max() or 1.0
+            scores = (
+                self.GENRE_WEIGHT * overlap
+                + self.SCORE_WEIGHT * self._scores[:n]
+                + self.POPULARITY_WEIGHT * popularity / max_popularity
+            )
+            # Only anime sharing at least one liked genre are candidates.
+            scores[overlap <= 0] = -np.inf
+            excluded = [
+                self._row_of[anime_id]
+                for anime_id in set(exclude) | set(ratings or ())
+                if anime_id in self._row_of
+            ]
+            if excluded:
+                scores[excluded] = -np.inf
+
+            candidates = int(np.isfinite(scores).sum())
+            k = min(k, candidates)
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(int(self._anime_ids[row]), float(scores[row])) for row in top]
+
+
+_recommender: Optional[GenreRecommender] = None
+_recommender_lock = threading.Lock()
+
+
+def get_recommender() -> GenreRecommender:
+    global _recommender
+    if _recommender is None:
+        with _recommender_lock:
+            if _recommender is None:
+                _recommender = GenreRecommender(
+                    sync_interval=getattr(settings, 'RECOMMENDER_SYNC_INTERVAL', 5.0)
+                )
+    return _recommender
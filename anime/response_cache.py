@@ -0,0 +1,125 @@
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from core.timing import record_cache
+
+# (body, etag, last_modified) of one rendered 200 response.
+CachedResponse = Tuple[bytes, Optional[str], Optional[datetime]]
+
+
+class RecommendationResponseCache:
+    """
+    Rendered /anime/recommendations/ responses per user, in the shared cache.
+
+    One entry per user holds every projection that user asked for, tagged with the
+    user's profile version: a warm request is a single cache GET and no queries. The
+    profile version is bumped whenever the user's genres, ratings, watch list or
+    materialized recommendations change, and a bump deletes the entry. Entries are
+    written under the version read before the response was built and deleted again if
+    it moved in the meantime, so a response built from pre-change data never outlives
+    the change.
+    """
+
+    def __init__(self, alias: str = 'anilist', ttl: int = 600):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def version_key(user_id: int) -> str:
+        return f'profile-version:{user_id}'
+
+    @staticmethod
+    def entry_key(user_id: int) -> str:
+        return f'recommendations-response:{user_id}'
+
+    def version(self, user_id: int) -> int:
+        return self.shared.get(self.version_key(user_id), 0)
+
+    async def aversion(self, user_id: int) -> int:
+        return await self.shared.aget(self.version_key(user_id), 0)
+
+    def bump(self, user_id: int) -> int:
+        key = self.version_key(user_id)
+        self.shared.add(key, 0, None)
+        try:
+            version = self.shared.incr(key)
+        except ValueError:
+            # Evicted between add() and incr().
+            version = 1
+            self.shared.set(key, version, None)
+        self.shared.delete(self.entry_key(user_id))
+        return version
+
+    def _lookup(self, entry: Optional[Dict], variant: str) -> Optional[CachedResponse]:
+        cached = entry['responses'].get(variant) if entry is not None else None
+        record_cache('recommendations', 'hit' if cached is not None else 'miss')
+        return cached
+
+    def get(self, user_id: int, variant: str) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        return self._lookup(self.shared.get(self.entry_key(user_id)), variant)
+
+    async def aget(self, user_id: int, variant: str) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        return self._lookup(await self.shared.aget(self.entry_key(user_id)), variant)
+
+    def _merge(self, entry: Optional[Dict], version: int, variant: str, response: CachedResponse) -> Dict:
+        if entry is None or entry['version'] != version:
+            entry = {'version': version, 'responses': {}}
+        entry['responses'][variant] = response
+        return entry
+
+    def store(self, user_id: int, version: int, variant: str, response: CachedResponse):
+        if not self.enabled:
+            return
+        key = self.entry_key(user_id)
+        self.shared.set(key, self._merge(self.shared.get(key), version, variant, response), self.ttl)
+        if self.version(user_id) != version:
+            self.shared.delete(key)
+
+    async def astore(self, user_id: int, version: int, variant: str, response: CachedResponse):
+        if not self.enabled:
+            return
+        key = self.entry_key(user_id)
+        await self.shared.aset(key, self._merge(await self.shared.aget(key), version, variant, response), self.ttl)
+        if await self.aversion(user_id) != version:
+            await self.shared.adelete(key)
+
+
+_response_cache = None
+
+
+def get_recommendation_response_cache() -> RecommendationResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = RecommendationResponseCache(
+            alias=getattr(settings, 'ANILIST_CACHE_ALIAS', 'anilist'),
+            ttl=getattr(settings, 'RECOMMENDATION_RESPONSE_CACHE_TTL', 600),
+        )
+    return _response_cache
+
+
+def bump_profile_version(user_id: int):
+    """
+    Invalidate the user's cached recommendation responses: now, and again once the
+    current transaction commits, since a request between the two may have rebuilt a
+    response from the not yet committed (old) data.
+    """
+    cache = get_recommendation_response_cache()
+    cache.bump(user_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.bump(user_id))
@@ -0,0 +1,134 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchVector, TrigramWordSimilarity
+from django.db.models import BooleanField, Count, ExpressionWrapper, FloatField, Q, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import CachedAnime
+from .projection import AnimeProjection
+
+TITLE_FIELDS = ('title_romaji', 'title_english', 'title_native')
+
+
+def local_search_queryset(search: str = '', genre: str = ''):
+    """
+    CachedAnime matching a title query and/or genre, best match first.
+
+    Titles match through pg_trgm word similarity (GIN gin_trgm_ops indexes) and the
+    description through full-text search (GIN index on its english tsvector). With a
+    query, the title_match alias tells the two apart for the recall count.
+    """
+    queryset = CachedAnime.objects.all()
+    genre = (genre or '').strip()
+    if genre:
+        queryset = queryset.filter(genres__contains=[genre])
+
+    search = (search or '').strip()
+    if not search:
+        return queryset.order_by('-popularity', 'anime_id')
+
+    matches = Q()
+    for field in TITLE_FIELDS:
+        matches |= Q(**{f'{field}__trigram_word_similar': search})
+    # alias() rather than annotate(): filter on the tsvector without selecting it.
+    queryset = queryset.alias(
+        description_vector=SearchVector('description', config='english'),
+        title_match=ExpressionWrapper(matches, output_field=BooleanField()),
+    ).filter(
+        matches | Q(description_vector=SearchQuery(search, config='english'))
+    ).annotate(
+        similarity=Greatest(*(
+            Coalesce(TrigramWordSimilarity(search, field), Value(0.0), output_field=FloatField())
+            for field in TITLE_FIELDS
+        )),
+    )
+    return queryset.order_by('-similarity', '-popularity', 'anime_id')
+
+
+def _capped(queryset):
+    # Counting a capped subquery keeps huge genre-only matches from scanning everything.
+    return queryset.values('pk')[:getattr(settings, 'LOCAL_SEARCH_COUNT_CAP', 1000)]
+
+
+# Description-only hits are loose (one shared word), so only title matches count as recall.
+RECALL_COUNTS = {'total': Count('pk'), 'title_matches': Count('pk', filter=Q(title_match=True))}
+
+
+def _count_matches(queryset, search: str) -> Tuple[int, int]:
+    """(matches, title matches) within LOCAL_SEARCH_COUNT_CAP, in one query."""
+    if not (search or '').strip():
+        total = _capped(queryset).count()
+        return total, total
+    counts = _capped(queryset).aggregate(**RECALL_COUNTS)
+    return counts['total'], counts['title_matches']
+
+
+async def _acount_matches(queryset, search: str) -> Tuple[int, int]:
+    if not (search or '').strip():
+        total = await _capped(queryset).acount()
+        return total, total
+    counts = await _capped(queryset).aaggregate(**RECALL_COUNTS)
+    return counts['total'], counts['title_matches']
+
+
+def _page_offset(total: int, recall: int, page: int, per_page: int) -> Optional[int]:
+    # Too few title matches to trust local recall, or a page past the locally known matches.
+    if recall < getattr(settings, 'LOCAL_SEARCH_MIN_RESULTS', 10):
+        return None
+    offset = (page - 1) * per_page
+    if offset >= total:
+        return None
+    return offset
+
+
+def _page_info(total: int, page: int, per_page: int) -> Dict:
+    last_page = math.ceil(total / per_page)
+    return {
+        'total': total,
+        'currentPage': page,
+        'lastPage': last_page,
+        'hasNextPage': page < last_page,
+        'perPage': per_page,
+    }
+
+
+def local_search(search: str = '', genre: str = '', page: int = 1, per_page: int = 10,
+                 projection: Optional[AnimeProjection] = None) -> Optional[Tuple[Dict, List[CachedAnime]]]:
+    """
+    Answer a search page from CachedAnime, in the same shape as AniList's Page.
+
+    Returns None when local recall is too low to trust (fewer than
+    LOCAL_SEARCH_MIN_RESULTS matches, counting only title matches for a text query;
+    description matches are still returned) or the page lies past the locally known matches,
+    so the caller should ask AniList instead. With a projection, only its columns are
+    loaded for the result page.
+    """
+    queryset = local_search_queryset(search, genre)
+    total, recall = _count_matches(queryset, search)
+
+    offset = _page_offset(total, recall, page, per_page)
+    if offset is None:
+        return None
+
+    if projection is not None:
+        queryset = projection.apply(queryset)
+    results = list(queryset[offset:offset + per_page])
+    return _page_info(total, page, per_page), results
+
+
+async def alocal_search(search: str = '', genre: str = '', page: int = 1, per_page: int = 10,
+                        projection: Optional[AnimeProjection] = None) -> Optional[Tuple[Dict, List[CachedAnime]]]:
+    """local_search through the async ORM, for async views."""
+    queryset = local_search_queryset(search, genre)
+    total, recall = await _acount_matches(queryset, search)
+
+    offset = _page_offset(total, recall, page, per_page)
+    if offset is None:
+        return None
+
+    if projection is not None:
+        queryset = projection.apply(queryset)
+    results = [anime async for anime in queryset[offset:offset + per_page]]
+    return _page_info(total, page, per_page), results
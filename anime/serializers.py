@@ -1,7 +1,27 @@
 from rest_framework import serializers
 from .models import CachedAnime, Genre
 
+
+def truncate_description(text, length=None):
+    """Cut text to at most length characters at a word boundary, marking the cut with an ellipsis."""
+    if text is None or length is None or len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip() + '…'
+
+
 class CachedAnimeSerializer(serializers.ModelSerializer):
+    """
+    CachedAnime as exposed by the API.
+
+    fields limits the output to a subset of Meta.fields (in Meta order) and
+    description_length truncates the description. Instances loaded through
+    AnimeProjection.apply carry a description_excerpt instead of the full text.
+    """
+    description = serializers.SerializerMethodField()
+
     class Meta:
         model = CachedAnime
         fields = (
@@ -10,7 +30,18 @@ class CachedAnimeSerializer(serializers.ModelSerializer):
             'status', 'cover_image'
         )
 
+    def __init__(self, *args, fields=None, description_length=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.description_length = description_length
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def get_description(self, obj):
+        text = getattr(obj, 'description_excerpt', None) if hasattr(obj, 'description_excerpt') else obj.description
+        return truncate_description(text, self.description_length)
+
 class GenreSerializer(serializers.ModelSerializer):
     class Meta:
         model = Genre
-        fields = ('id', 'name', 'description') 
\ No newline at end of file
+        fields = ('id', 'name', 'description') 
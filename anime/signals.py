@@ -0,0 +1,42 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import AnimePreference, UserProfile
+from users.signals import preferences_changed, watched_anime_changed
+
+from .genres import get_genre_store
+from .models import Genre
+from .recommendations import mark_dirty
+from .response_cache import bump_profile_version
+
+
+def profile_changed(user_id):
+    # Queue the ranking for recomputation; cached responses are stale right away.
+    mark_dirty(user_id)
+    bump_profile_version(user_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'favorite_genres' not in update_fields:
+        return
+    profile_changed(instance.user_id)
+
+
+@receiver(watched_anime_changed)
+@receiver(preferences_changed)
+def written_in_bulk(sender, user_id, **kwargs):
+    profile_changed(user_id)
+
+
+@receiver(post_save, sender=AnimePreference)
+@receiver(post_delete, sender=AnimePreference)
+def preference_changed(sender, instance, **kwargs):
+    profile_changed(instance.user_id)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def genre_changed(sender, **kwargs):
+    # Edits outside refresh_genres (admin, shell) still reach every worker's catalog.
+    get_genre_store().invalidate()
@@ -1,3 +1,758 @@
-from django.test import TestCase
+import json
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from users.models import AnimePreference, UserProfile
+from users.signals import preferences_changed, watched_anime_changed
+from users.views import AnimePreferenceViewSet
+
+from .details import load_anime
+from .genres import VERSION_KEY, GenreCatalogStore, get_genre_store
+from .management.commands.materialize_recommendations import Command as MaterializeCommand
+from .models import CachedAnime, CatalogSyncState, Genre, UserRecommendationCache
+from .projection import COMPACT_FIELDS, AnimeProjection, ProjectionError
+from .query import RECOMMENDATION_ORDERING, unwatched_by
+from .recommendations import (
+    blend_rankings, build_snapshots, materialize_users, ranked_anime, recommendation_fingerprint,
+)
+from .response_cache import get_recommendation_response_cache
+from .recommender import GenreRecommender
+from .serializers import CachedAnimeSerializer, truncate_description
+from .search import _count_matches, alocal_search, local_search, local_search_queryset
+from .signals import profile_saved
+from .views import AnimeBatchView, AnimeDetailView, AnimeRecommendationsView
+from .warmup import warm_hot_recommendations, warm_worker
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'anime-tests'}
+
+
+class BlendRankingsTests(SimpleTestCase):
+
+    def test_scores_are_scaled_per_ranking_and_weighted(self):
+        content = [(1, 10.0), (2, 5.0)]
+        collaborative = [(3, 0.4), (2, 0.2)]
+
+        blended = dict(blend_rankings(content, collaborative, weight=0.25, k=10))
+
+        self.assertAlmostEqual(blended[1], 0.75 * 1.0)
+        self.assertAlmostEqual(blended[2], 0.75 * 0.5 + 0.25 * 0.5)
+        self.assertAlmostEqual(blended[3], 0.25 * 1.0)
+
+    def test_collaborative_only_when_content_is_empty(self):
+        self.assertEqual(blend_rankings([], [(3, 0.4), (4, 0.2)], weight=0.5, k=1), [(3, 0.5)])
+
+
+@mock.patch('anime.signals.bump_profile_version')
+@mock.patch('anime.signals.mark_dirty')
+class RecommendationDirtyTrackingTests(SimpleTestCase):
+
+    def test_favorite_genre_saves_mark_the_user_dirty(self, mark_dirty, bump):
+        profile = SimpleNamespace(user_id=7)
+
+        profile_saved(sender=UserProfile, instance=profile, update_fields=['updated_at'])
+        mark_dirty.assert_not_called()
+
+        profile_saved(sender=UserProfile, instance=profile, update_fields=['favorite_genres'])
+        profile_saved(sender=UserProfile, instance=profile)
+        self.assertEqual(mark_dirty.call_args_list, [mock.call(7), mock.call(7)])
+
+    def test_bulk_watch_list_and_rating_writes_mark_the_user_dirty(self, mark_dirty, bump):
+        watched_anime_changed.send(sender=UserProfile, user_id=7)
+        preferences_changed.send(sender=AnimePreference, user_id=8)
+
+        self.assertEqual(mark_dirty.call_args_list, [mock.call(7), mock.call(8)])
+        self.assertEqual(bump.call_args_list, [mock.call(7), mock.call(8)])
+
+
+@mock.patch('anime.recommendations.bump_profile_version')
+@mock.patch('anime.recommendations._clear_dirty')
+@mock.patch('anime.recommendations.build_snapshots', side_effect=lambda rankings: {key: [] for key in rankings})
+@mock.patch('anime.recommendations.UserRecommendationCache.objects')
+@mock.patch('anime.recommendations.AnimePreference.objects')
+@mock.patch('anime.recommendations.WatchedAnime.objects')
+@mock.patch('anime.recommendations.UserProfile.objects')
+class MaterializeUsersTests(SimpleTestCase):
+
+    def test_batch_is_written_ranked_in_one_upsert(self, profiles, watched, preferences, recommendation_caches, snapshots,
+                                                    clear_dirty, bump):
+        profiles.filter.return_value.values_list.return_value = [(1, ['Action']), (2, ['Drama']), (3, [])]
+        watched.filter.return_value.values_list.return_value = [(1, 10)]
+        preferences.filter.return_value.values_list.return_value = []
+        rankings = {('Action',): [(30, 0.9), (20, 0.5)], ('Drama',): None}
+
+        with mock.patch('anime.recommendations.rank_recommendations',
+                        side_effect=lambda genres, *args, **kwargs: rankings[tuple(genres)]) as rank:
+            self.assertEqual(materialize_users([1, 2, 3]), 2)
+
+        # One ranking per user with genres; AniList being down (None) leaves user 2 dirty.
+        self.assertEqual(rank.call_count, 2)
+        self.assertEqual(rank.call_args_list[0].args[1], [10])
+        rows, = recommendation_caches.bulk_create.call_args.args
+        self.assertEqual([(row.user_id, row.ranked_anime_ids, row.ranked_scores) for row in rows],
+                         [(1, [30, 20], [0.9, 0.5]), (3, [], [])])
+        self.assertTrue(recommendation_caches.bulk_create.call_args.kwargs['update_conflicts'])
+        clear_dirty.assert_called_once()
+        self.assertEqual(clear_dirty.call_args.args[0], [1, 3])
+        self.assertEqual(bump.call_args_list, [mock.call(1), mock.call(3)])
+
+    def test_command_runs_pending_users_in_chunks(self, *mocks):
+        with mock.patch.object(MaterializeCommand, 'pending_users', return_value=[1, 2, 3, 4, 5]), \
+                mock.patch('anime.management.commands.materialize_recommendations.materialize_users',
+                           side_effect=len) as materialize:
+            out = StringIO()
+            call_command('materialize_recommendations', workers=1, chunk_size=2, stdout=out)
+
+        self.assertEqual(materialize.call_args_list, [mock.call([1, 2]), mock.call([3, 4]), mock.call([5])])
+        self.assertIn('Materialized 5/5 users in 3 chunks', out.getvalue())
+
+
+class RankedStorageTests(SimpleTestCase):
+
+    @mock.patch('anime.recommendations.CachedAnime.objects')
+    def test_ranked_anime_keeps_rank_order_from_one_in_bulk(self, objects):
+        rows = {anime_id: SimpleNamespace(anime_id=anime_id) for anime_id in (10, 30, 20)}
+        objects.all.return_value.in_bulk.return_value = rows
+
+        ranked = ranked_anime([20, 40, 10, 30])
+
+        self.assertEqual([anime.anime_id for anime in ranked], [20, 10, 30])
+        objects.all.return_value.in_bulk.assert_called_once_with([20, 40, 10, 30], field_name='anime_id')
+
+    def test_fingerprint_ignores_input_order_but_not_content(self):
+        fingerprint = recommendation_fingerprint(['Action', 'Drama'], [3, 1], {5: 8, 2: 9})
+
+        self.assertEqual(fingerprint, recommendation_fingerprint(['Drama', 'Action'], [1, 3], {2: 9, 5: 8}))
+        self.assertNotEqual(fingerprint, recommendation_fingerprint(['Action', 'Drama'], [1, 3], {2: 9, 5: 7}))
+        self.assertNotEqual(fingerprint, recommendation_fingerprint(['Action', 'Drama'], [1], {2: 9, 5: 8}))
+
+    @mock.patch('anime.views.ranked_anime')
+    def test_clean_row_is_served_from_its_snapshot_without_a_query(self, ranked):
+        snapshot = [{'id': anime_id, 'anime_id': anime_id, 'title_romaji': f'Anime {anime_id}',
+                     'description': 'x' * 20, 'average_score': 80} for anime_id in (3, 1, 2)]
+        cache = SimpleNamespace(
+            dirty=False, snapshot=snapshot, ranked_anime_ids=[3, 1, 2], fingerprint='f',
+            updated_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        )
+        request = APIRequestFactory().get('/api/anime/recommendations/')
+
+        response = AnimeRecommendationsView().ranked_response(
+            request, cache, 7, AnimeProjection(('anime_id', 'description'), description_length=5))
+
+        ranked.assert_not_called()
+        self.assertEqual([item['anime_id'] for item in response.data], [3, 1, 2])
+        self.assertEqual(set(response.data[0]), {'anime_id', 'description'})
+        self.assertIn('ETag', response)
+
+    @mock.patch('anime.views.render_anime_list', return_value=[])
+    @mock.patch('anime.views.ranked_anime', return_value=[])
+    def test_dirty_row_is_reread_through_the_watched_filter(self, ranked, render_list):
+        cache = SimpleNamespace(dirty=True, snapshot=[{'anime_id': 3}], ranked_anime_ids=[3, 1])
+        projection = AnimeProjection.list_max()
+
+        AnimeRecommendationsView().ranked_response(
+            APIRequestFactory().get('/api/anime/recommendations/'), cache, 7, projection)
+
+        ranked.assert_called_once_with([3, 1], 7, projection)
+
+
+@override_settings(ANIME_DESCRIPTION_TRUNCATE=12)
+class AnimeProjectionTests(SimpleTestCase):
+
+    def projection(self, path, **kwargs):
+        return AnimeProjection.from_request(Request(APIRequestFactory().get(path)), **kwargs)
+
+    def test_list_views_default_to_compact_and_always_truncate(self):
+        compact = self.projection('/api/anime/search/')
+        full = self.projection('/api/anime/search/?view=full')
+
+        self.assertEqual(compact.fields, COMPACT_FIELDS)
+        self.assertEqual(compact.description_length, 12)
+        self.assertEqual(full.fields, CachedAnimeSerializer.Meta.fields)
+        self.assertEqual(full.description_length, 12)
+
+    def test_only_the_detail_view_gets_the_full_description(self):
+        self.assertIsNone(self.projection('/api/anime/1/?view=full', default='full').description_length)
+
+    def test_fields_override_the_view_in_serializer_order(self):
+        projection = self.projection('/api/anime/search/?view=full&fields=genres, anime_id')
+
+        self.assertEqual(projection.fields, ('anime_id', 'genres'))
+        self.assertIsNone(projection.description_length)
+
+    def test_unknown_view_or_field_is_rejected(self):
+        with self.assertRaisesMessage(ProjectionError, 'view must be one of'):
+            self.projection('/api/anime/search/?view=tiny')
+        with self.assertRaisesMessage(ProjectionError, 'Unknown fields: password'):
+            self.projection('/api/anime/search/?fields=anime_id,password')
+
+    def test_truncated_projection_selects_an_excerpt_instead_of_the_description(self):
+        sql, params = self.projection('/api/anime/search/').apply(CachedAnime.objects.all()).query.sql_with_params()
+
+        self.assertNotIn(', "anime_cachedanime"."description"', sql)
+        self.assertIn('SUBSTRING("anime_cachedanime"."description", %s, %s) AS "description_excerpt"', sql)
+        self.assertEqual(params, (1, 13))
+        self.assertNotIn('"anime_cachedanime"."average_score"', sql)
+
+    def test_serializer_truncates_at_a_word_boundary(self):
+        anime = CachedAnime(anime_id=1, title_romaji='A', description='Pirates sailing the seas')
+        anime.description_excerpt = anime.description[:13]
+
+        data = AnimeProjection(COMPACT_FIELDS, 12).serializer(anime).data
+
+        self.assertEqual(data['description'], 'Pirates…')
+        self.assertEqual(set(data), set(COMPACT_FIELDS))
+        self.assertEqual(truncate_description('Short', 12), 'Short')
+
+
+class WorkerWarmupTests(SimpleTestCase):
+
+    @mock.patch('anime.warmup.connections')
+    @mock.patch('anime.warmup.get_recommender')
+    @mock.patch('anime.warmup.warm_genre_catalog', side_effect=RuntimeError('no database'))
+    @mock.patch('anime.warmup.warm_urls')
+    def test_a_failing_step_does_not_stop_the_worker(self, warm_urls, warm_catalog, get_recommender, connections):
+        with mock.patch('anime.warmup.warm_hot_recommendations') as warm_hot, \
+                self.assertLogs('anime.warmup', 'WARNING') as logs:
+            timings = warm_worker()
+
+        self.assertEqual(list(timings), ['urls', 'genre_catalog', 'recommender', 'hot_recommendations'])
+        get_recommender.return_value.sync.assert_called_once_with(force=True)
+        warm_hot.assert_called_once()
+        self.assertIn('genre_catalog failed: no database', logs.output[0])
+        connections.close_all.assert_called_once_with()
+
+    @mock.patch('anime.warmup.render_anime_list')
+    @mock.patch('anime.warmup.CachedAnime.objects')
+    @mock.patch('anime.warmup.UserRecommendationCache.objects')
+    def test_hot_recommendations_are_the_most_shared_snapshot_heads(self, recommendation_caches, anime, render_list):
+        recommendation_caches.filter.return_value.order_by.return_value.values_list.return_value.__getitem__.return_value = [
+            [1, 2, 3], [2, 3, 4], [3, 2, 9],
+        ]
+
+        with override_settings(RECOMMENDATIONS_SNAPSHOT_SIZE=2):
+            self.assertEqual(warm_hot_recommendations(limit=2), 2)
+
+        anime.filter.assert_called_once_with(anime_id__in=[2, 3])
+        render_list.assert_called_once()
+
+
+class GenreRecommenderSyncTests(SimpleTestCase):
+
+    def test_local_apply_does_not_move_the_sync_high_water_mark(self):
+        built_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        recommender = GenreRecommender()
+        manager = mock.MagicMock()
+        manager.all.return_value.values_list.return_value.iterator.return_value = [
+            (1, ['Action'], 80, 1000, built_at),
+        ]
+        with mock.patch('anime.recommender.CachedAnime.objects', manager):
+            recommender.sync(force=True)
+
+            # This worker upserts a row later than a row another worker is still committing.
+            recommender.apply([SimpleNamespace(
+                anime_id=2, genres=['Drama'], average_score=70, popularity=10,
+                updated_at=built_at + timedelta(minutes=5),
+            )])
+            filtered = manager.all.return_value.filter
+            filtered.return_value.values_list.return_value.iterator.return_value = [
+                (3, ['Comedy'], 60, 50, built_at + timedelta(minutes=1)),
+            ]
+            recommender.sync(force=True)
+
+        filtered.assert_called_once_with(updated_at__gte=built_at)
+        self.assertEqual(len(recommender), 3)
+        self.assertEqual(recommender._high_water, built_at + timedelta(minutes=1))
+
+
+class UnwatchedByTests(SimpleTestCase):
+
+    def test_watch_list_is_an_anti_join_not_a_literal_list(self):
+        sql, params = CachedAnime.objects.filter(unwatched_by(7)).query.sql_with_params()
+
+        self.assertIn('NOT EXISTS', sql)
+        self.assertIn('U0."anime_id" = ("anime_cachedanime"."anime_id")', sql)
+        self.assertNotIn(' IN (', sql)
+        self.assertEqual(params[-1], 7)
+
+
+@override_settings(LOCAL_SEARCH_MIN_RESULTS=10)
+@mock.patch('anime.search.local_search_queryset')
+class LocalSearchRecallTests(SimpleTestCase):
+
+    def test_description_only_matches_do_not_count_toward_recall(self, queryset):
+        with mock.patch('anime.search._count_matches', return_value=(25, 3)):
+            self.assertIsNone(local_search('naruto'))
+        queryset.return_value.__getitem__.assert_not_called()
+
+    def test_enough_title_matches_answer_locally_with_every_match_in_the_total(self, queryset):
+        queryset.return_value.__getitem__.return_value = ['row'] * 10
+        with mock.patch('anime.search._count_matches', return_value=(25, 12)):
+            page_info, results = local_search('naruto', page=2)
+
+        queryset.return_value.__getitem__.assert_called_once_with(slice(10, 20))
+        self.assertEqual(page_info['total'], 25)
+        self.assertEqual(page_info['lastPage'], 3)
+        self.assertEqual(len(results), 10)
+
+    def test_page_past_the_known_matches_falls_back(self, queryset):
+        with mock.patch('anime.search._count_matches', return_value=(20, 20)):
+            self.assertIsNone(local_search('naruto', page=3))
+
+    async def test_async_search_uses_the_same_recall_threshold(self, queryset):
+        with mock.patch('anime.search._acount_matches', return_value=(25, 3)):
+            self.assertIsNone(await alocal_search('naruto'))
+
+    def test_title_and_total_counts_come_from_one_aggregate(self, queryset):
+        capped = mock.MagicMock()
+        capped.aggregate.return_value = {'total': 25, 'title_matches': 3}
+        with mock.patch('anime.search._capped', return_value=capped):
+            self.assertEqual(_count_matches(queryset.return_value, 'naruto'), (25, 3))
+            self.assertEqual(set(capped.aggregate.call_args.kwargs), {'total', 'title_matches'})
+
+            capped.count.return_value = 40
+            self.assertEqual(_count_matches(queryset.return_value, ''), (40, 40))
+
+
+class GenreTable:
+    """Stands in for Genre.objects: bulk_create upserts by name, order_by lists the rows."""
+
+    def __init__(self, *names):
+        self.rows = {}
+        self.bulk_create([Genre(name=name) for name in names])
+
+    def bulk_create(self, genres, **kwargs):
+        for genre in genres:
+            row = self.rows.setdefault(genre.name, Genre(id=len(self.rows) + 1, name=genre.name))
+            row.updated_at = genre.updated_at or datetime.now(timezone.utc)
+        return genres
+
+    def order_by(self, *fields):
+        return sorted(self.rows.values(), key=lambda genre: genre.id)
+
+
+@override_settings(CACHES={'default': LOCMEM, 'anilist': LOCMEM})
+class GenreCatalogStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['anilist'].clear()
+        self.genres = GenreTable('Action', 'Drama')
+        patcher = mock.patch('anime.genres.Genre.objects', self.genres)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_refresh_in_one_worker_is_picked_up_by_another(self):
+        refreshing = GenreCatalogStore(check_interval=0)
+        other = GenreCatalogStore(check_interval=0)
+        before = other.get()
+        self.assertNotIn('Mecha', before)
+
+        catalog = refreshing.refresh(['Action', 'Mecha'])
+
+        self.assertEqual(caches['anilist'].get(VERSION_KEY), catalog.version)
+        self.assertNotEqual(catalog.version, before.version)
+        after = other.get()
+        self.assertEqual(after.version, catalog.version)
+        self.assertEqual(after.names, {'Action', 'Drama', 'Mecha'})
+
+    def test_workers_recheck_the_version_only_after_the_interval(self):
+        other = GenreCatalogStore(check_interval=60)
+        other.get()
+
+        GenreCatalogStore().refresh(['Mecha'])
+
+        self.assertNotIn('Mecha', other.get())
+        other._checked -= 60
+        self.assertIn('Mecha', other.get())
+
+    @mock.patch('anime.genres.AniListAPI.get_genre_list', return_value=['Action', 'Sports'])
+    def test_refresh_genres_command_publishes_anilists_list(self, get_genre_list):
+        other = GenreCatalogStore(check_interval=0)
+        other.get()
+
+        with mock.patch('anime.genres._store', GenreCatalogStore(check_interval=0)):
+            call_command('refresh_genres', stdout=mock.MagicMock())
+
+        get_genre_list.assert_called_once_with()
+        self.assertEqual(other.get().names, {'Action', 'Drama', 'Sports'})
+
+
+@mock.patch('anime.details.get_revalidator')
+@mock.patch('anime.details.refresh_anime', side_effect=requests.ConnectionError('AniList is down'))
+@mock.patch('anime.details.CachedAnime.objects')
+class LoadAnimeTests(SimpleTestCase):
+
+    def cached(self, objects, *anime_ids, stale=()):
+        now = datetime.now(timezone.utc)
+        objects.all.return_value.in_bulk.return_value = {
+            anime_id: SimpleNamespace(
+                anime_id=anime_id, status='RELEASING', updated_at=now,
+                fetched_at=now - timedelta(days=1) if anime_id in stale else now,
+            )
+            for anime_id in anime_ids
+        }
+
+    def test_stale_rows_fetched_with_missing_ids_bypass_the_response_cache(self, objects, refresh, revalidator):
+        self.cached(objects, 1, 2, stale=[2])
+        refresh.side_effect = None
+        refresh.return_value = {}
+
+        load_anime([1, 2, 3])
+
+        refresh.assert_called_once_with([3, 2], refetch=[2])
+
+    def test_stale_rows_are_revalidated_when_the_foreground_fetch_fails(self, objects, refresh, revalidator):
+        self.cached(objects, 1, 2, stale=[2])
+
+        found, missing, unavailable = load_anime([1, 2, 3])
+
+        self.assertEqual([anime.anime_id for anime in found], [1, 2])
+        self.assertEqual(unavailable, [3])
+        revalidator.return_value.submit.assert_called_once()
+        self.assertEqual(revalidator.return_value.submit.call_args.args[0], 'anime-details:2')
+
+    def test_failed_fetch_reports_ids_as_unavailable_not_missing(self, objects, refresh, revalidator):
+        self.cached(objects, 1)
+
+        found, missing, unavailable = load_anime([1, 2, 3])
+
+        self.assertEqual([anime.anime_id for anime in found], [1])
+        self.assertEqual(missing, [])
+        self.assertEqual(unavailable, [2, 3])
+
+    def test_nothing_cached_and_fetch_failed(self, objects, refresh, revalidator):
+        self.cached(objects)
+        self.assertEqual(load_anime([2]), ([], [], [2]))
+
+    def test_ids_anilist_does_not_know_are_missing(self, objects, refresh, revalidator):
+        self.cached(objects, 1)
+        refresh.side_effect = None
+        refresh.return_value = {}
+
+        self.assertEqual(load_anime([1, 2])[1:], ([2], []))
+
+
+class AnimeUnavailableViewTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = SimpleNamespace(is_authenticated=True, is_active=True)
+        self.anime = SimpleNamespace(anime_id=1, updated_at=datetime(2024, 1, 2, tzinfo=timezone.utc))
+
+    def get(self, view, path, **kwargs):
+        request = self.factory.get(path, HTTP_ACCEPT='application/json')
+        force_authenticate(request, self.user)
+        response = view.as_view()(request, **kwargs)
+        response.render()
+        return response
+
+    @mock.patch('anime.views.render_anime_list', return_value=[{'anime_id': 1}])
+    def test_batch_with_some_ids_unavailable_is_partial_and_uncached(self, render_list):
+        with mock.patch('anime.views.load_anime', return_value=([self.anime], [3], [2])):
+            response = self.get(AnimeBatchView, '/api/anime/batch/?ids=1,2,3')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'results': [{'anime_id': 1}], 'missing': [3], 'unavailable': [2]})
+        self.assertNotIn('ETag', response)
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_batch_with_every_id_unavailable_is_503(self):
+        with mock.patch('anime.views.load_anime', return_value=([], [], [1, 2])):
+            response = self.get(AnimeBatchView, '/api/anime/batch/?ids=1,2')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn('ETag', response)
+
+    def test_detail_unavailable_is_503_not_404(self):
+        with mock.patch('anime.views.load_anime', return_value=([], [], [2])):
+            response = self.get(AnimeDetailView, '/api/anime/2/', anime_id=2)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn('ETag', response)
+
+
+def genre_ranking(favorite_genres, watched_anime, ratings=None, k=None, neighbors=None):
+    """Stand-in for rank_recommendations that never calls AniList."""
+    return [
+        (anime_id, 1.0) for anime_id in CachedAnime.objects.filter(genres__overlap=favorite_genres).exclude(
+            anime_id__in=list(watched_anime)
+        ).order_by('anime_id').values_list('anime_id', flat=True)
+    ]
+
+
+def create_viewer():
+    """24 anime (odd ids Action, even ids Drama) and a user with a clean Action ranking."""
+    for anime_id in range(1, 25):
+        CachedAnime.objects.create(
+            anime_id=anime_id, title_romaji=f'Anime {anime_id}', status='FINISHED',
+            genres=['Action'] if anime_id % 2 else ['Drama'],
+            average_score=90 - anime_id, popularity=1000 - anime_id,
+        )
+    user = User.objects.create_user(username='viewer', password=None)
+    profile = UserProfile.objects.create(user=user, favorite_genres=['Action'])
+    ranked_ids = [anime_id for anime_id, _ in genre_ranking(['Action'], [])]
+    UserRecommendationCache.objects.create(
+        user=user, favorite_genres=['Action'], dirty=False,
+        ranked_anime_ids=ranked_ids, ranked_scores=[1.0] * len(ranked_ids),
+        snapshot=build_snapshots({user.id: ranked_ids})[user.id],
+    )
+    return user, profile
+
+
+@override_settings(CACHES={'default': LOCMEM, 'anilist': LOCMEM})
+@mock.patch.object(AnimeRecommendationsView, 'revalidate')
+@mock.patch('anime.recommendations.rank_recommendations', side_effect=genre_ranking)
+class RecommendationResponseCacheInvalidationTests(TestCase):
+    """A cached response must never outlive a change to anything it was built from."""
+
+    def setUp(self):
+        self.user, self.profile = create_viewer()
+        self.client = APIClient()
+
+    def get(self):
+        """(anime ids served, whether the response came from the response cache)."""
+        # A fresh User per request, as authentication would load it.
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/anime/recommendations/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return [anime['anime_id'] for anime in response.json()], len(queries) == 0
+
+    def warm(self):
+        served, _ = self.get()
+        served_again, cached = self.get()
+        self.assertTrue(cached)
+        self.assertEqual(served_again, served)
+        return served
+
+    def test_warm_hit_runs_no_queries(self, rank, revalidate):
+        served = self.warm()
+        self.assertEqual(served, [anime_id for anime_id in range(1, 25, 2)][:10])
+
+    def test_profile_genres_saved(self, rank, revalidate):
+        self.warm()
+        self.profile.favorite_genres = ['Drama']
+        self.profile.save()
+
+        served, cached = self.get()
+
+        self.assertFalse(cached)
+        self.assertEqual(served, list(range(2, 25, 2))[:10])
+
+    def test_preference_created(self, rank, revalidate):
+        self.warm()
+        AnimePreference.objects.create(user=self.user, anime_id=3, rating=9)
+
+        _, cached = self.get()
+
+        self.assertFalse(cached)
+        self.assertTrue(UserRecommendationCache.objects.get(user=self.user).dirty)
+        revalidate.assert_called_with(self.user.id)
+
+    def test_preference_deleted(self, rank, revalidate):
+        preference = AnimePreference.objects.create(user=self.user, anime_id=3, rating=9)
+        self.warm()
+        preference.delete()
+
+        _, cached = self.get()
+
+        self.assertFalse(cached)
+        self.assertTrue(UserRecommendationCache.objects.get(user=self.user).dirty)
+
+    def test_preferences_bulk_created(self, rank, revalidate):
+        self.warm()
+        request = APIRequestFactory().post(
+            '/api/preferences/bulk_create/', [{'anime_id': 3, 'rating': 8}, {'anime_id': 5, 'rating': 2}],
+            format='json',
+        )
+        force_authenticate(request, self.user)
+        response = AnimePreferenceViewSet.as_view({'post': 'bulk_create'})(request)
+        self.assertEqual(response.status_code, 201)
+
+        _, cached = self.get()
+
+        self.assertFalse(cached)
+        self.assertEqual(AnimePreference.objects.filter(user=self.user).count(), 2)
+
+    def test_anime_watched(self, rank, revalidate):
+        served = self.warm()
+        self.profile.add_watched([served[0]])
+
+        served_after, cached = self.get()
+
+        self.assertFalse(cached)
+        self.assertNotIn(served[0], served_after)
+        # The rebuilt response is cached again and still excludes it.
+        served_cached, cached = self.get()
+        self.assertTrue(cached)
+        self.assertNotIn(served[0], served_cached)
+
+    def test_anime_unwatched(self, rank, revalidate):
+        self.profile.add_watched([1])
+        served = self.warm()
+        self.assertNotIn(1, served)
+        self.profile.remove_watched([1])
+
+        served_after, cached = self.get()
+
+        self.assertFalse(cached)
+        self.assertIn(1, served_after)
+
+
+@override_settings(CACHES={'default': LOCMEM, 'anilist': LOCMEM})
+@mock.patch.object(AnimeRecommendationsView, 'revalidate')
+class ConditionalRequestTests(TestCase):
+    """A matching If-None-Match is answered 304 before anything is ranked or serialized."""
+
+    def setUp(self):
+        caches['anilist'].clear()
+        get_genre_store().reset()
+        for name in ('Action', 'Drama'):
+            Genre.objects.create(name=name)
+        self.user, _ = create_viewer()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def etag(self, path):
+        response = self.client.get(path, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        return response['ETag']
+
+    def assert_not_modified_without_rendering(self, path):
+        etag = self.etag(path)
+        with mock.patch('anime.views.render_anime_list') as render_list, \
+                mock.patch.object(AnimeProjection, 'project') as project, \
+                mock.patch('anime.views.dumps') as dumps, \
+                mock.patch('anime.recommendations.rank_recommendations') as rank, \
+                mock.patch('anime.views.AniListAPI') as anilist:
+            response = self.client.get(path, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        for patched in (render_list, project, dumps, rank, anilist):
+            self.assertEqual(patched.mock_calls, [])
+
+    def test_genres(self, revalidate):
+        etag = self.etag('/api/anime/genres/')
+        with mock.patch('anime.genres.GenreSerializer') as serializer:
+            response = self.client.get(
+                '/api/anime/genres/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag,
+            )
+        self.assertEqual(response.status_code, 304)
+        serializer.assert_not_called()
+
+    def test_search(self, revalidate):
+        self.assert_not_modified_without_rendering('/api/anime/search/?genre=Action')
+
+    def test_recommendations_from_the_response_cache(self, revalidate):
+        self.assert_not_modified_without_rendering('/api/anime/recommendations/')
+
+    def test_recommendations_from_the_snapshot(self, revalidate):
+        with mock.patch.object(get_recommendation_response_cache(), 'ttl', 0):
+            self.assert_not_modified_without_rendering('/api/anime/recommendations/')
+
+
+def plan_nodes(node):
+    """Flatten an EXPLAIN (FORMAT JSON) plan tree."""
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'query plans are checked against PostgreSQL')
+class QueryPlanTests(TestCase):
+    """The recommendation and local-search queries can use the indexes built for them."""
+
+    TRIGRAM_INDEXES = {'anime_title_romaji_trgm', 'anime_title_english_trgm', 'anime_title_native_trgm'}
+
+    def setUp(self):
+        # An empty test table is always cheapest to seq-scan; this asks whether the indexes
+        # are usable at all, which is what a missing or mismatched index breaks. SET LOCAL
+        # ends with the test's transaction.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return list(plan_nodes(plan[0]['Plan']))
+
+    def index_names(self, queryset):
+        return {node['Index Name'] for node in self.plan(queryset) if 'Index Name' in node}
+
+    def test_genre_overlap_uses_the_genre_gin_index(self):
+        queryset = CachedAnime.objects.filter(genres__overlap=['Action', 'Comedy']).values('id')
+        self.assertIn('anime_genres_gin', self.index_names(queryset))
+
+    def test_genre_search_uses_the_genre_gin_index(self):
+        queryset = local_search_queryset(genre='Action').values('id')
+        self.assertIn('anime_genres_gin', self.index_names(queryset))
+
+    def test_title_search_uses_the_trigram_indexes(self):
+        queryset = local_search_queryset(search='naruto').values('id')
+        self.assertTrue(self.TRIGRAM_INDEXES & self.index_names(queryset))
+
+    def test_score_ordering_uses_the_ordering_index(self):
+        queryset = CachedAnime.objects.order_by(*RECOMMENDATION_ORDERING).values('id')[:10]
+        self.assertIn('anime_score_popularity_idx', self.index_names(queryset))
+
+    def test_watched_exclusion_is_an_anti_join(self):
+        queryset = (
+            CachedAnime.objects.filter(genres__overlap=['Action']).filter(unwatched_by(0))
+            .order_by(*RECOMMENDATION_ORDERING).values('id')[:10]
+        )
+        self.assertIn('Anti', {node.get('Join Type') for node in self.plan(queryset)})
+
+
+def catalog_page(page, media=(), has_next_page=True):
+    return {'data': {'Page': {'pageInfo': {'currentPage': page, 'hasNextPage': has_next_page},
+                              'media': list(media)}}}
+
+
+@mock.patch('anime.management.commands.sync_catalog.get_client')
+class SyncCatalogTests(TestCase):
+
+    def run_sync(self, pages, **options):
+        responses = {page: response for page, response in enumerate(pages, start=1)}
+        with mock.patch('core.anilist.AniListAPI.get_catalog_page',
+                        side_effect=lambda page, **kwargs: responses[page]) as get_page:
+            call_command('sync_catalog', concurrency=1, stdout=mock.Mock(), **options)
+        return get_page
+
+    def test_api_url_is_passed_to_the_client_not_set_globally(self, get_client):
+        before = getattr(settings, 'ANILIST_API_URL', None)
+
+        get_page = self.run_sync([catalog_page(1, has_next_page=False)], api_url='http://stub.invalid/')
+
+        get_client.assert_called_with('http://stub.invalid/')
+        self.assertEqual(get_page.call_args.kwargs['api_url'], 'http://stub.invalid/')
+        self.assertEqual(getattr(settings, 'ANILIST_API_URL', None), before)
+
+    def test_graphql_errors_stop_the_sync_before_the_failed_page(self, get_client):
+        media = [{'id': 1, 'updatedAt': 100, 'title': {'romaji': 'Anime 1'}}]
+        with self.assertRaisesMessage(CommandError, 'AniList returned errors for page 2'):
+            self.run_sync([
+                catalog_page(1, media),
+                {'data': None, 'errors': [{'message': 'Internal Server Error', 'status': 500}]},
+            ])
+
+        state = CatalogSyncState.objects.get(name='anime')
+        self.assertTrue(state.in_progress)
+        self.assertEqual(state.last_page, 1)
+        self.assertTrue(CachedAnime.objects.filter(anime_id=1).exists())
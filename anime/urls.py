@@ -1,7 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from .views import AnimeSearchView, AnimeRecommendationsView
+from .views import AnimeBatchView, AnimeDetailView, AnimeGenresView, AnimeSearchView, AnimeRecommendationsView
+
+if getattr(settings, 'ASYNC_VIEWS', False):
+    # ASGI deployments: the AniList-bound views await upstream calls on the event loop.
+    from .async_views import (
+        AsyncAnimeGenresView as AnimeGenresView,
+        AsyncAnimeRecommendationsView as AnimeRecommendationsView,
+        AsyncAnimeSearchView as AnimeSearchView,
+    )
 
 urlpatterns = [
     path('anime/search/', AnimeSearchView.as_view(), name='anime-search'),
     path('anime/recommendations/', AnimeRecommendationsView.as_view(), name='anime-recommendations'),
-] 
\ No newline at end of file
+    path('anime/genres/', AnimeGenresView.as_view(), name='anime-genres'),
+    path('anime/batch/', AnimeBatchView.as_view(), name='anime-batch'),
+    path('anime/<int:anime_id>/', AnimeDetailView.as_view(), name='anime-detail'),
+]
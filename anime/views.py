@@ -1,14 +1,28 @@
 from django.shortcuts import render
-from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import action
+from rest_framework import status, permissions
 from rest_framework.response import Response
-from django.db.models import Q
+from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
-from .models import CachedAnime, Genre, UserRecommendationCache
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_http_date
+from .models import UserRecommendationCache
 from .serializers import CachedAnimeSerializer, GenreSerializer
+from .details import load_anime
+from .fragments import render_anime, render_anime_list
+from .genres import ensure_genre_catalog
+from .projection import AnimeProjection, ProjectionError
+from .ingest import upsert_media
+from .recommendations import ranked_anime, refresh_recommendations, refresh_user_recommendations
+from .response_cache import get_recommendation_response_cache
+from .search import local_search
 from core.anilist import AniListAPI
-from users.models import UserProfile, AnimePreference
+from core.conditional import make_etag, not_modified, set_cache_headers
+from core.debuglog import log_payload
+from core.renderers import RenderedJSON, dumps
+from core.swr import get_revalidator
+from users.authentication import NO_GENRES_DIGEST, claimed_genres_digest, genres_digest
+from users.models import AnimePreference
 from rest_framework.views import APIView
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -16,99 +30,47 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-class AnimeViewSet(viewsets.ReadOnlyModelViewSet):
-    serializer_class = CachedAnimeSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        return CachedAnime.objects.all()
-
-    @action(detail=False, methods=['get'])
-    def search(self, request):
-        search_query = request.query_params.get('q', '')
-        genre = request.query_params.get('genre', '')
-        page = int(request.query_params.get('page', 1))
-        
-        try:
-            # Search AniList API
-            response = AniListAPI.search_anime(search=search_query, genre=genre, page=page)
-            
-            # Cache the results
-            media_list = response.get('data', {}).get('Page', {}).get('media', [])
-            for media in media_list:
-                CachedAnime.objects.update_or_create(
-                    anime_id=media['id'],
-                    defaults={
-                        'title_romaji': media['title']['romaji'],
-                        'title_english': media['title']['english'],
-                        'title_native': media['title']['native'],
-                        'description': media['description'],
-                        'genres': media['genres'],
-                        'average_score': media['averageScore'],
-                        'popularity': media['popularity'],
-                        'episodes': media['episodes'],
-                        'status': media['status'],
-                        'cover_image': media['coverImage']['large'] if media['coverImage'] else None
-                    }
-                )
-            
-            return Response(response['data'])
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-    @action(detail=False, methods=['get'])
-    def recommendations(self, request):
-        user_profile = UserProfile.objects.get(user=request.user)
-        user_preferences = AnimePreference.objects.filter(user=request.user)
-        
-        # Get user's favorite genres
-        favorite_genres = user_profile.favorite_genres
-        
-        # Get user's watched anime
-        watched_anime = user_profile.watched_anime
-        
-        # Find anime with similar genres that the user hasn't watched
-        recommended_anime = CachedAnime.objects.filter(
-            genres__overlap=favorite_genres
-        ).exclude(
-            anime_id__in=watched_anime
-        ).order_by('-average_score')[:10]
-        
-        serializer = self.get_serializer(recommended_anime, many=True)
-        return Response(serializer.data)
-
-class GenreViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Genre.objects.all()
-    serializer_class = GenreSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    @action(detail=False, methods=['get'])
-    def refresh(self, request):
-        try:
-            # Get genres from AniList API
-            genres = AniListAPI.get_genre_list()
-            
-            # Update local genre database
-            for genre_name in genres:
-                Genre.objects.get_or_create(name=genre_name)
-            
-            return Response({'status': 'genres refreshed'})
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+PROJECTION_PARAMETERS = [
+    openapi.Parameter('view', openapi.IN_QUERY, description="compact (default) or full", type=openapi.TYPE_STRING),
+    openapi.Parameter('fields', openapi.IN_QUERY, description="Comma-separated fields to return (overrides view)", type=openapi.TYPE_STRING),
+]
 
 class AnimeSearchView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
+    CACHE_CONTROL = {'private': True, 'max_age': 300}
+
+    def results_response(self, request, projection, page_info, cached_anime, source, params):
+        # Validated from the rows themselves (ids + updated_at), before any serialization.
+        etag = make_etag(
+            request, 'search', params, projection.key, page_info, source,
+            [(anime.anime_id, anime.updated_at) for anime in cached_anime],
+        )
+        response = not_modified(request, etag, cache_control=self.CACHE_CONTROL)
+        if response is not None:
+            return response
+        response = Response({
+            'page_info': page_info,
+            'results': render_anime_list(cached_anime, projection),
+            'source': source
+        })
+        return set_cache_headers(response, etag, cache_control=self.CACHE_CONTROL)
 
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter('q', openapi.IN_QUERY, description="Search query", type=openapi.TYPE_STRING),
             openapi.Parameter('genre', openapi.IN_QUERY, description="Genre filter", type=openapi.TYPE_STRING),
             openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
+            *PROJECTION_PARAMETERS,
         ],
         operation_description="Search anime by name or genre",
         responses={200: CachedAnimeSerializer(many=True)}
     )
     def get(self, request):
+        try:
+            projection = AnimeProjection.from_request(request)
+        except ProjectionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             search_query = request.query_params.get('q', '')
             genre = request.query_params.get('genre', '')
@@ -116,6 +78,15 @@ class AnimeSearchView(APIView):
             
             logger.info(f"Searching for anime with query: {search_query}, genre: {genre}, page: {page}")
             
+            # Answer from the local catalog when it has enough matches for this page
+            if getattr(settings, 'LOCAL_SEARCH_ENABLED', True):
+                local = local_search(search_query, genre, page, projection=projection)
+                if local is not None:
+                    page_info, cached_anime = local
+                    return self.results_response(
+                        request, projection, page_info, cached_anime, 'local', (search_query, genre, page)
+                    )
+            
             # Search AniList API
             response = AniListAPI.search_anime(
                 search=search_query, 
@@ -123,10 +94,10 @@ class AnimeSearchView(APIView):
                 page=page
             )
             
-            logger.info(f"AniList API Response: {response}")
+            log_payload(logger, "AniList API response", response)
             
             if not response.get('data'):
-                logger.error(f"No data in response: {response}")
+                logger.error("No data in AniList search response: %s", response.get('errors'))
                 return Response({'error': 'No results found'}, status=status.HTTP_404_NOT_FOUND)
             
             page_data = response.get('data', {}).get('Page', {})
@@ -136,42 +107,17 @@ class AnimeSearchView(APIView):
                 logger.warning(f"No media found in response for query: {search_query}")
                 return Response({
                     'page_info': page_data.get('pageInfo', {}),
-                    'results': []
+                    'results': [],
+                    'source': 'anilist'
                 })
             
             # Cache the results
-            cached_anime = []
+            cached_anime = upsert_media(media_list)
             
-            for media in media_list:
-                if not media:
-                    continue
-                    
-                try:
-                    anime, created = CachedAnime.objects.update_or_create(
-                        anime_id=media['id'],
-                        defaults={
-                            'title_romaji': media['title']['romaji'],
-                            'title_english': media['title'].get('english'),
-                            'title_native': media['title'].get('native'),
-                            'description': media.get('description'),
-                            'genres': media.get('genres', []),
-                            'average_score': media.get('averageScore'),
-                            'popularity': media.get('popularity', 0),
-                            'episodes': media.get('episodes'),
-                            'status': media.get('status', 'UNKNOWN'),
-                            'cover_image': media.get('coverImage', {}).get('large')
-                        }
-                    )
-                    cached_anime.append(anime)
-                except Exception as cache_error:
-                    logger.error(f"Error caching anime {media.get('id')}: {str(cache_error)}")
-                    continue
-            
-            serializer = CachedAnimeSerializer(cached_anime, many=True)
-            return Response({
-                'page_info': page_data.get('pageInfo', {}),
-                'results': serializer.data
-            })
+            return self.results_response(
+                request, projection, page_data.get('pageInfo', {}), cached_anime, 'anilist',
+                (search_query, genre, page)
+            )
             
         except Exception as e:
             logger.error(f"Error in anime search: {str(e)}", exc_info=True)
@@ -183,80 +129,147 @@ class AnimeSearchView(APIView):
 class AnimeRecommendationsView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
     CACHE_DURATION = timedelta(hours=24)  # Cache recommendations for 24 hours
+    # Revalidate on every load; unchanged recommendations then cost a 304.
+    CACHE_CONTROL = {'private': True, 'no_cache': True}
+
+    @staticmethod
+    def hard_expiry():
+        """Age after which stale recommendations are no longer served while refreshing."""
+        return getattr(settings, 'RECOMMENDATIONS_HARD_EXPIRY', timedelta(days=7))
+
+    def revalidate(self, user_id):
+        get_revalidator().submit(
+            f'recommendations:{user_id}',
+            lambda: refresh_user_recommendations(user_id)
+        )
+
+    @staticmethod
+    def serves_snapshot(cache):
+        # A clean row's snapshot is already filtered and serialized. A dirty one may
+        # include anime watched since, so re-read the (longer) ranking through the anti-join.
+        return not cache.dirty and len(cache.snapshot) >= min(10, len(cache.ranked_anime_ids))
+
+    def snapshot_response(self, request, cache, user_id, projection):
+        # The row's fingerprint and write time identify the snapshot exactly.
+        etag = make_etag(request, 'recommendations', user_id, cache.fingerprint, cache.updated_at, projection.key)
+        response = not_modified(request, etag, cache.updated_at, self.CACHE_CONTROL)
+        if response is not None:
+            return response
+        response = Response(projection.project(cache.snapshot[:10]))
+        return set_cache_headers(response, etag, cache.updated_at, self.CACHE_CONTROL)
+
+    def list_response(self, recommended_anime, projection):
+        response = Response(render_anime_list(recommended_anime[:10], projection))
+        return set_cache_headers(response, cache_control=self.CACHE_CONTROL)
+
+    def ranked_response(self, request, cache, user_id, projection):
+        if self.serves_snapshot(cache):
+            return self.snapshot_response(request, cache, user_id, projection)
+        return self.list_response(ranked_anime(cache.ranked_anime_ids, user_id, projection), projection)
+
+    @staticmethod
+    def response_variant(request, projection):
+        # Cached bodies are JSON; the browsable API always goes through the view.
+        if getattr(getattr(request, 'accepted_renderer', None), 'format', None) != 'json':
+            return None
+        return projection.key
+
+    @staticmethod
+    def cache_entry(response):
+        last_modified = response.get('Last-Modified')
+        return (
+            dumps(response.data),
+            response.get('ETag'),
+            datetime.fromtimestamp(parse_http_date(last_modified), tz=dt_timezone.utc) if last_modified else None,
+        )
+
+    def cached_response(self, request, cached):
+        body, etag, last_modified = cached
+        response = not_modified(request, etag, last_modified, self.CACHE_CONTROL)
+        if response is not None:
+            return response
+        return set_cache_headers(Response(RenderedJSON(body)), etag, last_modified, self.CACHE_CONTROL)
+
+    @staticmethod
+    def no_genres_response():
+        return Response(
+            {'error': 'Please set your favorite genres to get recommendations'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    def build_response(self, request, user_id, projection):
+        # Normally the only query before serialization: the row kept current by
+        # manage.py materialize_recommendations.
+        cache = UserRecommendationCache.objects.filter(user_id=user_id).first()
+        age = timezone.now() - cache.updated_at if cache is not None else None
+
+        if cache is not None and cache.ranked_anime_ids and not cache.dirty and age < self.hard_expiry():
+            if age >= self.CACHE_DURATION:
+                self.revalidate(user_id)
+            return self.ranked_response(request, cache, user_id, projection)
+
+        # Token claims still current: they know the user's genres without the profile.
+        digest = claimed_genres_digest(request.user)
+        if digest == NO_GENRES_DIGEST:
+            return self.no_genres_response()
+        if (digest is not None and cache is not None and cache.ranked_anime_ids
+                and digest == genres_digest(cache.favorite_genres) and age < self.hard_expiry()):
+            self.revalidate(user_id)
+            return self.ranked_response(request, cache, user_id, projection)
+
+        favorite_genres = request.user.userprofile.favorite_genres
+        
+        if not favorite_genres:
+            return self.no_genres_response()
+
+        if cache is None:
+            cache, _ = UserRecommendationCache.objects.get_or_create(
+                user_id=user_id,
+                defaults={'favorite_genres': favorite_genres}
+            )
+            age = timezone.now() - cache.updated_at
+
+        # Only the watch list or ratings changed since the row was materialized: serve it
+        # (watched anime are filtered at read time) while the worker catches up.
+        genres_unchanged = set(cache.favorite_genres) == set(favorite_genres)
+        if cache.ranked_anime_ids and genres_unchanged and age < self.hard_expiry():
+            self.revalidate(user_id)
+            return self.ranked_response(request, cache, user_id, projection)
+        
+        # If cache is invalid or doesn't exist, fetch new recommendations
+        recommended_anime = refresh_recommendations(cache, favorite_genres)
+        
+        if recommended_anime is None:
+            return Response({'error': 'No recommendations found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Top 10 recommendations
+        return self.list_response(recommended_anime, projection)
 
     @swagger_auto_schema(
+        manual_parameters=PROJECTION_PARAMETERS,
         operation_description="Get personalized anime recommendations based on user preferences",
         responses={200: CachedAnimeSerializer(many=True)}
     )
     def get(self, request):
         try:
-            user_profile = UserProfile.objects.get(user=request.user)
-            favorite_genres = user_profile.favorite_genres
-            watched_anime = user_profile.watched_anime
-            
-            if not favorite_genres:
-                return Response(
-                    {'error': 'Please set your favorite genres to get recommendations'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Check if we have valid cached recommendations
-            cache, created = UserRecommendationCache.objects.get_or_create(
-                user=request.user,
-                defaults={'favorite_genres': favorite_genres}
-            )
+            projection = AnimeProjection.from_request(request)
+        except ProjectionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # If cache exists and is still valid (less than 24 hours old and genres haven't changed)
-            if not created and cache.updated_at > timezone.now() - self.CACHE_DURATION \
-                and set(cache.favorite_genres) == set(favorite_genres):
-                # Return cached recommendations, excluding newly watched anime
-                recommendations = cache.recommended_anime.exclude(anime_id__in=watched_anime)[:10]
-                serializer = CachedAnimeSerializer(recommendations, many=True)
-                return Response(serializer.data)
-            
-            # If cache is invalid or doesn't exist, fetch new recommendations
-            response = AniListAPI.get_recommendations_by_genres(
-                genres=favorite_genres,
-                per_page=20
-            )
-            
-            if not response.get('data'):
-                return Response({'error': 'No recommendations found'}, status=status.HTTP_404_NOT_FOUND)
-            
-            # Cache and filter recommendations
-            media_list = response.get('data', {}).get('Page', {}).get('media', [])
-            recommended_anime = []
-            
-            for media in media_list:
-                if not media or media['id'] in watched_anime:
-                    continue
-                    
-                anime, created = CachedAnime.objects.update_or_create(
-                    anime_id=media['id'],
-                    defaults={
-                        'title_romaji': media['title']['romaji'],
-                        'title_english': media['title'].get('english'),
-                        'title_native': media['title'].get('native'),
-                        'description': media.get('description'),
-                        'genres': media.get('genres', []),
-                        'average_score': media.get('averageScore'),
-                        'popularity': media.get('popularity', 0),
-                        'episodes': media.get('episodes'),
-                        'status': media.get('status', 'UNKNOWN'),
-                        'cover_image': media.get('coverImage', {}).get('large')
-                    }
-                )
-                recommended_anime.append(anime)
-            
-            # Update cache
-            cache.recommended_anime.set(recommended_anime)
-            cache.favorite_genres = favorite_genres
-            cache.save()
-            
-            # Limit to top 10 recommendations
-            recommended_anime = recommended_anime[:10]
-            serializer = CachedAnimeSerializer(recommended_anime, many=True)
-            return Response(serializer.data)
+        try:
+            user_id = request.user.id
+            # Warm path: the rendered response, one cache GET and no queries.
+            variant = self.response_variant(request, projection)
+            if variant is not None:
+                cached = get_recommendation_response_cache().get(user_id, variant)
+                if cached is not None:
+                    return self.cached_response(request, cached)
+                version = get_recommendation_response_cache().version(user_id)
+
+            response = self.build_response(request, user_id, projection)
+            if variant is not None and response.status_code == status.HTTP_200_OK:
+                get_recommendation_response_cache().store(user_id, version, variant, self.cache_entry(response))
+            return response
             
         except Exception as e:
             logger.error(f"Error in anime recommendations: {str(e)}")
@@ -265,8 +278,125 @@ class AnimeRecommendationsView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+def anilist_unavailable_response():
+    response = Response(
+        {'error': 'AniList is unavailable. Please try again later.'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response['Retry-After'] = '30'
+    return response
+
+class AnimeBatchView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    CACHE_CONTROL = {'private': True, 'max_age': 300}
+
+    @staticmethod
+    def max_ids():
+        return getattr(settings, 'ANIME_BATCH_MAX_IDS', 100)
+
+    @staticmethod
+    def unavailable_response(cached_anime, missing, unavailable, projection):
+        # AniList failed for some ids: no validator or shared caching for a partial result.
+        if not cached_anime:
+            return anilist_unavailable_response()
+        response = Response({
+            'results': render_anime_list(cached_anime, projection),
+            'missing': missing,
+            'unavailable': unavailable,
+        })
+        patch_cache_control(response, no_store=True)
+        return response
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('ids', openapi.IN_QUERY, description="Comma-separated AniList ids", type=openapi.TYPE_STRING, required=True),
+            *PROJECTION_PARAMETERS,
+        ],
+        operation_description="Get several anime by AniList id, in the requested order",
+        responses={200: CachedAnimeSerializer(many=True)}
+    )
+    def get(self, request):
+        try:
+            projection = AnimeProjection.from_request(request)
+            anime_ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except (ProjectionError, ValueError) as e:
+            message = str(e) if isinstance(e, ProjectionError) else 'ids must be a comma-separated list of integers'
+            return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not anime_ids:
+            return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(set(anime_ids)) > self.max_ids():
+            return Response(
+                {'error': f'At most {self.max_ids()} ids per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            cached_anime, missing, unavailable = load_anime(anime_ids, projection)
+            if unavailable:
+                return self.unavailable_response(cached_anime, missing, unavailable, projection)
+
+            etag = make_etag(
+                request, 'batch', projection.key, missing,
+                [(anime.anime_id, anime.updated_at) for anime in cached_anime],
+            )
+            response = not_modified(request, etag, cache_control=self.CACHE_CONTROL)
+            if response is not None:
+                return response
+            response = Response({
+                'results': render_anime_list(cached_anime, projection),
+                'missing': missing
+            })
+            return set_cache_headers(response, etag, cache_control=self.CACHE_CONTROL)
+
+        except Exception as e:
+            logger.error(f"Error in anime batch lookup: {str(e)}", exc_info=True)
+            return Response(
+                {'error': 'Failed to fetch anime data. Please try again later.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class AnimeDetailView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    CACHE_CONTROL = {'private': True, 'max_age': 300}
+
+    @swagger_auto_schema(
+        manual_parameters=PROJECTION_PARAMETERS,
+        operation_description="Get one anime by AniList id, with its full description",
+        responses={200: CachedAnimeSerializer()}
+    )
+    def get(self, request, anime_id):
+        try:
+            # Detail is the one place full descriptions are served by default.
+            projection = AnimeProjection.from_request(request, default='full')
+        except ProjectionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cached_anime, _, unavailable = load_anime([anime_id], projection)
+            if unavailable:
+                return anilist_unavailable_response()
+            if not cached_anime:
+                return Response({'error': 'Anime not found'}, status=status.HTTP_404_NOT_FOUND)
+            anime = cached_anime[0]
+
+            etag = make_etag(request, 'detail', anime.anime_id, anime.updated_at, projection.key)
+            response = not_modified(request, etag, anime.updated_at, self.CACHE_CONTROL)
+            if response is not None:
+                return response
+            response = Response(render_anime(anime, projection))
+            return set_cache_headers(response, etag, anime.updated_at, self.CACHE_CONTROL)
+
+        except Exception as e:
+            logger.error(f"Error in anime detail lookup: {str(e)}", exc_info=True)
+            return Response(
+                {'error': 'Failed to fetch anime data. Please try again later.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 class AnimeGenresView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
+    CACHE_CONTROL = {'private': True, 'max_age': 3600}
 
     @swagger_auto_schema(
         operation_description="Get a list of all available anime genres",
@@ -274,18 +404,16 @@ class AnimeGenresView(APIView):
     )
     def get(self, request):
         try:
-            # First try to get genres from the database
-            genres = Genre.objects.all()
+            # In-process catalog; seeded from AniList the first time the table is empty.
+            catalog = ensure_genre_catalog()
             
-            # If no genres in database, fetch from AniList API
-            if not genres.exists():
-                genre_names = AniListAPI.get_genre_list()
-                for genre_name in genre_names:
-                    Genre.objects.get_or_create(name=genre_name)
-                genres = Genre.objects.all()
+            etag = catalog.etag(request)
+            response = not_modified(request, etag, catalog.last_modified, self.CACHE_CONTROL)
+            if response is not None:
+                return response
             
-            serializer = GenreSerializer(genres, many=True)
-            return Response(serializer.data)
+            response = Response(catalog.body)
+            return set_cache_headers(response, etag, catalog.last_modified, self.CACHE_CONTROL)
             
         except Exception as e:
             logger.error(f"Error fetching genres: {str(e)}", exc_info=True)
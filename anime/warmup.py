@@ -0,0 +1,74 @@
+import logging
+import time
+from collections import Counter
+from typing import Dict
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+
+from .fragments import render_anime_list
+from .genres import warm_genre_catalog
+from .models import CachedAnime, UserRecommendationCache
+from .projection import COMPACT_FIELDS, AnimeProjection, description_truncate_length
+from .recommendations import snapshot_size
+from .recommender import get_recommender
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls():
+    # Django imports the URLconf (and with it every view module) on the first request.
+    get_resolver().url_patterns
+
+
+def warm_hot_recommendations(limit: int) -> int:
+    """
+    Pre-render the compact fragments of the anime that appear most often in recently
+    materialized recommendation lists. Returns the number of anime rendered.
+    """
+    counts = Counter()
+    recent = (UserRecommendationCache.objects.filter(dirty=False)
+              .order_by('-updated_at').values_list('ranked_anime_ids', flat=True)[:limit])
+    for ranked_ids in recent:
+        counts.update(ranked_ids[:snapshot_size()])
+    hot_ids = [anime_id for anime_id, _ in counts.most_common(limit)]
+    if not hot_ids:
+        return 0
+    # The default list view: compact fields, truncated description.
+    projection = AnimeProjection(COMPACT_FIELDS, description_truncate_length())
+    anime = projection.apply(CachedAnime.objects.filter(anime_id__in=hot_ids))
+    render_anime_list(anime, projection)
+    return len(hot_ids)
+
+
+def warm_worker() -> Dict[str, float]:
+    """
+    Prime a freshly started worker: URLconf, the genre catalog, the genre recommender's
+    matrix and the fragments of hot recommendations.
+
+    Each step is timed and isolated: a failing step is logged and the worker starts
+    anyway (the request path fills the same caches lazily). Returns {step: seconds}.
+
+    Database connections are not warmed: Django keeps one per thread and, with the
+    default CONN_MAX_AGE of 0, closes it after every request, so a connection opened
+    here could never serve one. The connection the steps used is closed at the end
+    rather than left idle for the worker's lifetime.
+    """
+    steps = (
+        ('urls', warm_urls),
+        ('genre_catalog', warm_genre_catalog),
+        ('recommender', lambda: get_recommender().sync(force=True)),
+        ('hot_recommendations',
+         lambda: warm_hot_recommendations(getattr(settings, 'WARMUP_HOT_RECOMMENDATIONS', 200))),
+    )
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Worker warmup step {name} failed: {str(e)}")
+        timings[name] = time.perf_counter() - started
+    connections.close_all()
+    return timings
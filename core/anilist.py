@@ -1,45 +1,139 @@
+import httpx
 import requests
-import requests_cache
 from django.conf import settings
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import logging
-from datetime import timedelta
+
+from .anilist_batch import BatchLoader, register_loader
+from .anilist_cache import get_response_cache
+from .anilist_client import get_async_client, get_client, request_key
+from .debuglog import log_payload
+from .ratelimit import AniListRateLimited
+from .swr import get_revalidator
+from .timing import timed
 
 logger = logging.getLogger(__name__)
 
-# Install cache with a 1-hour expiration
-requests_cache.install_cache(
-    'anilist_cache',
-    backend='sqlite',
-    expire_after=timedelta(hours=1)
-)
+MEDIA_DETAIL_FIELDS = """
+                id
+                title {
+                    romaji
+                    english
+                    native
+                }
+                description
+                genres
+                averageScore
+                popularity
+                episodes
+                status
+                coverImage {
+                    large
+                }
+                startDate {
+                    year
+                    month
+                    day
+                }
+                endDate {
+                    year
+                    month
+                    day
+                }
+"""
+
+DETAILS_QUERY = """
+        query ($id: Int!) {
+            Media(id: $id, type: ANIME) {%s}
+        }
+""" % MEDIA_DETAIL_FIELDS
+
+DETAILS_BATCH_QUERY = """
+        query ($ids: [Int], $perPage: Int) {
+            Page(page: 1, perPage: $perPage) {
+                media(id_in: $ids, type: ANIME) {%s}
+            }
+        }
+""" % MEDIA_DETAIL_FIELDS
+
+# AniList's maximum perPage, and so the most ids one id_in query can return.
+DETAILS_BATCH_SIZE = 50
 
 class AniListAPI:
     API_URL = 'https://graphql.anilist.co'
+    _details_loader = None
+
+    @classmethod
+    def api_url(cls) -> str:
+        return getattr(settings, 'ANILIST_API_URL', None) or cls.API_URL
 
-    @staticmethod
-    def execute_query(query: str, variables: Dict = None) -> Dict:
-        """Execute a GraphQL query against the AniList API."""
+    @classmethod
+    def execute_query(cls, query: str, variables: Dict = None, kind: str = 'default',
+                      use_cache: bool = True, api_url: Optional[str] = None) -> Dict:
+        """
+        Execute a GraphQL query against the AniList API, going through the response cache.
+
+        A stale cached response is returned immediately and refreshed in the background;
+        only a miss (or an entry past its hard expiry) waits on AniList. use_cache=False
+        always goes upstream and stores nothing; only then may api_url name another
+        endpoint than ANILIST_API_URL, as the cache does not key on it.
+        """
+        if api_url is not None and use_cache:
+            raise ValueError('api_url can only be overridden with use_cache=False')
+        if not use_cache:
+            try:
+                return get_client(api_url or cls.api_url()).post(query, variables)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"AniList API request failed: {str(e)}")
+                raise
+
+        cache = get_response_cache()
+        key = request_key(query, variables)
+        result, stale = cache.get(key, kind)
+        if result is not None:
+            if stale:
+                get_revalidator().submit(
+                    f'anilist:{key}', lambda: cls._fetch_and_cache(query, variables, kind, key)
+                )
+            return result
+        return cls._fetch_and_cache(query, variables, kind, key)
+
+    @classmethod
+    def _fetch_and_cache(cls, query: str, variables: Optional[Dict], kind: str, key: str) -> Dict:
         try:
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-            }
-            response = requests.post(
-                AniListAPI.API_URL,
-                json={'query': query, 'variables': variables or {}},
-                headers=headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json()
+            result = get_client(cls.api_url()).post(query, variables)
         except requests.exceptions.RequestException as e:
             logger.error(f"AniList API request failed: {str(e)}")
             raise
+        if not result.get('errors'):
+            get_response_cache().set(key, result, kind)
+        return result
+
+    @classmethod
+    async def aexecute_query(cls, query: str, variables: Dict = None, kind: str = 'default') -> Dict:
+        """Async variant of execute_query for ASGI views."""
+        cache = get_response_cache()
+        key = request_key(query, variables)
+        result, stale = await cache.aget(key, kind)
+        if result is not None:
+            if stale:
+                await get_revalidator().asubmit(
+                    f'anilist:{key}', lambda: cls._fetch_and_cache(query, variables, kind, key)
+                )
+            return result
+        try:
+            result = await get_async_client(cls.api_url()).post(query, variables)
+        except (httpx.HTTPError, AniListRateLimited) as e:
+            logger.error(f"AniList API request failed: {str(e)}")
+            raise
+        if not result.get('errors'):
+            await cache.aset(key, result, kind)
+        return result
 
     @classmethod
-    def search_anime(cls, search: str = None, genre: str = None, page: int = 1, per_page: int = 10) -> Dict:
-        """Search for anime by title or genre."""
+    def search_request(cls, search: str = None, genre: str = None, page: int = 1,
+                       per_page: int = 10) -> Tuple[str, Dict]:
+        """The GraphQL query and variables for a title/genre search."""
         query = """
         query ($search: String, $genre: String, $page: Int, $perPage: Int) {
             Page(page: $page, perPage: $perPage) {
@@ -93,11 +187,33 @@ class AniListAPI:
         if genre and genre.strip():
             variables['genre'] = genre.strip()
             
-        logger.info(f"Executing AniList search query with variables: {variables}")
+        return query, variables
+
+    @classmethod
+    def search_anime(cls, search: str = None, genre: str = None, page: int = 1, per_page: int = 10,
+                     use_cache: bool = True, api_url: Optional[str] = None) -> Dict:
+        """Search for anime by title or genre (api_url: see execute_query)."""
+        query, variables = cls.search_request(search, genre, page, per_page)
+        logger.debug("Executing AniList search query with variables: %s", variables)
         
         try:
-            result = cls.execute_query(query, variables)
-            logger.info(f"AniList search response: {result}")
+            result = cls.execute_query(query, variables, kind='search', use_cache=use_cache, api_url=api_url)
+            log_payload(logger, "AniList search response", result)
+            return result
+        except Exception as e:
+            logger.error(f"Error executing AniList search query: {str(e)}", exc_info=True)
+            raise
+
+    @classmethod
+    async def asearch_anime(cls, search: str = None, genre: str = None, page: int = 1,
+                            per_page: int = 10) -> Dict:
+        """Async variant of search_anime for ASGI views."""
+        query, variables = cls.search_request(search, genre, page, per_page)
+        logger.debug("Executing AniList search query with variables: %s", variables)
+
+        try:
+            result = await cls.aexecute_query(query, variables, kind='search')
+            log_payload(logger, "AniList search response", result)
             return result
         except Exception as e:
             logger.error(f"Error executing AniList search query: {str(e)}", exc_info=True)
@@ -105,40 +221,88 @@ class AniListAPI:
 
     @classmethod
     def get_anime_details(cls, anime_id: int) -> Dict:
-        """Get detailed information about a specific anime."""
-        query = """
-        query ($id: Int!) {
-            Media(id: $id, type: ANIME) {
-                id
-                title {
-                    romaji
-                    english
-                    native
-                }
-                description
-                genres
-                averageScore
-                popularity
-                episodes
-                status
-                coverImage {
-                    large
-                }
-                startDate {
-                    year
-                    month
-                    day
-                }
-                endDate {
-                    year
-                    month
-                    day
-                }
-            }
-        }
         """
-        variables = {'id': anime_id}
-        return cls.execute_query(query, variables)
+        Get detailed information about a specific anime.
+
+        Cache misses go through the details loader, so concurrent lookups from other
+        threads within its window share one id_in request.
+        """
+        media = cls.get_anime_details_batch([anime_id], fetch_missing=False).get(anime_id)
+        if media is None:
+            with timed('anilist'):
+                media = cls.details_loader().load(anime_id).result()
+        return {'data': {'Media': media}}
+
+    @classmethod
+    def details_loader(cls) -> BatchLoader:
+        if cls._details_loader is None:
+            cls._details_loader = register_loader(BatchLoader(
+                cls.get_anime_details_batch,
+                max_batch_size=DETAILS_BATCH_SIZE,
+                window=getattr(settings, 'ANILIST_BATCH_WINDOW', 0.005),
+            ))
+        return cls._details_loader
+
+    @classmethod
+    def get_anime_details_batch(cls, anime_ids: List[int], use_cache: bool = True,
+                                fetch_missing: bool = True, refetch: Iterable[int] = ()) -> Dict[int, Dict]:
+        """
+        Media by id for many anime, as {anime_id: media}; ids AniList does not know are absent.
+
+        Each id is cached under the same key as a single Media(id:) lookup. Misses are
+        fetched with one Page(id_in:) request per DETAILS_BATCH_SIZE ids; ids that were
+        only stale are served and refreshed together in the background. Ids in refetch
+        skip the cache lookup and go upstream with the misses.
+        """
+        cache = get_response_cache()
+        found, missing, stale = {}, [], []
+        refetch = set(refetch)
+        for anime_id in dict.fromkeys(anime_ids):
+            if anime_id in refetch:
+                missing.append(anime_id)
+                continue
+            result, is_stale = cache.get(request_key(DETAILS_QUERY, {'id': anime_id}), 'details') \
+                if use_cache else (None, False)
+            media = ((result or {}).get('data') or {}).get('Media')
+            if media is None:
+                missing.append(anime_id)
+                continue
+            found[anime_id] = media
+            if is_stale:
+                stale.append(anime_id)
+
+        if stale:
+            get_revalidator().submit(
+                f'anilist-details:{request_key(DETAILS_BATCH_QUERY, {"ids": sorted(stale)})}',
+                lambda: cls._fetch_details(stale)
+            )
+        if missing and fetch_missing:
+            found.update(cls._fetch_details(missing, use_cache))
+        return found
+
+    @classmethod
+    def _fetch_details(cls, anime_ids: List[int], use_cache: bool = True) -> Dict[int, Dict]:
+        cache = get_response_cache()
+        fetched = {}
+        for start in range(0, len(anime_ids), DETAILS_BATCH_SIZE):
+            chunk = anime_ids[start:start + DETAILS_BATCH_SIZE]
+            try:
+                result = get_client(cls.api_url()).post(
+                    DETAILS_BATCH_QUERY, {'ids': chunk, 'perPage': DETAILS_BATCH_SIZE}
+                )
+            except requests.exceptions.RequestException as e:
+                logger.error(f"AniList API request failed: {str(e)}")
+                raise
+            if result.get('errors'):
+                logger.error(f"AniList batch details errors: {result['errors']}")
+                continue
+            for media in ((result.get('data') or {}).get('Page') or {}).get('media') or []:
+                if not media:
+                    continue
+                fetched[media['id']] = media
+                if use_cache:
+                    cache.set(request_key(DETAILS_QUERY, {'id': media['id']}), {'data': {'Media': media}}, 'details')
+        return fetched
 
     @classmethod
     def get_genre_list(cls) -> List[str]:
@@ -148,8 +312,8 @@ class AniListAPI:
             GenreCollection
         }
         """
-        response = cls.execute_query(query)
-        return response.get('data', {}).get('GenreCollection', [])
+        response = cls.execute_query(query, kind='genres')
+        return (response.get('data') or {}).get('GenreCollection') or []
 
     @classmethod
     def get_recommendations_by_genres(cls, genres: List[str], page: int = 1, per_page: int = 20) -> Dict:
@@ -182,4 +346,51 @@ class AniListAPI:
             'page': page,
             'perPage': per_page
         }
-        return cls.execute_query(query, variables) 
\ No newline at end of file
+        return cls.execute_query(query, variables, kind='recommendations') 
+
+    @classmethod
+    def get_catalog_page(cls, page: int = 1, per_page: int = 50, updated_after: Optional[int] = None,
+                         api_url: Optional[str] = None) -> Dict:
+        """
+        Get one page of the full anime catalog in stable id order, for offline sync.
+
+        updated_after is a unix timestamp; only media updated after it are returned.
+        Bypasses the response cache so a sync always sees current data. api_url points
+        this one call elsewhere than ANILIST_API_URL (e.g. a stub server).
+        """
+        query = """
+        query ($page: Int, $perPage: Int, $updatedAfter: Int) {
+            Page(page: $page, perPage: $perPage) {
+                pageInfo {
+                    currentPage
+                    hasNextPage
+                    perPage
+                }
+                media(type: ANIME, sort: ID, updatedAt_greater: $updatedAfter) {
+                    id
+                    updatedAt
+                    title {
+                        romaji
+                        english
+                        native
+                    }
+                    description(asHtml: false)
+                    genres
+                    averageScore
+                    popularity
+                    episodes
+                    status
+                    coverImage {
+                        large
+                    }
+                }
+            }
+        }
+        """
+        variables = {
+            'page': page,
+            'perPage': per_page
+        }
+        if updated_after:
+            variables['updatedAfter'] = updated_after
+        return cls.execute_query(query, variables, kind='catalog', use_cache=False, api_url=api_url)
@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BatchLoader:
+    """
+    DataLoader-style batching of keyed lookups.
+
+    load(key) returns a Future. Keys requested within `window` seconds of the first
+    pending one (from any thread) are dispatched together through batch_fn, in chunks of
+    at most max_batch_size, and each future gets its own value back (None when batch_fn
+    had nothing for it). A key already pending is shared rather than requested twice.
+
+    load_many() is for callers that know every key up front: it dispatches immediately
+    instead of waiting out the window.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Dict], max_batch_size: int = 50,
+                 window: float = 0.005):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Future] = {}
+        self._timer: Optional[threading.Timer] = None
+        self.batches = 0
+        self.keys_loaded = 0
+
+    def reset(self):
+        """Forget pending work (used after fork)."""
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def load(self, key: Hashable) -> Future:
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            future = self._pending[key] = Future()
+            full = len(self._pending) >= self.max_batch_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.window, self.dispatch)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.dispatch()
+        return future
+
+    def load_many(self, keys: Iterable[Hashable]) -> Dict:
+        futures = {key: self.load(key) for key in dict.fromkeys(keys)}
+        self.dispatch()
+        return {key: future.result() for key, future in futures.items()}
+
+    def dispatch(self):
+        """Run every pending key through batch_fn now."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        keys = list(pending)
+        for start in range(0, len(keys), self.max_batch_size):
+            chunk = keys[start:start + self.max_batch_size]
+            self.batches += 1
+            self.keys_loaded += len(chunk)
+            try:
+                results = self.batch_fn(chunk)
+            except BaseException as exc:
+                for key in chunk:
+                    pending[key].set_exception(exc)
+                continue
+            for key in chunk:
+                pending[key].set_result(results.get(key))
+
+
+_loaders: List[BatchLoader] = []
+
+
+def register_loader(loader: BatchLoader) -> BatchLoader:
+    """Track a process-wide loader so it is reset in forked children."""
+    _loaders.append(loader)
+    return loader
+
+
+def _reset_after_fork():
+    for loader in _loaders:
+        loader.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .timing import record_cache
+
+DEFAULT_TTLS = {
+    'genres': 3 * 24 * 60 * 60,
+    'details': 6 * 60 * 60,
+    'recommendations': 30 * 60,
+    'search': 10 * 60,
+    'default': 10 * 60,
+}
+
+# How long past its TTL an entry may still be served while it is refreshed in the background.
+DEFAULT_STALE_TTLS = {
+    'genres': 7 * 24 * 60 * 60,
+    'details': 24 * 60 * 60,
+    'recommendations': 6 * 60 * 60,
+    'search': 60 * 60,
+    'default': 60 * 60,
+}
+
+
+class AniListResponseCache:
+    """
+    Two-tier cache for AniList GraphQL responses.
+
+    A bounded in-process LRU sits in front of a Django cache alias shared by all workers.
+    Keys are canonical hashes of query+variables (see core.anilist_client.request_key)
+    and each query kind gets its own TTL.
+
+    Entries outlive their TTL by a per-kind stale window. Within that window get()
+    still returns the value but flags it stale so the caller can serve it and refresh in
+    the background; past the window (the hard expiry) the entry is gone and callers block.
+    The in-process tier drops an entry when its TTL runs out, so stale reads always
+    come from the shared tier.
+    """
+
+    def __init__(self, alias: str = 'anilist', max_entries: int = 512, ttls: Optional[Dict] = None,
+                 stale_ttls: Optional[Dict] = None):
+        self.alias = alias
+        self.max_entries = max_entries
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.stale_ttls = {**DEFAULT_STALE_TTLS, **(stale_ttls or {})}
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'local_hits': 0, 'shared_hits': 0, 'stale_hits': 0, 'misses': 0, 'sets': 0}
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def ttl(self, kind: str) -> int:
+        return self.ttls.get(kind, self.ttls['default'])
+
+    def hard_ttl(self, kind: str) -> int:
+        return self.ttl(kind) + self.stale_ttls.get(kind, self.stale_ttls['default'])
+
+    def _shared_key(self, key: str) -> str:
+        return f'anilist:{key}'
+
+    def _get_local(self, key: str) -> Optional[Tuple[float, Dict]]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, envelope = entry
+            if expires_at <= time.time():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            self._stats['local_hits'] += 1
+            return envelope
+
+    def _set_local(self, key: str, envelope: Tuple[float, Dict], kind: str):
+        # Only fresh entries are kept locally: once an entry turns stale, get() re-reads
+        # the shared tier, where another worker may already have refreshed it, before
+        # the caller starts a revalidation of its own.
+        expires_at = envelope[0] + self.ttl(kind)
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._local[key] = (expires_at, envelope)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get(self, key: str, kind: str = 'default') -> Tuple[Optional[Dict], bool]:
+        """Return (value, stale); value is None on a miss or past the hard expiry."""
+        envelope = self._get_local(key)
+        if envelope is None:
+            envelope = self.shared.get(self._shared_key(key))
+            self._record_shared_lookup(key, envelope, kind)
+        return self._unwrap(envelope, kind)
+
+    async def aget(self, key: str, kind: str = 'default') -> Tuple[Optional[Dict], bool]:
+        envelope = self._get_local(key)
+        if envelope is None:
+            envelope = await self.shared.aget(self._shared_key(key))
+            self._record_shared_lookup(key, envelope, kind)
+        return self._unwrap(envelope, kind)
+
+    def _unwrap(self, envelope: Optional[Tuple[float, Dict]], kind: str) -> Tuple[Optional[Dict], bool]:
+        if envelope is None:
+            record_cache('anilist', 'miss')
+            return None, False
+        fetched_at, value = envelope
+        stale = fetched_at + self.ttl(kind) <= time.time()
+        if stale:
+            with self._lock:
+                self._stats['stale_hits'] += 1
+        record_cache('anilist', 'stale' if stale else 'hit')
+        return value, stale
+
+    def _record_shared_lookup(self, key: str, envelope: Optional[Tuple[float, Dict]], kind: str):
+        if envelope is None:
+            with self._lock:
+                self._stats['misses'] += 1
+            return
+        with self._lock:
+            self._stats['shared_hits'] += 1
+        self._set_local(key, envelope, kind)
+
+    def set(self, key: str, value: Dict, kind: str = 'default'):
+        envelope = (time.time(), value)
+        self.shared.set(self._shared_key(key), envelope, self.hard_ttl(kind))
+        self._set_local(key, envelope, kind)
+        with self._lock:
+            self._stats['sets'] += 1
+
+    async def aset(self, key: str, value: Dict, kind: str = 'default'):
+        envelope = (time.time(), value)
+        await self.shared.aset(self._shared_key(key), envelope, self.hard_ttl(kind))
+        self._set_local(key, envelope, kind)
+        with self._lock:
+            self._stats['sets'] += 1
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_entries'] = len(self._local)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['local_hits'] + stats['shared_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+_response_cache = None
+
+
+def get_response_cache() -> AniListResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = AniListResponseCache(
+            alias=getattr(settings, 'ANILIST_CACHE_ALIAS', 'anilist'),
+            max_entries=getattr(settings, 'ANILIST_LOCAL_CACHE_SIZE', 512),
+            ttls=getattr(settings, 'ANILIST_CACHE_TTLS', None),
+            stale_ttls=getattr(settings, 'ANILIST_CACHE_STALE_TTLS', None),
+        )
+    return _response_cache
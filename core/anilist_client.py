@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .timing import timed
+from .ratelimit import RETRYABLE_STATUS, RateGovernor, backoff_delay, get_governor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json',
+}
+
+
+def request_key(query: str, variables: Optional[Dict] = None) -> str:
+    """Canonical digest of a GraphQL (query, variables) pair."""
+    payload = json.dumps(
+        {'query': ' '.join(query.split()), 'variables': variables or {}},
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AniListClient:
+    """
+    Thread-safe AniList GraphQL client with a pooled keep-alive session.
+
+    Identical (query, variables) pairs that are already in flight are coalesced: the
+    first caller goes upstream and every concurrent caller waits on its result. The
+    returned dict is shared between coalesced callers and must be treated as read-only.
+    """
+
+    def __init__(self, api_url: str, timeout: float = 10, pool_size: int = 10,
+                 governor: Optional[RateGovernor] = None, max_retries: int = 0,
+                 queue_timeout: float = 5.0):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.governor = governor
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self._session = None
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.upstream_requests = 0
+        self.coalesced_requests = 0
+
+    @property
+    def session(self) -> requests.Session:
+        # Created lazily so nothing is opened before gunicorn forks its workers.
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update(DEFAULT_HEADERS)
+                    self._session = session
+        return self._session
+
+    def reset(self):
+        """Drop pooled connections and in-flight bookkeeping (used after fork)."""
+        self._session = None
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def post(self, query: str, variables: Optional[Dict] = None) -> Dict:
+        key = request_key(query, variables)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced_requests += 1
+
+        if not leader:
+            with timed('anilist'):
+                return future.result()
+
+        try:
+            with timed('anilist'):
+                result = self._send(query, variables)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _send(self, query: str, variables: Optional[Dict]) -> Dict:
+        """
+        POST once per attempt, waiting for a rate-governor slot first (if configured).
+
+        429/5xx responses and connection errors are retried up to max_retries times
+        with jittered exponential backoff; a 429 also pauses the governor for Retry-After.
+        """
+        attempt = 0
+        while True:
+            if self.governor is not None:
+                self.governor.acquire(time.monotonic() + self.queue_timeout)
+            self.upstream_requests += 1
+            response = None
+            try:
+                response = self.session.post(
+                    self.api_url,
+                    json={'query': query, 'variables': variables or {}},
+                    timeout=self.timeout,
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+            finally:
+                # Whatever happened, the slot goes back; only a response can adapt the rate.
+                if self.governor is not None:
+                    if response is None:
+                        self.governor.release()
+                    else:
+                        self.governor.release(response.status_code, response.headers)
+            if response is not None and (response.status_code not in RETRYABLE_STATUS
+                                         or attempt >= self.max_retries):
+                response.raise_for_status()
+                return response.json()
+            if self.governor is not None:
+                self.governor.record_retry()
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+
+class AsyncAniListClient:
+    """
+    asyncio counterpart of AniListClient for ASGI deployments.
+
+    Uses one pooled httpx.AsyncClient per event loop and coalesces identical in-flight
+    requests onto a shared asyncio task.
+    """
+
+    def __init__(self, api_url: str, timeout: float = 10, pool_size: int = 20,
+                 governor: Optional[RateGovernor] = None, max_retries: int = 0,
+                 queue_timeout: float = 5.0):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.governor = governor
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self._clients: Dict[int, httpx.AsyncClient] = {}
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.upstream_requests = 0
+        self.coalesced_requests = 0
+
+    def _client(self) -> httpx.AsyncClient:
+        loop_id = id(asyncio.get_running_loop())
+        client = self._clients.get(loop_id)
+        if client is None:
+            client = httpx.AsyncClient(
+                headers=DEFAULT_HEADERS,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+            )
+            self._clients[loop_id] = client
+        return client
+
+    async def post(self, query: str, variables: Optional[Dict] = None) -> Dict:
+        key = (id(asyncio.get_running_loop()), request_key(query, variables))
+        task = self._inflight.get(key)
+        if task is None:
+            # The request runs in its own task, so no caller owns it.
+            task = asyncio.ensure_future(self._send_shared(key, query, variables))
+            task.add_done_callback(_retrieve_exception)
+            self._inflight[key] = task
+        else:
+            self.coalesced_requests += 1
+        # shield(): a cancelled caller, whether it started the request or not, leaves it
+        # running for everyone else.
+        with timed('anilist'):
+            return await asyncio.shield(task)
+
+    async def _send_shared(self, key: tuple, query: str, variables: Optional[Dict]) -> Dict:
+        try:
+            return await self._send(query, variables)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _send(self, query: str, variables: Optional[Dict]) -> Dict:
+        attempt = 0
+        while True:
+            if self.governor is not None:
+                await self.governor.aacquire(time.monotonic() + self.queue_timeout)
+            self.upstream_requests += 1
+            response = None
+            try:
+                response = await self._client().post(
+                    self.api_url,
+                    json={'query': query, 'variables': variables or {}},
+                )
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+            finally:
+                # Also on CancelledError (the client went away): without a response,
+                # arelease() returns the slot without suspending.
+                if self.governor is not None:
+                    if response is None:
+                        await self.governor.arelease()
+                    else:
+                        await self.governor.arelease(response.status_code, response.headers)
+            if response is not None and (response.status_code not in RETRYABLE_STATUS
+                                         or attempt >= self.max_retries):
+                response.raise_for_status()
+                return response.json()
+            if self.governor is not None:
+                self.governor.record_retry()
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    async def aclose(self):
+        loop_id = id(asyncio.get_running_loop())
+        client = self._clients.pop(loop_id, None)
+        if client is not None:
+            await client.aclose()
+
+
+def _retrieve_exception(task: asyncio.Task):
+    # A request every caller gave up on would otherwise log "exception never retrieved".
+    if not task.cancelled():
+        task.exception()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client_options() -> Dict:
+    return {
+        'governor': get_governor(),
+        'max_retries': getattr(settings, 'ANILIST_MAX_RETRIES', 3),
+        'queue_timeout': getattr(settings, 'ANILIST_QUEUE_TIMEOUT', 5.0),
+    }
+
+
+def get_client(api_url: str) -> AniListClient:
+    """Process-wide pooled, rate-governed client for api_url."""
+    client = _clients.get(api_url)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_url)
+            if client is None:
+                client = _clients[api_url] = AniListClient(api_url, **_client_options())
+    return client
+
+
+_async_clients = {}
+
+
+def get_async_client(api_url: str) -> AsyncAniListClient:
+    """Process-wide asyncio client for api_url."""
+    client = _async_clients.get(api_url)
+    if client is None:
+        client = _async_clients[api_url] = AsyncAniListClient(
+            api_url, pool_size=getattr(settings, 'ANILIST_ASYNC_POOL_SIZE', 20), **_client_options()
+        )
+    return client
+
+
+def _reset_after_fork():
+    for client in _clients.values():
+        client.reset()
+    _async_clients.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,296 @@
+"""
+Local stand-in for the AniList GraphQL endpoint, used by the benchmark commands.
+
+The server answers every POST with a canned GraphQL payload (synthetic, a replayed
+catalog or recorded responses) after an optional delay, can inject 429s and 500s, and
+counts both requests and TCP connections, so connection reuse can be observed directly.
+"""
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from .anilist_client import request_key
+
+
+def stub_media(anime_id: int) -> Dict:
+    return {
+        'id': anime_id,
+        'title': {'romaji': f'Stub Anime {anime_id}', 'english': None, 'native': None},
+        'description': 'Stub description.',
+        'genres': ['Action'],
+        'averageScore': 70,
+        'popularity': 1000 - anime_id,
+        'episodes': 12,
+        'status': 'FINISHED',
+        'coverImage': {'large': None},
+    }
+
+
+def default_responder(body: Dict) -> Dict:
+    """
+    Answer every query with a small, deterministic Page of media.
+
+    An id variable (Media(id:) lookups) returns that single Media, and an ids variable
+    (Page(id_in:) lookups) returns exactly those media.
+    """
+    variables = body.get('variables') or {}
+    if variables.get('id') is not None:
+        return {'data': {'Media': stub_media(variables['id'])}}
+    page = variables.get('page', 1)
+    per_page = variables.get('perPage', 10)
+    if variables.get('ids') is not None:
+        anime_ids = variables['ids'][:per_page]
+    else:
+        anime_ids = [(page - 1) * per_page + offset + 1 for offset in range(per_page)]
+    return {'data': {'Page': {
+        'pageInfo': {'total': 1000, 'currentPage': page, 'lastPage': 100,
+                     'hasNextPage': True, 'perPage': per_page},
+        'media': [stub_media(anime_id) for anime_id in anime_ids],
+    }}}
+
+
+GENRES = ['Action', 'Adventure', 'Comedy', 'Drama', 'Fantasy', 'Horror', 'Mecha', 'Music',
+          'Mystery', 'Psychological', 'Romance', 'Sci-Fi', 'Slice of Life', 'Sports', 'Supernatural', 'Thriller']
+
+
+def synthetic_catalog(count: int = 2000, seed: int = 0) -> List[Dict]:
+    """
+    A deterministic catalog of AniList-shaped media, for benchmarks run without recorded
+    fixtures. Same seed, same catalog.
+    """
+    rng = random.Random(seed)
+    words = ['Sakura', 'Blade', 'Star', 'Ghost', 'Summer', 'Iron', 'Moon', 'Dragon', 'Tokyo', 'Dream']
+    catalog = []
+    for index in range(count):
+        anime_id = index + 1
+        title = f'{rng.choice(words)} {rng.choice(words)} {anime_id}'
+        catalog.append({
+            'id': anime_id,
+            'title': {'romaji': title, 'english': title.upper() if rng.random() < 0.5 else None, 'native': None},
+            'description': ' '.join(['A story about friendship and growing up.'] * rng.randint(2, 20)),
+            'genres': rng.sample(GENRES, rng.randint(1, 4)),
+            'averageScore': rng.randint(35, 92),
+            'popularity': int(rng.paretovariate(1.2) * 1000),
+            'episodes': rng.choice([None, 1, 12, 13, 24, 26, 50]),
+            'status': rng.choice(['FINISHED', 'FINISHED', 'FINISHED', 'RELEASING', 'NOT_YET_RELEASED']),
+            'coverImage': {'large': f'https://s4.anilist.co/file/anilistcdn/media/anime/cover/large/bx{anime_id}.jpg'},
+            'startDate': {'year': 1990 + anime_id % 35, 'month': 1 + anime_id % 12, 'day': 1},
+            'endDate': {'year': None, 'month': None, 'day': None},
+            'updatedAt': 1_700_000_000 + anime_id,
+        })
+    return catalog
+
+
+class CatalogFixtureResponder:
+    """
+    Replay a recorded catalog (a JSON list of AniList media dicts) as paged responses.
+
+    Honours page/perPage, the updatedAfter filter used by AniListAPI.get_catalog_page,
+    the ids (id_in) filter of batched detail lookups and single Media(id:) lookups, serving
+    media in id order like AniList's sort: ID. Searches (search, genre, genre_in) are
+    answered by title substring / genre match in popularity order, and GenreCollection
+    with the catalog's genres.
+    """
+
+    def __init__(self, media: List[Dict]):
+        self.media = sorted(media, key=lambda item: item['id'])
+        self.by_id = {item['id']: item for item in self.media}
+        self.by_popularity = sorted(self.media, key=lambda item: -(item.get('popularity') or 0))
+        self.genres = sorted({genre for item in self.media for genre in item.get('genres') or []})
+
+    @classmethod
+    def from_file(cls, path: str) -> 'CatalogFixtureResponder':
+        with open(path, encoding='utf-8') as fixture:
+            return cls(json.load(fixture))
+
+    def __call__(self, body: Dict) -> Dict:
+        if 'GenreCollection' in (body.get('query') or ''):
+            return {'data': {'GenreCollection': self.genres}}
+        variables = body.get('variables') or {}
+        if variables.get('id') is not None:
+            return {'data': {'Media': self.by_id.get(variables['id'])}}
+        page = variables.get('page', 1)
+        per_page = variables.get('perPage', 50)
+        updated_after = variables.get('updatedAfter')
+        ids = set(variables['ids']) if variables.get('ids') is not None else None
+        search = (variables.get('search') or '').lower()
+        genres = set(variables.get('genres') or ()) | ({variables['genre']} if variables.get('genre') else set())
+        source = self.by_popularity if search or genres else self.media
+        media = [
+            item for item in source
+            if (updated_after is None or item.get('updatedAt', 0) > updated_after)
+            and (ids is None or item['id'] in ids)
+            and (not search or search in ' '.join(filter(None, item['title'].values())).lower())
+            and (not genres or genres.intersection(item.get('genres') or ()))
+        ]
+        start = (page - 1) * per_page
+        return {'data': {'Page': {
+            'pageInfo': {'total': len(media), 'currentPage': page, 'lastPage': max(1, -(-len(media) // per_page)),
+                         'hasNextPage': start + per_page < len(media), 'perPage': per_page},
+            'media': media[start:start + per_page],
+        }}}
+
+
+class ReplayResponder:
+    """
+    Answer with recorded AniList responses, matched on the canonical (query, variables)
+    key; requests that were never recorded go to `fallback` (e.g. a catalog responder).
+
+    Recordings are a JSON list of {"query", "variables", "response"} objects, as written
+    by RecordingResponder.save().
+    """
+
+    def __init__(self, recordings: List[Dict], fallback: Optional[Callable[[Dict], Dict]] = None):
+        self.responses = {
+            request_key(item['query'], item.get('variables')): item['response'] for item in recordings
+        }
+        self.fallback = fallback or default_responder
+        self.replayed = 0
+
+    @classmethod
+    def from_file(cls, path: str, fallback: Optional[Callable[[Dict], Dict]] = None) -> 'ReplayResponder':
+        with open(path, encoding='utf-8') as fixture:
+            return cls(json.load(fixture), fallback)
+
+    def __call__(self, body: Dict) -> Dict:
+        response = self.responses.get(request_key(body.get('query') or '', body.get('variables')))
+        if response is None:
+            return self.fallback(body)
+        self.replayed += 1
+        return response
+
+
+class RecordingResponder:
+    """Forward each request to a real AniList endpoint and keep the exchange for replay."""
+
+    def __init__(self, upstream_url: str = 'https://graphql.anilist.co', timeout: float = 10):
+        self.upstream_url = upstream_url
+        self.timeout = timeout
+        self.recordings: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, body: Dict) -> Dict:
+        import requests
+
+        response = requests.post(self.upstream_url, json=body, timeout=self.timeout).json()
+        if not response.get('errors'):
+            with self._lock:
+                self.recordings.append({
+                    'query': body.get('query') or '', 'variables': body.get('variables') or {}, 'response': response,
+                })
+        return response
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as fixture:
+            json.dump(self.recordings, fixture, ensure_ascii=False)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; avoid Nagle/delayed-ACK stalls on keep-alive.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        with self.server.stats_lock:
+            self.server.requests += 1
+            number = self.server.requests
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.throttle_every and number % self.server.throttle_every == 0:
+            self._send_error(429, {'Retry-After': str(self.server.retry_after)})
+            return
+        if self.server.error_rate and self.server.random.random() < self.server.error_rate:
+            self._send_error(500)
+            return
+        payload = json.dumps(self.server.responder(body)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, status: int, headers: Optional[Dict] = None):
+        payload = json.dumps({'errors': [{'message': 'stub error', 'status': status}]}).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    # socketserver's default listen backlog of 5 drops connection bursts from a
+    # high-concurrency client, which then stall a second in SYN retransmits.
+    request_queue_size = 1024
+
+
+class StubAniListServer:
+    """
+    Threaded HTTP/1.1 keep-alive server on 127.0.0.1; use as a context manager.
+
+    throttle_every=N answers every Nth request with 429 + Retry-After, and error_rate is
+    the (seeded, reproducible) fraction of requests answered with a 500.
+    """
+
+    def __init__(self, latency: float = 0.0, responder: Optional[Callable[[Dict], Dict]] = None,
+                 port: int = 0, throttle_every: int = 0, retry_after: int = 1,
+                 error_rate: float = 0.0, seed: int = 0):
+        self._server = _StubHTTPServer(('127.0.0.1', port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.latency = latency
+        self._server.throttle_every = throttle_every
+        self._server.retry_after = retry_after
+        self._server.error_rate = error_rate
+        self._server.random = random.Random(seed)
+        self._server.responder = responder or default_responder
+        self._server.stats_lock = threading.Lock()
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    @property
+    def connections(self) -> int:
+        return self._server.connections
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    def reset_stats(self):
+        self._server.connections = 0
+        self._server.requests = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
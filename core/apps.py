@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .timing import install_db_timer
+
+        connection_created.connect(install_db_timer, dispatch_uid='core.timing.install_db_timer')
@@ -0,0 +1,56 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers may be coroutines (``async def get``).
+
+    DRF's dispatch is synchronous, so this one mirrors it as a coroutine: authentication,
+    permission and throttle checks (which may query the database) run in one
+    sync_to_async call, then the handler is awaited on the event loop. JSON responses are
+    rendered on the loop before they are returned, so Django does not hop to a thread to
+    render them; other renderers (the browsable API's templates) run in a thread.
+
+    Django marks the view as async because its handlers are coroutines; under ASGI it
+    runs on the server's event loop, under WSGI in a per-request event loop.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        if not hasattr(self.response, 'render'):
+            return self.response
+        if getattr(getattr(self.response, 'accepted_renderer', None), 'format', None) == 'json':
+            self.response.render()
+        else:
+            # The browsable API loads templates (and may query for its forms).
+            await sync_to_async(self.response.render)()
+        return HttpResponse(
+            self.response.content,
+            status=self.response.status_code,
+            headers=self.response.headers,
+        )
@@ -0,0 +1,247 @@
+"""
+Shared plumbing for the benchmark commands: latency statistics, result files that can be
+compared across commits, a multi-user HTTP load generator and a gunicorn launcher that
+uses the project's real gunicorn.conf.py.
+"""
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import requests
+from django.conf import settings
+
+
+def percentile(sorted_samples: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+def summarize(latencies: Sequence[float], elapsed: Optional[float] = None, errors: int = 0) -> Dict:
+    """p50/p95/p99/mean/max in milliseconds, plus throughput when elapsed is known."""
+    samples = sorted(latencies)
+    summary = {
+        'count': len(samples),
+        'errors': errors,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'mean_ms': (sum(samples) / len(samples) * 1000) if samples else 0.0,
+        'max_ms': (samples[-1] * 1000) if samples else 0.0,
+    }
+    if elapsed:
+        summary['throughput_rps'] = len(samples) / elapsed
+    return summary
+
+
+def time_calls(fn: Callable[[], object], repeat: int = 50, warmup: int = 3) -> List[float]:
+    """Wall time of `repeat` calls to fn, after `warmup` untimed ones."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=settings.BASE_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def write_results(path: str, results: Dict, parameters: Dict) -> Dict:
+    document = {
+        'revision': git_revision(),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'parameters': parameters,
+        'results': results,
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    return document
+
+
+def compare_results(baseline: Dict, current: Dict, keys: Tuple[str, ...] = ('p50_ms', 'p95_ms', 'p99_ms')):
+    """[(benchmark, key, before, after, change)] for benchmarks present in both documents."""
+    rows = []
+    for name, summary in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        for key in keys + ('throughput_rps',):
+            if key in summary and before.get(key):
+                rows.append((name, key, before[key], summary[key], summary[key] / before[key] - 1))
+    return rows
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class GunicornServer:
+    """
+    Run the app under gunicorn with the repo's gunicorn.conf.py (on a local port, with
+    extra environment such as ANILIST_API_URL) for the duration of a with-block. The
+    config picks the WSGI or ASGI app (GUNICORN_ASGI in env) unless app is given.
+    """
+
+    def __init__(self, workers: int = 2, env: Optional[Dict[str, str]] = None,
+                 config: str = 'gunicorn.conf.py', extra_args: Sequence[str] = (),
+                 startup_timeout: float = 60.0, app: Optional[str] = None):
+        self.port = free_port()
+        self.workers = workers
+        self.env = env or {}
+        self.config = config
+        self.app = app
+        self.extra_args = list(extra_args)
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.log_path = os.path.join(tempfile.gettempdir(), f'gunicorn-bench-{self.port}.log')
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        # Same signing key as this process, so JWTs minted by the benchmark verify.
+        env = {**os.environ, 'DJANGO_SECRET_KEY': settings.SECRET_KEY, **self.env}
+        self._log = open(self.log_path, 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *([self.app] if self.app else []), '-c', self.config,
+             '--bind', f'127.0.0.1:{self.port}', '--workers', str(self.workers), *self.extra_args],
+            cwd=settings.BASE_DIR, env=env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited early, see {self.log_path}')
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=0.5):
+                    return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError(f'gunicorn did not start within {self.startup_timeout}s, see {self.log_path}')
+
+    def __exit__(self, *exc_info):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self._log.close()
+
+
+class Scenario:
+    """One request type of a load test: a path (or callable building one) and its weight."""
+
+    def __init__(self, name: str, path, weight: int = 1, method: str = 'GET',
+                 json_body: Optional[Callable[[int], Dict]] = None):
+        self.name = name
+        self.path = path
+        self.weight = weight
+        self.method = method
+        self.json_body = json_body
+
+    def build(self, iteration: int) -> Tuple[str, Optional[Dict]]:
+        path = self.path(iteration) if callable(self.path) else self.path
+        return path, self.json_body(iteration) if self.json_body else None
+
+
+class LoadGenerator:
+    """
+    Closed-loop load: each virtual user runs on its own thread with its own keep-alive
+    session and token, cycling through the weighted scenarios back to back for
+    `duration` seconds. Latency is measured per scenario and overall.
+    """
+
+    def __init__(self, base_url: str, tokens: Sequence[str], scenarios: Sequence[Scenario],
+                 duration: float = 30.0, timeout: float = 30.0, ramp_up: float = 1.0):
+        self.base_url = base_url.rstrip('/')
+        self.tokens = list(tokens)
+        self.schedule = [scenario for scenario in scenarios for _ in range(scenario.weight)]
+        self.duration = duration
+        self.timeout = timeout
+        self.ramp_up = ramp_up
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {scenario.name: [] for scenario in scenarios}
+        self.errors: Dict[str, int] = {scenario.name: 0 for scenario in scenarios}
+        self.statuses: Dict[int, int] = {}
+
+    def _user(self, index: int, token: str, start_at: float, stop_at: float):
+        session = requests.Session()
+        session.headers.update({'Authorization': f'Bearer {token}', 'Accept': 'application/json'})
+        time.sleep(max(0.0, start_at - time.monotonic()))
+        iteration = index
+        while time.monotonic() < stop_at:
+            scenario = self.schedule[iteration % len(self.schedule)]
+            path, body = scenario.build(iteration)
+            iteration += 1
+            started = time.perf_counter()
+            try:
+                response = session.request(scenario.method, self.base_url + path, json=body, timeout=self.timeout)
+                status, ok = response.status_code, response.status_code < 400
+            except requests.RequestException:
+                status, ok = 0, False
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                if ok:
+                    self.latencies[scenario.name].append(elapsed)
+                else:
+                    self.errors[scenario.name] += 1
+        session.close()
+
+    def run(self) -> Dict:
+        now = time.monotonic()
+        stop_at = now + self.ramp_up + self.duration
+        threads = [
+            threading.Thread(
+                target=self._user,
+                args=(index, token, now + self.ramp_up * index / max(1, len(self.tokens)), stop_at),
+                daemon=True,
+            )
+            for index, token in enumerate(self.tokens)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started - self.ramp_up / 2
+
+        results = {
+            f'load.{name}': summarize(samples, elapsed, self.errors[name])
+            for name, samples in self.latencies.items()
+        }
+        results['load.all'] = summarize(
+            [sample for samples in self.latencies.values() for sample in samples],
+            elapsed, sum(self.errors.values()),
+        )
+        results['load.all']['statuses'] = {str(status): count for status, count in sorted(self.statuses.items())}
+        return results
@@ -0,0 +1,53 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # not on Windows
+    fcntl = None
+
+# add() and incr() are single atomic commands on these backends.
+ATOMIC_BACKENDS = (
+    'django.core.cache.backends.redis.',
+    'django.core.cache.backends.memcached.',
+    'django.core.cache.backends.locmem.',
+    'django_redis.',
+)
+
+
+def _lock_path(alias: str):
+    cache = caches[alias]
+    if f'{type(cache).__module__}.'.startswith(ATOMIC_BACKENDS):
+        return None
+    if isinstance(cache, FileBasedCache):
+        return os.path.join(cache._dir, f'.{alias}.lock')
+    # Database and other backends: serializes the workers of this host only.
+    return os.path.join(tempfile.gettempdir(), f'{alias}-cache.lock')
+
+
+@contextmanager
+def cache_lock(alias: str):
+    """
+    Make a read-modify-write on the cache alias (add() then incr(), or a check-and-add)
+    atomic across processes.
+
+    FileBasedCache implements add() as has_key() then set() and incr() as get() then
+    set(), so two workers can both win an add() or lose an increment. For such backends
+    this holds an exclusive fcntl lock on a file next to the cache; on Redis, Memcached
+    and local memory it does nothing.
+    """
+    path = _lock_path(alias) if fcntl is not None else None
+    if path is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
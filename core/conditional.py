@@ -0,0 +1,52 @@
+import hashlib
+from calendar import timegm
+from datetime import datetime
+from typing import Optional
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(request, *parts) -> str:
+    """
+    Weak ETag over the values a response body is derived from.
+
+    The accepted renderer is part of the tag, so the browsable API and JSON renderings of
+    the same data are distinct representations.
+    """
+    renderer = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+    digest = hashlib.sha1(repr((renderer,) + parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _timestamp(last_modified: Optional[datetime]) -> Optional[int]:
+    return timegm(last_modified.utctimetuple()) if last_modified is not None else None
+
+
+def not_modified(request, etag: Optional[str] = None, last_modified: Optional[datetime] = None,
+                 cache_control: Optional[dict] = None):
+    """
+    The 304 response for a conditional GET whose validators still match (412 for a
+    failed If-Match), else None.
+
+    Call it before rendering anything: when it returns a response the view should
+    return it as-is.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+    if response is not None:
+        set_cache_headers(response, etag, last_modified, cache_control)
+    return response
+
+
+def set_cache_headers(response, etag: Optional[str] = None, last_modified: Optional[datetime] = None,
+                      cache_control: Optional[dict] = None):
+    """Attach validators and the endpoint's Cache-Control policy to a response."""
+    if etag:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    if cache_control:
+        patch_cache_control(response, **cache_control)
+    # Bodies depend on who is asking (JWT) and on the negotiated renderer.
+    patch_vary_headers(response, ('Authorization', 'Accept'))
+    return response
@@ -0,0 +1,34 @@
+import logging
+import random
+from typing import Any, Optional
+
+from django.conf import settings
+
+
+class _Truncated:
+    """Defers repr() of a payload until a handler actually formats the record."""
+
+    def __init__(self, payload: Any, limit: int):
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self):
+        text = str(self.payload)
+        if len(text) > self.limit:
+            return f'{text[:self.limit]}... ({len(text)} chars)'
+        return text
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, sample_rate: Optional[float] = None):
+    """
+    Log a potentially large payload (e.g. an AniList response) at DEBUG for a sample of
+    calls. Nothing is formatted unless DEBUG is enabled for the logger and the call is
+    sampled; the text is capped at PAYLOAD_LOG_MAX_CHARS.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if sample_rate is None:
+        sample_rate = getattr(settings, 'PAYLOAD_LOG_SAMPLE_RATE', 0.01)
+    if sample_rate < 1 and random.random() >= sample_rate:
+        return
+    logger.debug('%s: %s', message, _Truncated(payload, getattr(settings, 'PAYLOAD_LOG_MAX_CHARS', 2000)))
@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core import anilist_cache
+from core.anilist import DETAILS_BATCH_SIZE, DETAILS_QUERY, AniListAPI
+from core.anilist_cache import AniListResponseCache
+from core.anilist_client import get_client
+from core.anilist_stub import StubAniListServer
+from core.ratelimit import get_governor
+
+
+class Command(BaseCommand):
+    help = 'Count upstream requests for anime detail lookups: one-by-one vs batched id_in (local stub)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', type=int, default=100, help='Distinct anime ids to look up')
+        parser.add_argument('--latency', type=float, default=0.05, help='Stub latency in seconds')
+
+    def handle(self, *args, **options):
+        count = options['ids']
+        failures = []
+
+        with StubAniListServer(latency=options['latency']) as stub, override_settings(ANILIST_API_URL=stub.url):
+            # Keep the benchmark out of the shared on-disk response cache.
+            anilist_cache._response_cache = AniListResponseCache(alias='default')
+            get_client(stub.url).pool_size = count
+            # The stub is not AniList; don't let the real budget throttle the comparison.
+            get_governor().per_minute = 1_000_000
+
+            def check(label, run, max_upstream, id_offset):
+                anilist_cache._response_cache.clear_local()
+                stub.reset_stats()
+                ids = list(range(id_offset, id_offset + count))
+                started = time.perf_counter()
+                found = run(ids)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{label:<44} {stub.requests:>4} upstream  {elapsed * 1000:8.1f} ms  '
+                    f'{found}/{count} found'
+                )
+                if stub.requests > max_upstream or found != count:
+                    failures.append(label)
+
+            batches = -(-count // DETAILS_BATCH_SIZE)
+
+            check('one Media(id:) query per id', lambda ids: sum(
+                1 for anime_id in ids
+                if AniListAPI.execute_query(DETAILS_QUERY, {'id': anime_id}, use_cache=False)['data']['Media']
+            ), count, 1)
+
+            def concurrent(ids):
+                with ThreadPoolExecutor(max_workers=len(ids)) as pool:
+                    results = list(pool.map(AniListAPI.get_anime_details, ids))
+                return sum(1 for result in results if result['data']['Media'])
+
+            # Threads start over more than one batching window, so allow a few partial batches.
+            check(f'{count} concurrent get_anime_details (loader)', concurrent, max(batches, count // 10), 10_001)
+            check('get_anime_details_batch (id_in)', lambda ids: len(AniListAPI.get_anime_details_batch(ids)),
+                  batches, 20_001)
+            check('get_anime_details_batch again (cached)', lambda ids: len(AniListAPI.get_anime_details_batch(ids)),
+                  0, 20_001)
+
+        if failures:
+            raise CommandError(f'Unexpected upstream request counts: {", ".join(failures)}')
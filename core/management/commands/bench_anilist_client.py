@@ -0,0 +1,71 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from core.anilist_client import AniListClient, AsyncAniListClient
+from core.anilist_stub import StubAniListServer
+
+QUERY = 'query ($page: Int, $perPage: Int) { Page(page: $page, perPage: $perPage) { media { id } } }'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the pooled/coalescing AniList clients against a local stub server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Sequential requests per run')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent identical callers')
+        parser.add_argument('--latency', type=float, default=0.05, help='Stub latency in seconds')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        concurrency = options['concurrency']
+
+        with StubAniListServer() as stub:
+            self._report(stub, 'bare requests.post', lambda: [
+                requests.post(stub.url, json={'query': QUERY, 'variables': {'page': i}}, timeout=10).json()
+                for i in range(total)
+            ])
+
+            client = AniListClient(stub.url)
+            self._report(stub, 'pooled session', lambda: [
+                client.post(QUERY, {'page': i}) for i in range(total)
+            ])
+
+        with StubAniListServer(latency=options['latency']) as stub:
+            def fan_out(client):
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    list(pool.map(lambda _: client.post(QUERY, {'page': 1}), range(concurrency)))
+
+            self._report(stub, f'{concurrency} identical callers, no coalescing', lambda: fan_out(
+                _UncoalescedClient(stub.url, pool_size=concurrency)
+            ))
+            self._report(stub, f'{concurrency} identical callers, coalesced', lambda: fan_out(
+                AniListClient(stub.url, pool_size=concurrency)
+            ))
+
+            async def gather():
+                client = AsyncAniListClient(stub.url)
+                await asyncio.gather(*(client.post(QUERY, {'page': 1}) for _ in range(concurrency)))
+                await client.aclose()
+
+            self._report(stub, f'{concurrency} identical callers, asyncio', lambda: asyncio.run(gather()))
+
+    def _report(self, stub, label, run):
+        stub.reset_stats()
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label:<45} {elapsed * 1000:9.1f} ms  '
+            f'upstream requests={stub.requests:<5} connections={stub.connections}'
+        )
+
+
+class _UncoalescedClient(AniListClient):
+    """Pooled client with coalescing disabled, as a baseline."""
+
+    def post(self, query, variables=None):
+        return self._send(query, variables)
@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, the way a gunicorn worker starts when preload_app is off:
+# import the WSGI app, optionally run the post-fork warmup, then serve one request.
+WORKER_SCRIPT = '''
+import io, json, os, sys, time
+started = time.perf_counter()
+options = json.loads(sys.argv[1])
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'xstagelabs.settings')
+from xstagelabs.wsgi import application
+imported = time.perf_counter()
+warmup = {}
+if options['warmup']:
+    from anime.warmup import warm_worker
+    warmup = warm_worker()
+warmed = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+path, _, query = options['path'].partition('?')
+environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': options['host'], 'wsgi.errors': io.StringIO()}
+setup_testing_defaults(environ)
+statuses = []
+body = b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - started, 'warmup': warmup, 'warmup_total': warmed - imported,
+    'first_request': served - warmed, 'status': statuses[0], 'modules': len(sys.modules),
+}))
+'''
+
+
+def parse_importtime(stderr: str):
+    """[(name, self_us, cumulative_us, depth)] from `python -X importtime` output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Profile worker start-up: import time per module and time to the first request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/anime/search/?q=naruto',
+                            help='Request served once the app is loaded')
+        parser.add_argument('--top', type=int, default=25, help='Modules/packages to list')
+        parser.add_argument('--warmup', action='store_true', help='Run the post-fork warmup before the request')
+        parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters to average over')
+        parser.add_argument('--json', dest='json_path', help='Also write the report to this file')
+
+    def run_worker(self, options):
+        worker_options = json.dumps({
+            'warmup': options['warmup'],
+            'path': options['path'],
+            'host': settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost',
+        })
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', WORKER_SCRIPT, worker_options],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy(),
+        )
+        if process.returncode != 0:
+            raise CommandError(process.stderr[-2000:])
+        return json.loads(process.stdout.strip().splitlines()[-1]), parse_importtime(process.stderr)
+
+    def handle(self, *args, **options):
+        runs = [self.run_worker(options) for _ in range(max(1, options['runs']))]
+        # Module breakdown from the last run (caches warm on disk, like a recycled worker).
+        result, modules = runs[-1]
+        top = options['top']
+
+        def mean(key):
+            return sum(run[key] for run, _ in runs) / len(runs)
+
+        by_package = defaultdict(int)
+        for name, self_us, _, _ in modules:
+            by_package[name.split('.')[0]] += self_us
+
+        self.stdout.write(f'Slowest imports (cumulative, last of {len(runs)} runs):')
+        for name, self_us, cumulative_us, depth in sorted(modules, key=lambda m: -m[2])[:top]:
+            self.stdout.write(f'  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:7.1f} ms self  {"  " * depth}{name}')
+        self.stdout.write('By top-level package (self time):')
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} ms  {package}')
+
+        for step, seconds in result['warmup'].items():
+            self.stdout.write(f'warmup {step:<22} {seconds * 1000:8.1f} ms')
+        report = {
+            'path': options['path'],
+            'runs': len(runs),
+            'modules_loaded': result['modules'],
+            'import_ms': mean('import') * 1000,
+            'warmup_ms': mean('warmup_total') * 1000,
+            'first_request_ms': mean('first_request') * 1000,
+            'status': result['status'],
+        }
+        report['time_to_first_request_ms'] = report['import_ms'] + report['warmup_ms'] + report['first_request_ms']
+        self.stdout.write(
+            f"app import {report['import_ms']:.1f} ms, warmup {report['warmup_ms']:.1f} ms, "
+            f"first request {report['first_request_ms']:.1f} ms ({report['status']}) -> "
+            f"time to first request {report['time_to_first_request_ms']:.1f} ms; "
+            f"{report['modules_loaded']} modules loaded"
+        )
+        if options['json_path']:
+            report['warmup_steps_ms'] = {step: seconds * 1000 for step, seconds in result['warmup'].items()}
+            report['slowest_imports'] = [
+                {'module': name, 'self_ms': self_us / 1000, 'cumulative_ms': cumulative_us / 1000}
+                for name, self_us, cumulative_us, _ in sorted(modules, key=lambda m: -m[2])[:top]
+            ]
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core import anilist_cache
+from core.anilist import AniListAPI
+from core.anilist_cache import AniListResponseCache
+from core.anilist_stub import RecordingResponder, StubAniListServer
+
+DEFAULT_TERMS = ['naruto', 'one piece', 'attack on titan', 'gundam', 'k-on', 'monogatari', 'steins gate', 'frieren']
+
+
+class Command(BaseCommand):
+    help = 'Record real AniList responses to the app\'s own queries, for replay by the benchmark stub'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='JSON file to write (bench_suite --fixtures)')
+        parser.add_argument('--terms', nargs='*', default=DEFAULT_TERMS, help='Search terms to record')
+        parser.add_argument('--pages', type=int, default=2, help='Search result pages per term')
+        parser.add_argument('--upstream', default='https://graphql.anilist.co')
+
+    def handle(self, *args, **options):
+        recorder = RecordingResponder(options['upstream'])
+        # Go through a private cache so every query actually reaches the recorder.
+        anilist_cache._response_cache = AniListResponseCache(alias='default')
+        with StubAniListServer(responder=recorder) as stub, override_settings(ANILIST_API_URL=stub.url):
+            genres = AniListAPI.get_genre_list()
+            for term in options['terms']:
+                for page in range(1, options['pages'] + 1):
+                    AniListAPI.search_anime(search=term, page=page)
+            for genre in genres:
+                AniListAPI.search_anime(genre=genre)
+                AniListAPI.get_recommendations_by_genres([genre])
+        recorder.save(options['output'])
+        self.stdout.write(f'Recorded {len(recorder.recordings)} responses to {options["output"]}')
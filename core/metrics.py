@@ -0,0 +1,285 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic counter with labels, in Prometheus exposition terms."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'|'.join(labels): value for labels, value in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict, snapshot: Dict):
+        for key, value in snapshot.items():
+            total[key] = total.get(key, 0.0) + value
+
+    def expose(self, merged: Dict) -> List[str]:
+        return [
+            f'{self.name}_total{_format_labels(self.labelnames, key.split("|") if key else ())} {_format_value(value)}'
+            for key, value in sorted(merged.items())
+        ]
+
+
+class Histogram:
+    """Fixed-bucket histogram with labels; observe() is one bisect and three adds."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'|'.join(labels): [list(counts), total, count]
+                    for labels, (counts, total, count) in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict, snapshot: Dict):
+        for key, (counts, value_sum, count) in snapshot.items():
+            series = total.get(key)
+            if series is None:
+                total[key] = [list(counts), value_sum, count]
+            else:
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += value_sum
+                series[2] += count
+
+    def expose(self, merged: Dict) -> List[str]:
+        lines = []
+        for key, (counts, value_sum, count) in sorted(merged.items()):
+            labels = key.split('|') if key else ()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(value_sum)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+def merge_snapshots(snapshots: Iterable[Dict]) -> Dict:
+    """Sum registry snapshots without knowing the metrics: histogram series are lists."""
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, values in snapshot.items():
+            total = merged.setdefault(name, {})
+            for key, value in values.items():
+                (Histogram if isinstance(value, list) else Counter).merge(total, {key: value})
+    return merged
+
+
+def _write_json(path: str, value):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(value, f)
+    os.replace(temporary, path)
+
+
+class Registry:
+    """
+    The process's metrics, rendered in the Prometheus text format.
+
+    With a directory configured (METRICS_DIR), each gunicorn worker periodically writes
+    its snapshot to <dir>/<pid>.json and /metrics sums every worker's file, so a scrape
+    that lands on any one worker sees the whole server. When a worker exits, retire()
+    folds its file into <dir>/exited.json: its numbers keep counting, as counters and
+    histograms must never go down, without one file per recycled worker piling up.
+    """
+
+    EXITED = 'exited.json'
+
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, object] = {}
+        self._flushed = 0.0
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.get(name) or self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+        return self._metrics.get(name) or self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, f'{os.getpid()}.json')
+
+    def flush_due(self) -> bool:
+        """Whether the flush interval has passed; if so, the next interval starts now."""
+        if not self.directory:
+            return False
+        now = time.monotonic()
+        if now - self._flushed < self.flush_interval:
+            return False
+        self._flushed = now
+        return True
+
+    def flush(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        _write_json(self._path(), self.snapshot())
+
+    def retire(self, pid: int):
+        """Fold an exited worker's snapshot into the exited-workers file (gunicorn child_exit)."""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'{pid}.json')
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            snapshot = {}
+        exited = os.path.join(self.directory, self.EXITED)
+        try:
+            with open(exited) as f:
+                total = json.load(f)
+        except (OSError, ValueError):
+            total = {}
+        _write_json(exited, merge_snapshots([total, snapshot]))
+        os.remove(path)
+
+    def _snapshots(self) -> Iterable[Dict]:
+        if not self.directory:
+            yield self.snapshot()
+            return
+        own = self._path()
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+        # This process's live numbers rather than its last flush.
+        yield self.snapshot()
+
+    def expose(self) -> str:
+        merged: Dict[str, Dict] = {name: {} for name in self._metrics}
+        for snapshot in self._snapshots():
+            for name, values in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is not None:
+                    metric.merge(merged[name], values)
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(metric.expose(merged[name]))
+        return '\n'.join(lines) + '\n'
+
+
+_registry: Optional[Registry] = None
+_registry_lock = threading.Lock()
+_request_metrics: Dict[str, object] = {}
+
+
+def get_registry() -> Registry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = Registry(
+                    directory=getattr(settings, 'METRICS_DIR', None),
+                    flush_interval=getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0),
+                )
+    return _registry
+
+
+def _reset_after_fork():
+    # A preloaded master has recorded nothing worth inheriting; start each worker clean.
+    global _registry
+    _registry = None
+    _request_metrics.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def request_metrics() -> Dict[str, object]:
+    """The per-request metrics TimingMiddleware records into."""
+    if _request_metrics:
+        return _request_metrics
+    registry = get_registry()
+    with _registry_lock:
+        _request_metrics.update({
+            'duration': registry.histogram(
+                'http_request_duration_seconds', 'Request latency, end to end in Django.',
+                ('view', 'method', 'status')),
+            'phase': registry.histogram(
+                'http_request_phase_seconds', 'Time per request spent in AniList calls, DB queries and serialization.',
+                ('view', 'phase')),
+            'queries': registry.histogram(
+                'http_request_db_queries', 'DB queries per request.', ('view',), buckets=COUNT_BUCKETS),
+            'cache': registry.counter(
+                'cache_lookups', 'Cache lookups made while serving requests.', ('cache', 'result')),
+        })
+    return _request_metrics
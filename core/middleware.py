@@ -0,0 +1,82 @@
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from . import timing
+from .metrics import get_registry, request_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TimingMiddleware:
+    """
+    Per-request instrumentation.
+
+    Opens a RequestTimings context for the request, then records what the AniList client,
+    the DB cursor wrapper, the caches and the renderer charged to it: as a Server-Timing
+    header on the response and into the Prometheus histograms served at /metrics.
+    Works for both WSGI (sync) and ASGI (async) stacks.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING_HEADER', True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = timing.start()
+        try:
+            response = self.get_response(request)
+            if self.record(request, response, timing.current()):
+                self.flush()
+            return response
+        finally:
+            timing.finish(token)
+
+    async def __acall__(self, request):
+        token = timing.start()
+        try:
+            response = await self.get_response(request)
+            if self.record(request, response, timing.current()):
+                # Writes a file: not on the event loop.
+                await sync_to_async(self.flush, thread_sensitive=False)()
+            return response
+        finally:
+            timing.finish(token)
+
+    @staticmethod
+    def flush():
+        try:
+            get_registry().flush()
+        except Exception as e:
+            logger.error(f"Failed to write request metrics: {str(e)}")
+
+    def record(self, request, response, timings) -> bool:
+        """Record the request; returns whether this process's metrics are due to be written."""
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None and match.view_name else 'unmatched'
+        if view == 'metrics':
+            return False
+        flush_due = False
+        try:
+            metrics = request_metrics()
+            metrics['duration'].observe(timings.elapsed(), view, request.method, str(response.status_code))
+            for phase in timing.PHASES:
+                metrics['phase'].observe(timings.durations.get(phase, 0.0), view, phase)
+            metrics['queries'].observe(timings.counts.get('db', 0), view)
+            for (cache, result), count in timings.cache.items():
+                metrics['cache'].inc(cache, result, amount=count)
+            flush_due = get_registry().flush_due()
+        except Exception as e:
+            logger.error(f"Failed to record request metrics: {str(e)}")
+        if self.server_timing:
+            response['Server-Timing'] = timings.server_timing()
+        return flush_due
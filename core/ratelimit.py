@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Mapping, Optional
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .cachelock import cache_lock
+
+logger = logging.getLogger(__name__)
+
+
+class AniListRateLimited(requests.exceptions.RequestException):
+    """Raised when a call could not get an AniList slot before its deadline."""
+
+
+class RateGovernor:
+    """
+    Client-side governor for AniList's rate limit, shared by all workers.
+
+    Three layers decide when a call may start:
+
+    * a per-minute request budget counted in the shared cache (all workers draw from it);
+    * a shared "blocked until" timestamp set from 429 Retry-After, or from
+      X-RateLimit-Remaining reaching zero, so one throttled worker pauses the rest;
+    * a per-process concurrency limit that grows additively while AniList reports
+      headroom and halves on a 429 (AIMD).
+
+    Callers wait in acquire() until all three allow them or their deadline passes, in
+    which case AniListRateLimited is raised instead of hammering AniList.
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, alias: str = 'anilist', per_minute: int = 90, max_concurrency: int = 8,
+                 min_concurrency: int = 1, reserve: int = 5):
+        self.alias = alias
+        self.per_minute = per_minute
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.reserve = reserve
+        self.concurrency_limit = float(max_concurrency)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._metrics = {
+            'acquired': 0,
+            'rejected': 0,
+            'throttled': 0,
+            'retries': 0,
+            'queue_wait_seconds_total': 0.0,
+            'queue_wait_seconds_max': 0.0,
+        }
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _window_key(self, now: float) -> str:
+        return f'ratelimit:anilist:{int(now // 60)}'
+
+    def blocked_until(self) -> float:
+        return self.cache.get('ratelimit:anilist:blocked_until') or 0.0
+
+    def block(self, seconds: float):
+        until = time.time() + seconds
+        if until > self.blocked_until():
+            self.cache.set('ratelimit:anilist:blocked_until', until, int(seconds) + 1)
+
+    def _take_budget(self, now: float) -> bool:
+        key = self._window_key(now)
+        with cache_lock(self.alias):
+            self.cache.add(key, 0, 120)
+            try:
+                used = self.cache.incr(key)
+            except ValueError:
+                # The window key expired between add() and incr(); start it again.
+                self.cache.set(key, 1, 120)
+                used = 1
+        return used <= self.per_minute
+
+    def try_acquire(self) -> Optional[float]:
+        """Take a slot if one is free now; otherwise return seconds until it is worth retrying."""
+        now = time.time()
+        blocked = self.blocked_until()
+        if blocked > now:
+            return blocked - now
+        with self._lock:
+            if self._active >= int(self.concurrency_limit):
+                return self.POLL_INTERVAL
+            self._active += 1
+        if not self._take_budget(now):
+            with self._lock:
+                self._active -= 1
+            return 60 - now % 60
+        return None
+
+    def acquire(self, deadline: float):
+        """Block until a slot is available; deadline is a time.monotonic() value."""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if wait is None:
+                self._record_wait(time.monotonic() - started)
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._reject()
+            time.sleep(min(wait, remaining, 1.0))
+
+    async def aacquire(self, deadline: float):
+        # try_acquire() does shared-cache I/O (and may wait on the cache lock): keep it
+        # off the event loop.
+        try_acquire = sync_to_async(self.try_acquire, thread_sensitive=False)
+        started = time.monotonic()
+        while True:
+            attempt = asyncio.ensure_future(try_acquire())
+            try:
+                wait = await asyncio.shield(attempt)
+            except asyncio.CancelledError:
+                # The thread carries on; a slot it takes for nobody is handed back.
+                attempt.add_done_callback(self._release_abandoned)
+                raise
+            if wait is None:
+                self._record_wait(time.monotonic() - started)
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._reject()
+            await asyncio.sleep(min(wait, remaining, 1.0))
+
+    def _release_abandoned(self, attempt: asyncio.Future):
+        if not attempt.cancelled() and attempt.exception() is None and attempt.result() is None:
+            self._release(None, {})
+
+    def release(self, status_code: Optional[int] = None, headers: Optional[Mapping[str, str]] = None):
+        """Return the slot and adapt to what AniList said about our rate."""
+        seconds = self._release(status_code, headers or {})
+        if seconds is not None:
+            self.block(seconds)
+
+    async def arelease(self, status_code: Optional[int] = None, headers: Optional[Mapping[str, str]] = None):
+        seconds = self._release(status_code, headers or {})
+        if seconds is not None:
+            await sync_to_async(self.block, thread_sensitive=False)(seconds)
+
+    def _release(self, status_code: Optional[int], headers: Mapping[str, str]) -> Optional[float]:
+        """Update the in-process state; returns how long to pause all workers, if at all."""
+        with self._lock:
+            self._active -= 1
+            if status_code == 429:
+                self._metrics['throttled'] += 1
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+            elif status_code is not None and status_code < 400:
+                self.concurrency_limit = min(
+                    self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit
+                )
+
+        if status_code == 429:
+            seconds = retry_after(headers, default=60.0)
+            logger.warning(f"AniList rate limit hit; pausing all workers for {seconds:.0f}s")
+            return seconds
+
+        remaining = _header_number(headers, 'X-RateLimit-Remaining')
+        if remaining is not None and remaining <= self.reserve:
+            reset = _header_number(headers, 'X-RateLimit-Reset')
+            seconds = reset - time.time() if reset is not None else 60 - time.time() % 60
+            return max(seconds, 1.0)
+        return None
+
+    def reset(self):
+        """Forget per-process state inherited across fork."""
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def record_retry(self):
+        with self._lock:
+            self._metrics['retries'] += 1
+
+    def _record_wait(self, seconds: float):
+        with self._lock:
+            self._metrics['acquired'] += 1
+            self._metrics['queue_wait_seconds_total'] += seconds
+            self._metrics['queue_wait_seconds_max'] = max(self._metrics['queue_wait_seconds_max'], seconds)
+
+    def _reject(self):
+        with self._lock:
+            self._metrics['rejected'] += 1
+        raise AniListRateLimited('Timed out waiting for an AniList rate-limit slot')
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['active'] = self._active
+            metrics['concurrency_limit'] = self.concurrency_limit
+        metrics['queue_wait_seconds_avg'] = (
+            metrics['queue_wait_seconds_total'] / metrics['acquired'] if metrics['acquired'] else 0.0
+        )
+        return metrics
+
+
+def _header_number(headers: Mapping[str, str], name: str) -> Optional[float]:
+    # A malformed header is ignored rather than failing the call that carried it.
+    try:
+        return float(headers[name]) if headers.get(name) is not None else None
+    except ValueError:
+        return None
+
+
+def retry_after(headers: Mapping[str, str], default: float) -> float:
+    value = headers.get('Retry-After')
+    try:
+        return max(float(value), 0.0) if value is not None else default
+    except ValueError:
+        return default
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 10.0) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_governor: Optional[RateGovernor] = None
+
+
+def get_governor() -> RateGovernor:
+    global _governor
+    if _governor is None:
+        _governor = RateGovernor(
+            alias=getattr(settings, 'ANILIST_CACHE_ALIAS', 'anilist'),
+            per_minute=getattr(settings, 'ANILIST_RATE_LIMIT', 90),
+            max_concurrency=getattr(settings, 'ANILIST_MAX_CONCURRENCY', 8),
+        )
+    return _governor
+
+
+def _reset_after_fork():
+    if _governor is not None:
+        _governor.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime
+from typing import Any
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+from .timing import timed
+
+
+class RenderedJSON(bytes):
+    """A JSON document that has already been rendered; renderers pass it through as-is."""
+
+
+def _orjson_exact(value: Any) -> bool:
+    # orjson writes 1e16 where json writes 1e+16 (likewise for tiny floats); only plain
+    # decimal floats render identically. Datetimes match DRF's encoder under OPT_UTC_Z,
+    # except for UTC offsets with seconds, which orjson rounds to the minute.
+    if isinstance(value, float):
+        return value == 0 or 1e-4 <= abs(value) < 1e16
+    if isinstance(value, datetime):
+        offset = value.utcoffset()
+        return offset is None or offset.seconds % 60 == 0
+    if isinstance(value, dict):
+        return all(_orjson_exact(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return all(_orjson_exact(item) for item in value)
+    return True
+
+
+def _contains_rendered(value: Any) -> bool:
+    if isinstance(value, dict):
+        return any(isinstance(item, RenderedJSON) or _contains_rendered(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(isinstance(item, RenderedJSON) or _contains_rendered(item) for item in value)
+    return False
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Render value byte-for-byte the way DRF's JSONRenderer does with default settings
+    (compact separators, UTF-8 rather than \\u escapes, U+2028/U+2029 escaped), using
+    orjson where that is exact: datetimes in UTC end in Z, and values orjson cannot
+    encode the same way (Decimal, timedelta, exponent floats) go through JSONRenderer.
+    RenderedJSON values anywhere in dicts and lists are spliced in verbatim.
+    """
+    if isinstance(value, RenderedJSON):
+        return bytes(value)
+    if _contains_rendered(value):
+        if isinstance(value, dict):
+            return b'{' + b','.join(dumps(str(key)) + b':' + dumps(item) for key, item in value.items()) + b'}'
+        return b'[' + b','.join(dumps(item) for item in value) + b']'
+
+    if _orjson_exact(value):
+        try:
+            rendered = orjson.dumps(value, option=orjson.OPT_UTC_Z)
+        except TypeError:
+            rendered = None
+        if rendered is not None:
+            return rendered.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return JSONRenderer().render(value)
+
+
+def join_rendered(fragments) -> RenderedJSON:
+    """A JSON array assembled from already-rendered elements."""
+    return RenderedJSON(b'[' + b','.join(fragments) + b']')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that renders compact responses with orjson and passes RenderedJSON
+    (e.g. lists assembled from cached fragments) straight through.
+
+    Output matches JSONRenderer's byte for byte (see dumps); indented (browsable API)
+    output is left to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timed('serialize'):
+            if self.get_indent(accepted_media_type, renderer_context or {}):
+                data = json.loads(dumps(data))
+                return super().render(data, accepted_media_type, renderer_context)
+            return dumps(data)
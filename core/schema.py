@@ -0,0 +1,52 @@
+import threading
+
+from django.views.decorators.csrf import csrf_exempt
+
+
+class LazySchemaView:
+    """
+    Stand-in for drf_yasg's get_schema_view() that defers the import.
+
+    drf_yasg.views pulls in the codecs, spec validator, YAML and jsonschema stacks (over
+    100 ms per process). Only the documentation pages need them, so they are imported
+    the first time one is requested instead of in every worker at start-up.
+    """
+
+    def __init__(self, info_factory, **kwargs):
+        self.info_factory = info_factory
+        self.kwargs = kwargs
+        self._schema_view = None
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        if self._schema_view is None:
+            with self._lock:
+                if self._schema_view is None:
+                    from drf_yasg.views import get_schema_view
+                    self._schema_view = get_schema_view(self.info_factory(), **self.kwargs)
+        return self._schema_view
+
+    def _view(self, key, build):
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = build(self.resolve())
+        return view
+
+    def with_ui(self, renderer='swagger', cache_timeout=0, cache_kwargs=None):
+        @csrf_exempt
+        def view(request, *args, **kwargs):
+            return self._view(
+                ('ui', renderer, cache_timeout),
+                lambda schema_view: schema_view.with_ui(renderer, cache_timeout, cache_kwargs),
+            )(request, *args, **kwargs)
+        return view
+
+    def without_ui(self, cache_timeout=0, cache_kwargs=None):
+        @csrf_exempt
+        def view(request, *args, **kwargs):
+            return self._view(
+                ('raw', cache_timeout),
+                lambda schema_view: schema_view.without_ui(cache_timeout, cache_kwargs),
+            )(request, *args, **kwargs)
+        return view
@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+
+from .cachelock import cache_lock
+
+logger = logging.getLogger(__name__)
+
+
+class Revalidator:
+    """
+    Background refresher for stale-while-revalidate reads.
+
+    Refreshes run on a small thread pool. Each key is single-flight: in-process through a
+    set of running keys, and across workers through a cache.add() lock on the shared
+    cache (made atomic by core.cachelock where the backend's add() is not), so a stale
+    entry is refreshed once no matter how many requests see it.
+    """
+
+    def __init__(self, max_workers: int = 4, lock_alias: str = 'anilist', lock_timeout: int = 60):
+        self.max_workers = max_workers
+        self.lock_alias = lock_alias
+        self.lock_timeout = lock_timeout
+        self._executor = None
+        self._running = set()
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='swr'
+                    )
+        return self._executor
+
+    def _lock_key(self, key: str) -> str:
+        return f'swr-lock:{key}'
+
+    def submit(self, key: str, refresh: Callable[[], None]) -> bool:
+        """Schedule refresh() unless a refresh for key is already running somewhere."""
+        with self._lock:
+            if key in self._running:
+                return False
+            self._running.add(key)
+
+        with cache_lock(self.lock_alias):
+            added = caches[self.lock_alias].add(self._lock_key(key), 1, self.lock_timeout)
+        if not added:
+            with self._lock:
+                self._running.discard(key)
+            return False
+
+        self.executor.submit(self._run, key, refresh)
+        return True
+
+    async def asubmit(self, key: str, refresh: Callable[[], None]) -> bool:
+        """submit() for event-loop callers: the shared-cache lock is taken in a thread."""
+        return await sync_to_async(self.submit, thread_sensitive=False)(key, refresh)
+
+    def _run(self, key: str, refresh: Callable[[], None]):
+        close_old_connections()
+        try:
+            refresh()
+        except Exception as e:
+            logger.warning(f"Background refresh for {key} failed: {str(e)}")
+        finally:
+            caches[self.lock_alias].delete(self._lock_key(key))
+            with self._lock:
+                self._running.discard(key)
+            close_old_connections()
+
+    def reset(self):
+        """Forget the pool and running keys (used after fork)."""
+        self._executor = None
+        self._running = set()
+        self._lock = threading.Lock()
+
+
+_revalidator: Optional[Revalidator] = None
+
+
+def get_revalidator() -> Revalidator:
+    global _revalidator
+    if _revalidator is None:
+        _revalidator = Revalidator(
+            max_workers=getattr(settings, 'SWR_MAX_WORKERS', 4),
+            lock_alias=getattr(settings, 'ANILIST_CACHE_ALIAS', 'anilist'),
+        )
+    return _revalidator
+
+
+def _reset_after_fork():
+    if _revalidator is not None:
+        _revalidator.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,3 +1,608 @@
-from django.test import TestCase
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as clock_time, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import httpx
+import requests
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from . import anilist_cache
+from .anilist import DETAILS_BATCH_QUERY, DETAILS_BATCH_SIZE, DETAILS_QUERY, AniListAPI
+from .anilist_cache import AniListResponseCache
+from .anilist_client import AniListClient, AsyncAniListClient
+from .anilist_stub import CatalogFixtureResponder, ReplayResponder, StubAniListServer, synthetic_catalog
+from .benchmark import compare_results, summarize, write_results
+from .metrics import Registry
+from .middleware import TimingMiddleware
+from .ratelimit import RateGovernor
+from .renderers import FastJSONRenderer, RenderedJSON, dumps
+from .schema import LazySchemaView
+from .swr import Revalidator
+from .views import metrics
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'}
+
+QUERY = 'query ($id: Int) { Media(id: $id) { id } }'
+
+
+class AsyncAniListClientCoalescingTests(SimpleTestCase):
+
+    def make_client(self):
+        client = AsyncAniListClient('http://anilist.invalid/')
+        client.release = asyncio.Event()
+        client.sends = 0
+
+        async def send(query, variables):
+            client.sends += 1
+            await client.release.wait()
+            return {'data': {'Media': {'id': variables['id']}}}
+
+        client._send = send
+        return client
+
+    async def test_identical_requests_share_one_upstream_call(self):
+        client = self.make_client()
+        callers = [asyncio.ensure_future(client.post(QUERY, {'id': 1})) for _ in range(3)]
+        await asyncio.sleep(0)
+        client.release.set()
+
+        results = await asyncio.gather(*callers)
+
+        self.assertEqual(client.sends, 1)
+        self.assertEqual(client.coalesced_requests, 2)
+        self.assertEqual(results, [{'data': {'Media': {'id': 1}}}] * 3)
+
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        client = self.make_client()
+        leader = asyncio.ensure_future(client.post(QUERY, {'id': 1}))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(client.post(QUERY, {'id': 1}))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        client.release.set()
+
+        self.assertEqual(await follower, {'data': {'Media': {'id': 1}}})
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(client.sends, 1)
+        self.assertEqual(client._inflight, {})
+
+    async def test_request_outlives_all_cancelled_callers(self):
+        client = self.make_client()
+        caller = asyncio.ensure_future(client.post(QUERY, {'id': 2}))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.sleep(0)
+
+        # A caller arriving before the upstream answer joins the running request.
+        late = asyncio.ensure_future(client.post(QUERY, {'id': 2}))
+        await asyncio.sleep(0)
+        client.release.set()
+
+        self.assertEqual(await late, {'data': {'Media': {'id': 2}}})
+        self.assertEqual(client.sends, 1)
+
+
+class StubResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class StubSession:
+    """requests.Session stand-in that answers Media/Page(id_in:) queries and records each POST."""
+
+    def __init__(self, hold=None):
+        self.hold = hold
+        self.posts = []
+        self._lock = threading.Lock()
+
+    def post(self, url, json, timeout=None):
+        with self._lock:
+            self.posts.append(json['variables'])
+        if self.hold is not None:
+            self.hold.wait(5)
+        variables = json['variables']
+        if 'ids' in variables:
+            return StubResponse({'data': {'Page': {'media': [self.media(anime_id) for anime_id in variables['ids']]}}})
+        return StubResponse({'data': {'Media': self.media(variables['id'])}})
+
+    @staticmethod
+    def media(anime_id):
+        return {'id': anime_id, 'title': {'romaji': f'Anime {anime_id}'}}
+
+
+def stub_client(session):
+    client = AniListClient('http://anilist.invalid/')
+    client._session = session
+    return client
+
+
+class AniListClientCoalescingTests(SimpleTestCase):
+
+    def test_concurrent_identical_queries_make_one_upstream_request(self):
+        release = threading.Event()
+        session = StubSession(hold=release)
+        client = stub_client(session)
+        callers = 8
+
+        with ThreadPoolExecutor(max_workers=callers) as pool:
+            futures = [pool.submit(client.post, DETAILS_QUERY, {'id': 7}) for _ in range(callers)]
+            deadline = time.monotonic() + 5
+            while client.coalesced_requests < callers - 1 and time.monotonic() < deadline:
+                time.sleep(0.001)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(len(session.posts), 1)
+        self.assertEqual(client.coalesced_requests, callers - 1)
+        self.assertTrue(all(result == {'data': {'Media': StubSession.media(7)}} for result in results))
+
+    def test_different_variables_are_not_coalesced(self):
+        session = StubSession()
+        client = stub_client(session)
+
+        client.post(DETAILS_QUERY, {'id': 1})
+        client.post(DETAILS_QUERY, {'id': 2})
+
+        self.assertEqual(len(session.posts), 2)
+
+
+@override_settings(CACHES={'default': LOCMEM, 'anilist': LOCMEM}, ANILIST_BATCH_WINDOW=0.05)
+class AniListDetailsBatchingTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['anilist'].clear()
+        self.session = StubSession()
+        client = stub_client(self.session)
+        patches = [
+            mock.patch('core.anilist.get_client', return_value=client),
+            mock.patch.object(anilist_cache, '_response_cache', AniListResponseCache(alias='anilist')),
+            mock.patch.object(AniListAPI, '_details_loader', None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_concurrent_lookups_share_batched_requests_and_get_their_own_media(self):
+        anime_ids = list(range(1, 61))
+
+        with ThreadPoolExecutor(max_workers=len(anime_ids)) as pool:
+            results = dict(zip(anime_ids, pool.map(AniListAPI.get_anime_details, anime_ids)))
+
+        for anime_id, result in results.items():
+            self.assertEqual(result, {'data': {'Media': StubSession.media(anime_id)}})
+        # One window batches everything, in chunks of at most DETAILS_BATCH_SIZE ids.
+        self.assertLessEqual(len(self.session.posts), 4)
+        self.assertTrue(all(len(posted['ids']) <= DETAILS_BATCH_SIZE for posted in self.session.posts))
+        self.assertEqual(sorted(i for posted in self.session.posts for i in posted['ids']), anime_ids)
+
+    def test_batch_lookup_splits_ids_into_pages_and_caches_each_id(self):
+        found = AniListAPI.get_anime_details_batch(list(range(1, 121)))
+
+        self.assertEqual(len(self.session.posts), 3)
+        self.assertEqual(found[75], StubSession.media(75))
+
+        AniListAPI.get_anime_details(75)
+        self.assertEqual(len(self.session.posts), 3)
+
+    def test_refetched_ids_skip_the_cache_and_replace_it(self):
+        AniListAPI.get_anime_details_batch([1, 2])
+        AniListAPI.get_anime_details_batch([1, 2], refetch=[2])
+
+        self.assertEqual(self.session.posts[-1], {'ids': [2], 'perPage': DETAILS_BATCH_SIZE})
+        AniListAPI.get_anime_details_batch([2])
+        self.assertEqual(len(self.session.posts), 2)
+
+    def test_batch_query_carries_only_missing_ids(self):
+        AniListAPI.get_anime_details_batch([1, 2])
+        AniListAPI.get_anime_details_batch([1, 2, 3])
+
+        self.assertEqual(self.session.posts[-1], {'ids': [3], 'perPage': DETAILS_BATCH_SIZE})
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    PAYLOADS = {
+        'utc datetime': datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        'utc datetime with microseconds': datetime(2024, 1, 2, 3, 4, 5, 120, tzinfo=timezone.utc),
+        'zero offset zone': datetime(2024, 1, 2, 3, 4, 5, tzinfo=ZoneInfo('Europe/London')),
+        'offset datetime': datetime(2024, 7, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+        'offset with seconds': datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(seconds=30))),
+        'naive datetime': datetime(2024, 1, 2, 3, 4, 5),
+        'date': date(2024, 1, 2),
+        'time': clock_time(3, 4, 5, 6),
+        'timedelta': timedelta(minutes=24),
+        'decimal': Decimal('8.25'),
+        'uuid': uuid.UUID('cd0fa61a-098e-42f5-b43f-0f864f51529c'),
+        'floats': [0.0, 0.5, 1e16, 1e-5, -3.25],
+        'text': 'Shingeki no Kyojin \u2014 進撃の巨人 \u2028\u2029',
+        'nested': {'results': [{'id': 1, 'updated_at': datetime(2024, 1, 2, tzinfo=timezone.utc),
+                                'score': None, 'genres': ['Action']}], 'hasNextPage': False},
+    }
+
+    def test_renders_the_same_bytes_as_drf(self):
+        for label, payload in self.PAYLOADS.items():
+            with self.subTest(label):
+                expected = JSONRenderer().render(payload)
+                self.assertEqual(dumps(payload), expected)
+                self.assertEqual(FastJSONRenderer().render(payload), expected)
+
+    def test_rendered_fragments_are_spliced_verbatim(self):
+        fragment = RenderedJSON(dumps({'id': 1, 'updated_at': datetime(2024, 1, 2, tzinfo=timezone.utc)}))
+        self.assertEqual(
+            FastJSONRenderer().render({'results': [fragment]}),
+            b'{"results":[{"id":1,"updated_at":"2024-01-02T00:00:00Z"}]}',
+        )
+
+
+@override_settings(CACHES={'default': LOCMEM, 'anilist': LOCMEM})
+class AniListResponseCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['anilist'].clear()
+        # Two workers' caches over the same shared tier.
+        self.first = AniListResponseCache(alias='anilist', ttls={'details': 60}, stale_ttls={'details': 600})
+        self.second = AniListResponseCache(alias='anilist', ttls={'details': 60}, stale_ttls={'details': 600})
+
+    def test_stale_local_entry_is_replaced_by_a_shared_refresh(self):
+        with mock.patch('core.anilist_cache.time.time', return_value=1000.0):
+            self.first.set('media:1', {'v': 1}, 'details')
+            self.assertEqual(self.first.get('media:1', 'details'), ({'v': 1}, False))
+        with mock.patch('core.anilist_cache.time.time', return_value=1100.0):
+            self.assertEqual(self.first.get('media:1', 'details'), ({'v': 1}, True))
+            self.second.set('media:1', {'v': 2}, 'details')
+
+            self.assertEqual(self.first.get('media:1', 'details'), ({'v': 2}, False))
+
+    def test_stale_shared_entry_is_not_kept_locally(self):
+        with mock.patch('core.anilist_cache.time.time', return_value=1000.0):
+            self.first.set('media:1', {'v': 1}, 'details')
+        with mock.patch('core.anilist_cache.time.time', return_value=1100.0):
+            self.assertEqual(self.second.get('media:1', 'details'), ({'v': 1}, True))
+        self.assertEqual(self.second.stats()['local_entries'], 0)
+
+
+def _take_budget_repeatedly(governor, now, attempts, results):
+    results.put(sum(governor._take_budget(now) for _ in range(attempts)))
+
+
+class RateGovernorTests(SimpleTestCase):
+
+    def test_file_cache_budget_is_not_overspent_by_concurrent_workers(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': LOCMEM,
+            'anilist': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            governor = RateGovernor(alias='anilist', per_minute=60)
+            context = multiprocessing.get_context('fork')
+            results = context.Queue()
+            workers = [
+                context.Process(target=_take_budget_repeatedly, args=(governor, 6000.0, 40, results))
+                for _ in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            granted = sum(results.get(timeout=30) for _ in workers)
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual(granted, 60)
+
+    @override_settings(CACHES={'default': LOCMEM, 'anilist': LOCMEM})
+    async def test_aacquire_checks_the_shared_budget_off_the_event_loop(self):
+        caches['anilist'].clear()
+        governor = RateGovernor(alias='anilist')
+        loop_thread = threading.get_ident()
+        threads = []
+        take_budget = governor._take_budget
+
+        def record_thread(now):
+            threads.append(threading.get_ident())
+            return take_budget(now)
+
+        with mock.patch.object(governor, '_take_budget', side_effect=record_thread):
+            await governor.aacquire(time.monotonic() + 1)
+
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], loop_thread)
+
+
+class FailingSession:
+
+    def __init__(self, exc):
+        self.exc = exc
+
+    def post(self, *args, **kwargs):
+        raise self.exc
+
+
+@override_settings(CACHES={'default': LOCMEM, 'anilist': LOCMEM})
+class GovernorSlotReleaseTests(SimpleTestCase):
+    """Every way a call can end hands its governor slot back."""
+
+    def setUp(self):
+        caches['anilist'].clear()
+        self.governor = RateGovernor(alias='anilist', max_concurrency=2)
+
+    def test_sync_client_releases_on_non_transport_errors(self):
+        for exc in (requests.exceptions.ChunkedEncodingError('cut'), requests.exceptions.InvalidURL('bad'),
+                    requests.exceptions.TooManyRedirects('loop')):
+            client = AniListClient('http://anilist.invalid/', governor=self.governor)
+            client._session = FailingSession(exc)
+            with self.subTest(type(exc).__name__), self.assertRaises(type(exc)):
+                client.post(QUERY, {'id': 1})
+            self.assertEqual(self.governor._active, 0)
+
+    def test_malformed_rate_limit_header_is_ignored(self):
+        client = AniListClient('http://anilist.invalid/', governor=self.governor)
+        response = StubResponse({'data': {'Media': {'id': 1}}})
+        response.headers = {'X-RateLimit-Remaining': 'soon'}
+        client._session = mock.Mock(post=mock.Mock(return_value=response))
+
+        self.assertEqual(client.post(QUERY, {'id': 1}), {'data': {'Media': {'id': 1}}})
+        self.assertEqual(self.governor._active, 0)
+
+    async def test_async_client_releases_on_decoding_errors(self):
+        client = AsyncAniListClient('http://anilist.invalid/', governor=self.governor)
+        http = mock.Mock(post=mock.AsyncMock(side_effect=httpx.DecodingError('garbled')))
+        with mock.patch.object(client, '_client', return_value=http), self.assertRaises(httpx.DecodingError):
+            await client.post(QUERY, {'id': 1})
+        self.assertEqual(self.governor._active, 0)
+
+    async def test_async_client_releases_when_the_request_is_cancelled(self):
+        client = AsyncAniListClient('http://anilist.invalid/', governor=self.governor)
+        started = asyncio.Event()
+
+        async def hang(*args, **kwargs):
+            started.set()
+            await asyncio.Event().wait()
+
+        with mock.patch.object(client, '_client', return_value=mock.Mock(post=hang)):
+            request = asyncio.ensure_future(client._send(QUERY, {'id': 1}))
+            await started.wait()
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+        self.assertEqual(self.governor._active, 0)
+
+
+class LazySchemaViewTests(SimpleTestCase):
+
+    def test_urlconf_loads_without_the_schema_or_scipy_stacks(self):
+        script = (
+            'import sys, django; django.setup(); import xstagelabs.urls; '
+            'print(sorted(m for m in ("drf_yasg.views", "drf_yasg.generators", "scipy") if m in sys.modules))'
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='xstagelabs.settings')
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env, check=True)
+
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    @mock.patch('drf_yasg.views.get_schema_view')
+    def test_schema_view_is_built_once_on_first_request(self, get_schema_view):
+        info_factory = mock.Mock()
+        lazy = LazySchemaView(info_factory, public=True)
+        swagger = lazy.with_ui('swagger', cache_timeout=0)
+        get_schema_view.assert_not_called()
+
+        request = RequestFactory().get('/')
+        swagger(request)
+        swagger(request)
+
+        get_schema_view.assert_called_once_with(info_factory.return_value, public=True)
+        with_ui = get_schema_view.return_value.with_ui
+        with_ui.assert_called_once_with('swagger', 0, None)
+        self.assertEqual(with_ui.return_value.call_count, 2)
+
+
+class AniListStubServerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+
+    def post(self, server, variables=None, query=QUERY):
+        return self.session.post(server.url, json={'query': query, 'variables': variables or {}}, timeout=5)
+
+    def test_recorded_responses_replay_and_the_rest_fall_back_to_the_catalog(self):
+        recorded = {'data': {'Media': {'id': 1, 'recorded': True}}}
+        catalog = CatalogFixtureResponder(synthetic_catalog(count=5))
+        responder = ReplayResponder([{'query': QUERY, 'variables': {'id': 1}, 'response': recorded}], catalog)
+
+        with StubAniListServer(responder=responder) as server:
+            self.assertEqual(self.post(server, {'id': 1}).json(), recorded)
+            self.assertEqual(self.post(server, {'id': 2}).json()['data']['Media']['id'], 2)
+
+        self.assertEqual(responder.replayed, 1)
+
+    def test_throttling_and_errors_are_injected_deterministically(self):
+        def statuses(server):
+            return [self.post(server, {'id': 1}).status_code for _ in range(6)]
+
+        with StubAniListServer(throttle_every=3, retry_after=7) as server:
+            responses = [self.post(server, {'id': 1}) for _ in range(6)]
+            self.assertEqual([response.status_code for response in responses], [200, 200, 429, 200, 200, 429])
+            self.assertEqual(responses[2].headers['Retry-After'], '7')
+            self.assertEqual(server.requests, 6)
+            self.assertEqual(server.connections, 1)
+
+        with StubAniListServer(error_rate=0.5, seed=3) as first, StubAniListServer(error_rate=0.5, seed=3) as second:
+            first_statuses = statuses(first)
+            self.assertEqual(first_statuses, statuses(second))
+            self.assertIn(500, first_statuses)
+
+    def test_catalog_pages_honour_updated_after(self):
+        responder = CatalogFixtureResponder(synthetic_catalog(count=5))
+
+        page = responder({'variables': {'page': 1, 'perPage': 2, 'updatedAfter': 1_700_000_002}})['data']['Page']
+
+        self.assertEqual([item['id'] for item in page['media']], [3, 4])
+        self.assertTrue(page['pageInfo']['hasNextPage'])
+
+
+class BenchmarkResultsTests(SimpleTestCase):
+
+    def test_summary_uses_nearest_rank_percentiles(self):
+        summary = summarize([i / 1000 for i in range(100, 0, -1)], elapsed=2.0, errors=1)
+
+        self.assertAlmostEqual(summary['p50_ms'], 50)
+        self.assertAlmostEqual(summary['p95_ms'], 95)
+        self.assertAlmostEqual(summary['p99_ms'], 99)
+        self.assertAlmostEqual(summary['max_ms'], 100)
+        self.assertEqual(summary['throughput_rps'], 50)
+        self.assertEqual(summary['errors'], 1)
+
+    def test_results_are_written_and_compared_across_revisions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmarks', 'rev.json')
+            with mock.patch('core.benchmark.git_revision', return_value='abc123'):
+                write_results(path, {'micro.ranking': {'p50_ms': 2.0, 'p95_ms': 4.0}}, {'users': 1})
+            with open(path) as f:
+                baseline = json.load(f)
+
+        current = {'results': {'micro.ranking': {'p50_ms': 3.0, 'p95_ms': 4.0}, 'micro.new': {'p50_ms': 1.0}}}
+        rows = compare_results(baseline, current)
+
+        self.assertEqual(baseline['revision'], 'abc123')
+        self.assertEqual(baseline['parameters'], {'users': 1})
+        self.assertEqual(rows, [('micro.ranking', 'p50_ms', 2.0, 3.0, 0.5), ('micro.ranking', 'p95_ms', 4.0, 4.0, 0.0)])
+
+
+class RevalidatorTests(SimpleTestCase):
+
+    def test_file_cache_refresh_lock_is_taken_once_across_workers(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': LOCMEM,
+            'anilist': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            # One Revalidator per worker, so only the shared lock stands between them.
+            revalidators = [Revalidator(lock_alias='anilist') for _ in range(8)]
+            start = threading.Barrier(len(revalidators))
+
+            def submit(revalidator):
+                start.wait()
+                with mock.patch.object(revalidator, '_run'):
+                    return revalidator.submit('recommendations:1', lambda: None)
+
+            with ThreadPoolExecutor(max_workers=len(revalidators)) as pool:
+                submitted = list(pool.map(submit, revalidators))
+
+        self.assertEqual(submitted.count(True), 1)
+
+
+class EventLoopIOTests(SimpleTestCase):
+    """Shared-cache and file I/O reached from async code runs in a thread, not on the loop."""
+
+    @override_settings(CACHES={'default': LOCMEM, 'anilist': LOCMEM})
+    async def test_revalidator_asubmit_takes_the_shared_lock_in_a_thread(self):
+        caches['anilist'].clear()
+        revalidator = Revalidator(lock_alias='anilist')
+        loop_thread = threading.get_ident()
+        threads = []
+        submit = revalidator.submit
+
+        def record_thread(key, refresh):
+            threads.append(threading.get_ident())
+            return submit(key, refresh)
+
+        with mock.patch.object(revalidator, 'submit', side_effect=record_thread), \
+                mock.patch.object(revalidator, '_run'):
+            self.assertTrue(await revalidator.asubmit('anilist:key', lambda: None))
+
+        self.assertNotEqual(threads, [loop_thread])
+        self.assertEqual(len(threads), 1)
+
+    async def test_async_middleware_writes_metrics_in_a_thread(self):
+        loop_thread = threading.get_ident()
+        threads = []
+
+        async def get_response(request):
+            return HttpResponse('ok')
+
+        middleware = TimingMiddleware(get_response)
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('core.middleware.get_registry', return_value=Registry(directory=directory)), \
+                mock.patch.object(Registry, 'flush', autospec=True,
+                                  side_effect=lambda registry: threads.append(threading.get_ident())):
+            await middleware(RequestFactory().get('/api/anime/genres/'))
+
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], loop_thread)
+
+
+class MetricsRegistryTests(SimpleTestCase):
+
+    def worker_registry(self, directory, requests):
+        registry = Registry(directory=directory)
+        registry.counter('requests', 'Requests.', ('view',)).inc('search', amount=requests)
+        registry.histogram('latency', 'Latency.', buckets=(0.1, 1.0)).observe(0.5)
+        return registry
+
+    def test_exited_workers_are_folded_into_one_file_and_keep_counting(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for pid, requests in ((101, 3), (102, 4)):
+                registry = self.worker_registry(directory, requests)
+                with mock.patch('core.metrics.os.getpid', return_value=pid):
+                    registry.flush()
+                registry.retire(pid)
+
+            self.assertEqual(sorted(os.listdir(directory)), [Registry.EXITED])
+            with open(os.path.join(directory, Registry.EXITED)) as f:
+                self.assertEqual(json.load(f), {
+                    'requests': {'search': 7.0},
+                    'latency': {'': [[0, 2, 0], 1.0, 2]},
+                })
+            live = self.worker_registry(directory, 1)
+            exposed = live.expose()
+
+        self.assertIn('requests_total{view="search"} 8', exposed)
+        self.assertIn('latency_count 3', exposed)
+
+    def test_retiring_an_unknown_worker_is_a_no_op(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Registry(directory=directory).retire(999)
+            self.assertEqual(os.listdir(directory), [])
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    def get(self, **headers):
+        return metrics(RequestFactory().get('/metrics', **headers))
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.get().status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_open_without_a_token_under_debug(self):
+        self.assertEqual(self.get().status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=True)
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
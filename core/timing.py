@@ -0,0 +1,117 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Phases reported per request, in Server-Timing order.
+PHASES = ('anilist', 'db', 'serialize')
+
+
+class RequestTimings:
+    """
+    Time spent per phase and cache outcomes for the request being handled.
+
+    One instance per request, reachable through a ContextVar, so code anywhere below the
+    view (AniList client, DB cursor wrapper, renderer) adds to it without it being passed
+    around. Threads and tasks started from the request see it too (contextvars are
+    copied), which is why updates are single add operations.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.cache: Dict[tuple, int] = {}
+
+    def add(self, phase: str, seconds: float):
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def cache_result(self, cache: str, result: str, count: int = 1):
+        key = (cache, result)
+        self.cache[key] = self.cache.get(key, 0) + count
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds."""
+        entries: List[str] = []
+        for phase in PHASES:
+            if phase in self.durations:
+                entries.append(
+                    f'{phase};dur={self.durations[phase] * 1000:.1f};desc="{self.counts[phase]}"'
+                )
+        for (cache, result), count in sorted(self.cache.items()):
+            entries.append(f'cache-{cache}-{result};desc="{count}"')
+        entries.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+_active: ContextVar[frozenset] = ContextVar('request_timings_active', default=frozenset())
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def start() -> object:
+    """Begin timing a request; returns the token for finish()."""
+    return _current.set(RequestTimings())
+
+
+def finish(token) -> None:
+    _current.reset(token)
+
+
+def record(phase: str, seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+def record_cache(cache: str, result: str, count: int = 1):
+    timings = _current.get()
+    if timings is not None and count:
+        timings.cache_result(cache, result, count)
+
+
+@contextmanager
+def timed(phase: str):
+    """
+    Add the block's wall time to `phase` of the current request (no-op outside one).
+
+    Nested blocks of the same phase (a loader wait that ends up sending the request
+    itself) are only counted once, by the outermost block.
+    """
+    timings = _current.get()
+    active = _active.get()
+    if timings is None or phase in active:
+        yield
+        return
+    token = _active.set(active | {phase})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+        _active.reset(token)
+
+
+def db_timer(execute, sql, params, many, context):
+    """Connection execute wrapper charging every query to the 'db' phase."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - started)
+
+
+def install_db_timer(sender, connection, **kwargs):
+    """connection_created receiver: wrap each new DB connection once."""
+    if db_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_timer)
@@ -1,3 +1,24 @@
-from django.shortcuts import render
+import hmac
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from .metrics import CONTENT_TYPE, get_registry, request_metrics
+
+
+@require_GET
+def metrics(request):
+    """
+    Prometheus scrape endpoint (all gunicorn workers when METRICS_DIR is set). Requires
+    METRICS_TOKEN as a Bearer token; without a token it is only open under DEBUG.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    # Register the request metrics even before the first request so every series is listed.
+    request_metrics()
+    return HttpResponse(get_registry().expose(), content_type=CONTENT_TYPE)
@@ -0,0 +1,13 @@
+from uvicorn_worker import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    """
+    uvicorn's gunicorn worker, with gunicorn's worker_connections as the per-worker
+    concurrency limit: connections beyond it are answered 503 straight away instead of
+    piling onto the event loop, the database and the AniList governor's queue.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.limit_concurrency = self.cfg.worker_connections
@@ -1,11 +1,33 @@
 import multiprocessing
 import os
+import time
 
 # Gunicorn configuration
 bind = "0.0.0.0:8000"
 workers = multiprocessing.cpu_count() * 2 + 1
 worker_class = "gthread"
 threads = 2
+wsgi_app = "xstagelabs.wsgi:application"
+
+# GUNICORN_ASGI=true serves xstagelabs.asgi from uvicorn workers instead. Concurrency model:
+# - Each worker runs one event loop. The AniList-bound views (anime.async_views) await
+#   upstream calls on it, so a slow AniList response costs a pending coroutine rather than
+#   one of the two gthread threads; other requests keep being served meanwhile.
+# - Cache reads (recommendation rows, genre catalog, local search) use the async ORM.
+#   Django runs every ORM call and any remaining sync code (auth, upserts, recompute)
+#   on a per-request thread, each with its own database connection, so concurrent
+#   database work, and Postgres connections, still scale with in-flight requests.
+# - Upstream concurrency stays capped per worker by ANILIST_MAX_CONCURRENCY (the rest
+#   queue for up to ANILIST_QUEUE_TIMEOUT) and ANILIST_ASYNC_POOL_SIZE connections.
+# - worker_connections caps the connections a worker holds open; beyond it uvicorn
+#   answers 503 immediately.
+asgi = os.getenv('GUNICORN_ASGI', 'false').lower() == 'true'
+if asgi:
+    # Read by Django settings when the app is loaded (ASYNC_VIEWS routes the async views).
+    os.environ.setdefault('ASYNC_VIEWS', 'true')
+    wsgi_app = "xstagelabs.asgi:application"
+    worker_class = "core.workers.UvicornWorker"
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '500'))
 timeout = 120
 keepalive = 5
 max_requests = 1000
@@ -13,8 +35,97 @@ max_requests_jitter = 50
 worker_tmp_dir = "/dev/shm"  # Use RAM-based tmp directory
 forwarded_allow_ips = "*"
 
+# Import the app once in the master so recycled workers fork with Django, DRF and numpy
+# already loaded. Nothing may open a DB connection, cache client or socket at import
+# time; pre_fork closes anything that did.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Prime caches in each new worker before it accepts requests (anime.warmup).
+worker_warmup = os.getenv('GUNICORN_WORKER_WARMUP', 'true').lower() == 'true'
+
+# Log per-step warmup timings and every worker's time to first request.
+profile_startup = os.getenv('GUNICORN_PROFILE_STARTUP', 'false').lower() == 'true'
+
 # Logging
 accesslog = "-"  # Log to stdout
 errorlog = "-"   # Log to stderr
 loglevel = "info"
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"' 
\ No newline at end of file
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+
+
+def on_starting(server):
+    # Per-worker metric snapshots from a previous run would be summed into this one.
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.endswith('.json'):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def when_ready(server):
+    if preload_app:
+        # Views are imported with the URLconf; do it once here rather than in every worker.
+        from anime.warmup import warm_urls
+        warm_urls()
+        server.log.info("App preloaded in master; workers fork with modules imported")
+
+
+def pre_fork(server, worker):
+    if not preload_app:
+        return
+    # Connections opened in the master would be shared by every child.
+    from django.core.cache import caches
+    from django.db import connections
+    connections.close_all()
+    caches.close_all()
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+    worker.first_request_logged = False
+
+
+def post_worker_init(worker):
+    loaded = time.monotonic()
+    timings = {}
+    if worker_warmup:
+        from anime.warmup import warm_worker
+        timings = warm_worker()
+    worker.ready_at = time.monotonic()
+    if profile_startup:
+        steps = ', '.join(f"{step} {seconds * 1000:.1f} ms" for step, seconds in timings.items())
+        worker.log.info(
+            f"Worker {worker.pid}: app loaded {(loaded - worker.forked_at) * 1000:.1f} ms after fork, "
+            f"warmup {(worker.ready_at - loaded) * 1000:.1f} ms ({steps or 'disabled'})"
+        )
+
+
+# pre_request/post_request are only called by gunicorn's own (WSGI) workers.
+def pre_request(worker, req):
+    if profile_startup and not worker.first_request_logged:
+        req.started_at = time.monotonic()
+
+
+def post_request(worker, req, environ, resp):
+    if profile_startup and not worker.first_request_logged and hasattr(req, 'started_at'):
+        worker.first_request_logged = True
+        worker.log.info(
+            f"Worker {worker.pid}: first request {req.path} took "
+            f"{(time.monotonic() - req.started_at) * 1000:.1f} ms; "
+            f"ready {(worker.ready_at - worker.forked_at) * 1000:.1f} ms after fork"
+        )
+
+
+def worker_exit(server, worker):
+    # Keep the exiting worker's last numbers in the shared metrics directory.
+    from core.metrics import get_registry
+    get_registry().flush()
+
+
+def child_exit(server, worker):
+    # In the master, once the worker is gone: fold its file into the exited-workers total
+    # so recycled workers (max_requests) do not leave a file each behind.
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir:
+        from core.metrics import Registry
+        Registry(directory=metrics_dir).retire(worker.pid)
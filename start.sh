@@ -17,4 +17,4 @@ python manage.py collectstatic --noinput
 
 # Start Gunicorn
 echo "Starting Gunicorn..."
-exec gunicorn xstagelabs.wsgi:application -c gunicorn.conf.py 
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py  # WSGI or ASGI app chosen by GUNICORN_ASGI 
\ No newline at end of file
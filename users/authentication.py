@@ -0,0 +1,230 @@
+"""
+JWT authentication without a per-request User query.
+
+Tokens issued through ProfileRefreshToken carry a digest of the user's favorite genres
+and the user's genres version, which only moves when their favorite genres are saved
+(not on ratings, watch-list changes or rematerialization). ProfileJWTAuthentication
+turns a valid access token into a ProfileTokenUser built from those claims; the
+UserProfile row is only read when a view asks for it, and then once per request.
+
+What the token cannot say - whether the user still exists, is active and (with
+SIMPLE_JWT['CHECK_REVOKE_TOKEN']) still has the password the token was issued for - is
+kept per user in the shared cache for JWT_REVOCATION_CHECK_TTL seconds, and dropped as
+soon as the User row is saved or deleted.
+"""
+import hashlib
+import random
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import UserProfile
+
+GENRES_VERSION_CLAIM = 'genres_version'
+GENRES_DIGEST_CLAIM = 'genres_digest'
+
+
+def genres_digest(genres: Iterable[str]) -> str:
+    return hashlib.sha1(','.join(sorted(set(genres))).encode()).hexdigest()[:16]
+
+
+NO_GENRES_DIGEST = genres_digest([])
+
+
+def _shared_cache():
+    return caches[getattr(settings, 'ANILIST_CACHE_ALIAS', 'anilist')]
+
+
+def genres_version_key(user_id: int) -> str:
+    return f'genres-version:{user_id}'
+
+
+def _new_version() -> int:
+    # Random rather than 0, so a key that was evicted and recreated never matches a
+    # version some older token carries.
+    return random.getrandbits(62)
+
+
+def genres_version(user_id: int) -> Optional[int]:
+    return _shared_cache().get(genres_version_key(user_id))
+
+
+async def agenres_version(user_id: int) -> Optional[int]:
+    return await _shared_cache().aget(genres_version_key(user_id))
+
+
+def bump_genres_version(user_id: int):
+    key = genres_version_key(user_id)
+    try:
+        _shared_cache().incr(key)
+    except ValueError:
+        _shared_cache().set(key, _new_version(), None)
+
+
+def add_profile_claims(token, user_id: int):
+    # Version first: a profile save after this read bumps it, so the claims read as stale.
+    key = genres_version_key(user_id)
+    _shared_cache().add(key, _new_version(), None)
+    token[GENRES_VERSION_CLAIM] = _shared_cache().get(key)
+    genres = UserProfile.objects.filter(user_id=user_id).values_list('favorite_genres', flat=True).first()
+    token[GENRES_DIGEST_CLAIM] = genres_digest(genres or [])
+    return token
+
+
+class ProfileRefreshToken(RefreshToken):
+    """RefreshToken whose access tokens carry the profile claims."""
+
+    @classmethod
+    def for_user(cls, user):
+        return add_profile_claims(super().for_user(user), user.pk)
+
+
+class ProfileTokenUser(TokenUser):
+    """
+    request.user under ProfileJWTAuthentication. userprofile stands in for the User
+    reverse accessor: loaded on first use, then kept for the rest of the request.
+    """
+
+    @cached_property
+    def id(self) -> int:
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def userprofile(self) -> UserProfile:
+        return UserProfile.objects.get(user_id=self.id)
+
+    async def aget_userprofile(self) -> UserProfile:
+        if 'userprofile' not in self.__dict__:
+            self.__dict__['userprofile'] = await UserProfile.objects.aget(user_id=self.id)
+        return self.userprofile
+
+    def _current_digest(self, version: Optional[int]) -> Optional[str]:
+        if version is None or self.token.get(GENRES_VERSION_CLAIM) != version:
+            return None
+        return self.token.get(GENRES_DIGEST_CLAIM)
+
+    def genres_digest(self) -> Optional[str]:
+        """The token's genres digest, or None if the profile was saved since it was issued."""
+        return self._current_digest(genres_version(self.id))
+
+    async def agenres_digest(self) -> Optional[str]:
+        return self._current_digest(await agenres_version(self.id))
+
+
+def claimed_genres_digest(user) -> Optional[str]:
+    return user.genres_digest() if isinstance(user, ProfileTokenUser) else None
+
+
+async def aclaimed_genres_digest(user) -> Optional[str]:
+    return await user.agenres_digest() if isinstance(user, ProfileTokenUser) else None
+
+
+async def aget_profile(user) -> UserProfile:
+    if isinstance(user, ProfileTokenUser):
+        return await user.aget_userprofile()
+    return await UserProfile.objects.aget(user_id=user.id)
+
+
+class RevocationCheck:
+    """
+    Per-user token state in the shared cache: whether the user exists, is active, and
+    the digest of their password hash that CHECK_REVOKE_TOKEN compares against.
+
+    A change that bypasses the User signals (queryset.update(), raw SQL) is picked up
+    within ttl seconds.
+    """
+
+    def __init__(self, alias: str = 'anilist', ttl: int = 60):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f'auth-state:{user_id}'
+
+    def state(self, user_id: int) -> Dict:
+        key = self.key(user_id)
+        state = self.shared.get(key) if self.ttl > 0 else None
+        if state is None:
+            row = User.objects.filter(pk=user_id).values('is_active', 'password').first()
+            state = {
+                'found': row is not None,
+                'active': row is not None and row['is_active'],
+                'password': get_md5_hash_password(row['password']) if row is not None else None,
+            }
+            if self.ttl > 0:
+                self.shared.set(key, state, self.ttl)
+        return state
+
+    def forget(self, user_id: int):
+        self.shared.delete(self.key(user_id))
+
+
+_revocation_check = None
+
+
+def get_revocation_check() -> RevocationCheck:
+    global _revocation_check
+    if _revocation_check is None:
+        _revocation_check = RevocationCheck(
+            alias=getattr(settings, 'ANILIST_CACHE_ALIAS', 'anilist'),
+            ttl=getattr(settings, 'JWT_REVOCATION_CHECK_TTL', 60),
+        )
+    return _revocation_check
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Again on commit: a request in between may have cached the old row.
+    check = get_revocation_check()
+    check.forget(instance.pk)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: check.forget(instance.pk))
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'favorite_genres' not in update_fields:
+        return
+    # Again on commit, like user_changed.
+    bump_genres_version(instance.user_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_genres_version(instance.user_id))
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with request.user built from the token instead of loaded from the DB."""
+
+    def get_user(self, validated_token):
+        try:
+            user = ProfileTokenUser(validated_token)
+            user_id = user.id
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        state = get_revocation_check().state(user_id)
+        if not state['found']:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not state['active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state['password']:
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
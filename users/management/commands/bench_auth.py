@@ -0,0 +1,120 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from anime.models import CachedAnime, UserRecommendationCache
+from anime.query import RECOMMENDATION_ORDERING
+from anime.recommendations import build_snapshots, recommendation_fingerprint
+from anime.response_cache import get_recommendation_response_cache
+from anime.views import AnimeRecommendationsView, AnimeSearchView
+from users.authentication import ProfileJWTAuthentication, ProfileRefreshToken, get_revocation_check
+from users.models import UserProfile
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Queries and latency per request with the DB-backed JWTAuthentication vs the claims-based '
+        'ProfileJWTAuthentication, on search and recommendations, and a revocation check (rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _measure(self, label, run, repeat):
+        run()  # warm up
+        with CaptureQueriesContext(connection) as queries:
+            response = run()
+        if response.status_code != 200:
+            raise CommandError(f'{label}: HTTP {response.status_code}')
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(f'{label:<52} {len(queries):>2} queries  p50 {statistics.median(timings):7.3f} ms')
+
+    def _run(self, options):
+        ranked_ids = list(
+            CachedAnime.objects.order_by(*RECOMMENDATION_ORDERING).values_list('anime_id', flat=True)[:50]
+        )
+        if len(ranked_ids) < 10:
+            raise CommandError('Need at least 10 CachedAnime rows; run sync_catalog first')
+
+        user = User.objects.create_user(username='bench-auth', password=None)
+        UserProfile.objects.create(user=user, favorite_genres=['Action'])
+        UserRecommendationCache.objects.create(
+            user=user,
+            favorite_genres=['Action'],
+            ranked_anime_ids=ranked_ids,
+            ranked_scores=[1.0 - i / len(ranked_ids) for i in range(len(ranked_ids))],
+            fingerprint=recommendation_fingerprint(['Action'], []),
+            snapshot=build_snapshots({user.id: ranked_ids})[user.id],
+        )
+        token = str(ProfileRefreshToken.for_user(user).access_token)
+        factory = APIRequestFactory()
+
+        def client(view_class, path, authentication):
+            view = view_class.as_view(authentication_classes=[authentication])
+
+            def get():
+                request = factory.get(path, HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+                response = view(request)
+                response.render()
+                return response
+            return get
+
+        response_cache = get_recommendation_response_cache()
+        ttl = response_cache.ttl
+        for authentication in (JWTAuthentication, ProfileJWTAuthentication):
+            name = authentication.__name__
+            self._measure(f'{name}: search (local)', client(AnimeSearchView, '/api/anime/search/', authentication),
+                          options['repeat'])
+            recommendations = client(AnimeRecommendationsView, '/api/anime/recommendations/', authentication)
+            self._measure(f'{name}: recommendations (response cache hit)', recommendations, options['repeat'])
+            response_cache.ttl = 0
+            try:
+                self._measure(f'{name}: recommendations (snapshot)', recommendations, options['repeat'])
+            finally:
+                response_cache.ttl = ttl
+
+        self._check_revocation(user, client(AnimeSearchView, '/api/anime/search/', ProfileJWTAuthentication))
+
+    def _check_revocation(self, user, get):
+        failures = []
+        get()
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        if get().status_code != 401:
+            failures.append('deactivated user still authenticated')
+        user.is_active = True
+        user.save(update_fields=['is_active'])
+        if get().status_code != 200:
+            failures.append('reactivated user rejected')
+
+        # Writes that bypass the User signals are only seen once the cached state expires.
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        get_revocation_check().forget(user.pk)
+        if get().status_code != 401:
+            failures.append('deactivated user authenticated after the state expired')
+
+        if failures:
+            raise CommandError('Token revocation failed: ' + '; '.join(failures))
+        self.stdout.write('Token revocation: 3 checks passed')
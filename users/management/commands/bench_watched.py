@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from anime.models import CachedAnime
+from anime.query import RECOMMENDATION_ORDERING, unwatched_by
+from users.models import UserProfile, WatchedAnime
+from users.serializers import UserProfileSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark watch-list updates and watched-anime exclusion for a heavy user (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watched', type=int, default=5000, help='Watched entries for the test user')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--genre', action='append', dest='genres')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _time(self, label, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(f'{label:<48} p50 {statistics.median(timings):8.2f} ms  max {max(timings):8.2f} ms')
+
+    def _run(self, options):
+        watched, repeat = options['watched'], options['repeat']
+        genres = options['genres'] or ['Action', 'Comedy']
+
+        user = User.objects.create_user(username='bench-watched-user', password=None)
+        profile = UserProfile.objects.create(user=user, favorite_genres=genres)
+        known = list(CachedAnime.objects.values_list('anime_id', flat=True)[:watched])
+        ids = known + list(range(10_000_000, 10_000_000 + watched - len(known)))
+        profile.add_watched(ids)
+        self.stdout.write(f'{WatchedAnime.objects.filter(user=user).count()} watched entries')
+
+        extra = iter(range(20_000_000, 30_000_000))
+        self._time(
+            'append 1 via POST /user/watched/ (delta)',
+            lambda: profile.add_watched([next(extra)]), repeat,
+        )
+
+        def put_full_list():
+            current = profile.watched_anime_ids
+            serializer = UserProfileSerializer(
+                profile, data={'watched_anime': current + [next(extra)]}, partial=True
+            )
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+        self._time('append 1 via PUT /user/preferences/ (full list)', put_full_list, repeat)
+
+        base = CachedAnime.objects.filter(genres__overlap=genres)
+        watched_ids = profile.watched_anime_ids
+        self._time(
+            'recommendations, NOT IN literal list',
+            lambda: list(base.exclude(anime_id__in=watched_ids).order_by(*RECOMMENDATION_ORDERING)[:10]),
+            repeat,
+        )
+        self._time(
+            'recommendations, NOT EXISTS anti-join',
+            lambda: list(base.filter(unwatched_by(user.id)).order_by(*RECOMMENDATION_ORDERING)[:10]),
+            repeat,
+        )
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def copy_watched_anime(apps, schema_editor):
+    UserProfile = apps.get_model('users', 'UserProfile')
+    WatchedAnime = apps.get_model('users', 'WatchedAnime')
+    batch = []
+    for user_id, watched_anime in UserProfile.objects.values_list('user_id', 'watched_anime').iterator():
+        batch.extend(
+            WatchedAnime(user_id=user_id, anime_id=anime_id)
+            for anime_id in dict.fromkeys(watched_anime or [])
+        )
+        if len(batch) >= 5000:
+            WatchedAnime.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    WatchedAnime.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def restore_watched_anime(apps, schema_editor):
+    UserProfile = apps.get_model('users', 'UserProfile')
+    WatchedAnime = apps.get_model('users', 'WatchedAnime')
+    watched = {}
+    for user_id, anime_id in WatchedAnime.objects.order_by('watched_at', 'id').values_list('user_id', 'anime_id'):
+        watched.setdefault(user_id, []).append(anime_id)
+    for profile in UserProfile.objects.all().iterator():
+        profile.watched_anime = watched.get(profile.user_id, [])
+        profile.save(update_fields=['watched_anime'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_watchedanime'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_watched_anime, restore_watched_anime),
+    ]
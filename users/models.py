@@ -1,19 +1,69 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
+
+from .signals import watched_anime_changed
 
 # Create your models here.
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     favorite_genres = ArrayField(models.CharField(max_length=50), blank=True, default=list)
-    watched_anime = ArrayField(models.IntegerField(), blank=True, default=list)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+    @property
+    def watched_anime_ids(self):
+        """Watched anime ids, oldest first (compatibility view of the old watched_anime array)."""
+        return list(
+            WatchedAnime.objects.filter(user_id=self.user_id)
+            .order_by('watched_at', 'id')
+            .values_list('anime_id', flat=True)
+        )
+
+    def add_watched(self, anime_ids):
+        """Mark anime as watched; ids already on the list are left untouched."""
+        WatchedAnime.objects.bulk_create(
+            [WatchedAnime(user_id=self.user_id, anime_id=anime_id) for anime_id in dict.fromkeys(anime_ids)],
+            ignore_conflicts=True,
+        )
+        watched_anime_changed.send(sender=UserProfile, user_id=self.user_id)
+
+    def remove_watched(self, anime_ids):
+        deleted, _ = WatchedAnime.objects.filter(user_id=self.user_id, anime_id__in=list(anime_ids)).delete()
+        if deleted:
+            watched_anime_changed.send(sender=UserProfile, user_id=self.user_id)
+        return deleted
+
+    def set_watched(self, anime_ids):
+        """Replace the watch list, writing only the rows that differ."""
+        current = set(
+            WatchedAnime.objects.filter(user_id=self.user_id).values_list('anime_id', flat=True)
+        )
+        wanted = list(dict.fromkeys(anime_ids))
+        removed = current.difference(wanted)
+        if removed:
+            self.remove_watched(removed)
+        added = [anime_id for anime_id in wanted if anime_id not in current]
+        if added:
+            self.add_watched(added)
+
+class WatchedAnime(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watched_anime')
+    anime_id = models.IntegerField()
+    watched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Also serves as the (user_id, anime_id) index used by the recommendation anti-joins.
+        unique_together = ('user', 'anime_id')
+
+    def __str__(self):
+        return f"{self.user.username} watched anime {self.anime_id}"
+
 class AnimePreference(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     anime_id = models.IntegerField()
@@ -1,7 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import add_profile_claims
 from .models import UserProfile, AnimePreference
 from .validators import validate_password_strength
+from anime.genres import get_genre_catalog, get_genre_store
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
@@ -25,12 +30,55 @@ class UserSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
+    # Watched anime live in WatchedAnime rows; this keeps the old array-shaped contract.
+    watched_anime = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        source='watched_anime_ids',
+        required=False
+    )
 
     class Meta:
         model = UserProfile
         fields = ('id', 'username', 'email', 'favorite_genres', 'watched_anime')
 
+    def validate_favorite_genres(self, value):
+        catalog = get_genre_catalog()
+        # An empty catalog means genres were never seeded; don't reject everything.
+        if len(catalog):
+            unknown = [genre for genre in value if genre not in catalog.names]
+            if unknown:
+                # Another worker may have refreshed the genres since this one last checked.
+                catalog = get_genre_store().reload()
+                unknown = [genre for genre in unknown if genre not in catalog.names]
+            if unknown:
+                raise serializers.ValidationError(f"Unknown genres: {', '.join(unknown)}")
+        return value
+
+    def update(self, instance, validated_data):
+        watched_anime = validated_data.pop('watched_anime_ids', None)
+        instance = super().update(instance, validated_data)
+        if watched_anime is not None:
+            instance.set_watched(watched_anime)
+        return instance
+
+
+class WatchedAnimeDeltaSerializer(serializers.Serializer):
+    anime_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000
+    )
+
 class AnimePreferenceSerializer(serializers.ModelSerializer):
     class Meta:
         model = AnimePreference
-        fields = ('id', 'anime_id', 'rating', 'created_at') 
\ No newline at end of file
+        fields = ('id', 'anime_id', 'rating', 'created_at') 
+
+class ProfileTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refreshed access tokens carry the profile claims as of the refresh, not the login."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        data['access'] = str(add_profile_claims(access, int(access[api_settings.USER_ID_CLAIM])))
+        return data
@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent with sender=UserProfile and user_id after the watch list changed through
+# UserProfile.add_watched / remove_watched, which write in bulk and so fire no post_save.
+watched_anime_changed = Signal()
+
+# Sent with sender=AnimePreference and user_id after ratings were written in bulk
+# (AnimePreferenceViewSet.bulk_create), which fires no post_save either.
+preferences_changed = Signal()
@@ -1,3 +1,152 @@
-from django.test import TestCase
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from anime.genres import GenreCatalog
+from anime.models import Genre
+from anime.response_cache import bump_profile_version
+
+from .authentication import ProfileTokenUser, add_profile_claims, genres_digest, profile_saved
+from .models import UserProfile
+from .serializers import UserProfileSerializer, WatchedAnimeDeltaSerializer
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'users-tests'}
+
+
+@override_settings(CACHES={'default': LOCMEM, 'anilist': LOCMEM})
+class ProfileClaimsTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['anilist'].clear()
+
+    def token_user(self, genres):
+        profiles = mock.MagicMock()
+        profiles.values_list.return_value.first.return_value = genres
+        with mock.patch('users.authentication.UserProfile.objects.filter', return_value=profiles):
+            token = add_profile_claims(AccessToken(), 7)
+        token['user_id'] = '7'
+        return ProfileTokenUser(token)
+
+    def test_claims_survive_rating_watch_list_and_rematerialization_bumps(self):
+        user = self.token_user(['Action', 'Drama'])
+
+        bump_profile_version(7)
+
+        self.assertEqual(user.genres_digest(), genres_digest(['Drama', 'Action']))
+
+    def test_saving_favorite_genres_makes_claims_stale(self):
+        user = self.token_user(['Action'])
+
+        profile_saved(sender=None, instance=SimpleNamespace(user_id=7))
+
+        self.assertIsNone(user.genres_digest())
+
+    def test_saving_other_fields_keeps_claims(self):
+        user = self.token_user(['Action'])
+
+        profile_saved(sender=None, instance=SimpleNamespace(user_id=7), update_fields={'updated_at'})
+
+        self.assertEqual(user.genres_digest(), genres_digest(['Action']))
+
+    def test_evicted_version_is_never_current(self):
+        user = self.token_user(['Action'])
+
+        caches['anilist'].clear()
+        self.assertIsNone(user.genres_digest())
+        self.token_user(['Comedy'])
+        self.assertIsNone(user.genres_digest())
+
+
+def genre_catalog(*names, version='v1'):
+    updated_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return GenreCatalog([Genre(id=i, name=name, updated_at=updated_at) for i, name in enumerate(names, 1)], version)
+
+
+@mock.patch('users.serializers.get_genre_store')
+@mock.patch('users.serializers.get_genre_catalog')
+class FavoriteGenresValidationTests(SimpleTestCase):
+
+    def test_known_genres_do_not_reload_the_catalog(self, get_catalog, get_store):
+        get_catalog.return_value = genre_catalog('Action', 'Drama')
+
+        self.assertEqual(UserProfileSerializer().validate_favorite_genres(['Drama']), ['Drama'])
+        get_store.return_value.reload.assert_not_called()
+
+    def test_genre_refreshed_by_another_worker_is_accepted_after_a_reload(self, get_catalog, get_store):
+        get_catalog.return_value = genre_catalog('Action')
+        get_store.return_value.reload.return_value = genre_catalog('Action', 'Mecha', version='v2')
+
+        self.assertEqual(UserProfileSerializer().validate_favorite_genres(['Action', 'Mecha']), ['Action', 'Mecha'])
+        get_store.return_value.reload.assert_called_once_with()
+
+    def test_unknown_genres_are_rejected_after_the_reload(self, get_catalog, get_store):
+        get_catalog.return_value = genre_catalog('Action')
+        get_store.return_value.reload.return_value = genre_catalog('Action', 'Mecha', version='v2')
+
+        with self.assertRaisesMessage(ValidationError, 'Unknown genres: Isekai'):
+            UserProfileSerializer().validate_favorite_genres(['Mecha', 'Isekai'])
+
+    def test_empty_catalog_accepts_any_genre(self, get_catalog, get_store):
+        get_catalog.return_value = genre_catalog()
+
+        self.assertEqual(UserProfileSerializer().validate_favorite_genres(['Isekai']), ['Isekai'])
+        get_store.return_value.reload.assert_not_called()
+
+
+@mock.patch('users.models.watched_anime_changed')
+@mock.patch('users.models.WatchedAnime.objects')
+class WatchedAnimeDeltaTests(SimpleTestCase):
+
+    def profile(self, objects, *watched):
+        objects.filter.return_value.values_list.return_value = list(watched)
+        objects.filter.return_value.delete.return_value = (1, {})
+        return UserProfile(user_id=7)
+
+    def test_set_watched_writes_only_the_difference(self, objects, changed):
+        self.profile(objects, 1, 2, 3).set_watched([1, 2, 4, 4])
+
+        objects.filter.assert_called_with(user_id=7, anime_id__in=[3])
+        added = objects.bulk_create.call_args.args[0]
+        self.assertEqual([(row.user_id, row.anime_id) for row in added], [(7, 4)])
+        self.assertEqual(changed.send.call_count, 2)
+
+    def test_unchanged_list_writes_nothing(self, objects, changed):
+        self.profile(objects, 1, 2).set_watched([2, 1])
+
+        objects.bulk_create.assert_not_called()
+        objects.filter.return_value.delete.assert_not_called()
+        changed.send.assert_not_called()
+
+    def test_add_watched_skips_duplicates_and_existing_rows(self, objects, changed):
+        self.profile(objects).add_watched([5, 5, 6])
+
+        added, = objects.bulk_create.call_args.args
+        self.assertEqual([row.anime_id for row in added], [5, 6])
+        self.assertTrue(objects.bulk_create.call_args.kwargs['ignore_conflicts'])
+        changed.send.assert_called_once_with(sender=UserProfile, user_id=7)
+
+    def test_removing_nothing_does_not_invalidate_recommendations(self, objects, changed):
+        profile = self.profile(objects)
+        objects.filter.return_value.delete.return_value = (0, {})
+
+        self.assertEqual(profile.remove_watched([9]), 0)
+        changed.send.assert_not_called()
+
+    def test_profile_serializer_keeps_the_list_contract(self, objects, changed):
+        profile = self.profile(objects, 1)
+        serializer = UserProfileSerializer(profile, data={'watched_anime': [1, 2]}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        with mock.patch.object(UserProfile, 'save'), mock.patch.object(UserProfile, 'set_watched') as set_watched:
+            serializer.save()
+
+        set_watched.assert_called_once_with([1, 2])
+
+    def test_delta_requires_at_least_one_id(self, objects, changed):
+        self.assertFalse(WatchedAnimeDeltaSerializer(data={'anime_ids': []}).is_valid())
+        self.assertTrue(WatchedAnimeDeltaSerializer(data={'anime_ids': [1]}).is_valid())
@@ -2,11 +2,13 @@ from django.urls import path
 from .views import (
     UserRegistrationView,
     UserLoginView,
-    UserPreferencesView
+    UserPreferencesView,
+    WatchedAnimeView
 )
 
 urlpatterns = [
     path('auth/register/', UserRegistrationView.as_view(), name='user-registration'),
     path('auth/login/', UserLoginView.as_view(), name='user-login'),
     path('user/preferences/', UserPreferencesView.as_view(), name='user-preferences'),
+    path('user/watched/', WatchedAnimeView.as_view(), name='user-watched'),
 ] 
\ No newline at end of file
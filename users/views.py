@@ -3,10 +3,11 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth.models import User
-from .models import UserProfile, AnimePreference
-from .serializers import UserSerializer, UserProfileSerializer, AnimePreferenceSerializer
+from .models import UserProfile, AnimePreference, WatchedAnime
+from .serializers import UserSerializer, UserProfileSerializer, AnimePreferenceSerializer, WatchedAnimeDeltaSerializer
+from .signals import preferences_changed
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import ProfileRefreshToken
 from django.contrib.auth import authenticate
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -25,13 +26,13 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def me(self, request):
-        user_profile = UserProfile.objects.get(user=request.user)
+        user_profile = request.user.userprofile
         serializer = UserProfileSerializer(user_profile)
         return Response(serializer.data)
 
     @action(detail=False, methods=['put'])
     def update_preferences(self, request):
-        user_profile = UserProfile.objects.get(user=request.user)
+        user_profile = request.user.userprofile
         serializer = UserProfileSerializer(user_profile, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
@@ -43,23 +44,23 @@ class AnimePreferenceViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return AnimePreference.objects.filter(user=self.request.user)
+        return AnimePreference.objects.filter(user_id=self.request.user.id)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
 
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
         preferences = []
         for pref_data in request.data:
-            pref_data['user'] = request.user.id
             serializer = self.get_serializer(data=pref_data)
             if serializer.is_valid():
-                preferences.append(AnimePreference(**serializer.validated_data))
+                preferences.append(AnimePreference(user_id=request.user.id, **serializer.validated_data))
             else:
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         AnimePreference.objects.bulk_create(preferences)
+        preferences_changed.send(sender=AnimePreference, user_id=request.user.id)
         return Response({'status': 'preferences created'}, status=status.HTTP_201_CREATED)
 
 class UserRegistrationView(APIView):
@@ -74,7 +75,7 @@ class UserRegistrationView(APIView):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = ProfileRefreshToken.for_user(user)
             return Response({
                 'user': serializer.data,
                 'refresh': str(refresh),
@@ -103,7 +104,7 @@ class UserLoginView(APIView):
         user = authenticate(username=username, password=password)
         
         if user:
-            refresh = RefreshToken.for_user(user)
+            refresh = ProfileRefreshToken.for_user(user)
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
@@ -118,7 +119,7 @@ class UserPreferencesView(APIView):
         responses={200: UserProfileSerializer()}
     )
     def get(self, request):
-        profile = UserProfile.objects.get(user=request.user)
+        profile = request.user.userprofile
         serializer = UserProfileSerializer(profile)
         return Response(serializer.data)
 
@@ -128,9 +129,41 @@ class UserPreferencesView(APIView):
         responses={200: UserProfileSerializer()}
     )
     def put(self, request):
-        profile = UserProfile.objects.get(user=request.user)
+        profile = request.user.userprofile
         serializer = UserProfileSerializer(profile, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class WatchedAnimeView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @swagger_auto_schema(
+        request_body=WatchedAnimeDeltaSerializer,
+        operation_description="Add anime to the watched list without resending the whole list",
+        responses={200: 'Watched count'}
+    )
+    def post(self, request):
+        serializer = WatchedAnimeDeltaSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        profile = request.user.userprofile
+        profile.add_watched(serializer.validated_data['anime_ids'])
+        return Response({'watched_count': WatchedAnime.objects.filter(user_id=request.user.id).count()})
+
+    @swagger_auto_schema(
+        request_body=WatchedAnimeDeltaSerializer,
+        operation_description="Remove anime from the watched list",
+        responses={200: 'Watched count'}
+    )
+    def delete(self, request):
+        serializer = WatchedAnimeDeltaSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        profile = request.user.userprofile
+        removed = profile.remove_watched(serializer.validated_data['anime_ids'])
+        return Response({
+            'removed': removed,
+            'watched_count': WatchedAnime.objects.filter(user_id=request.user.id).count()
+        })
@@ -13,4 +13,32 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'xstagelabs.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402 (after Django is set up)
+
+
+def static_application():
+    """
+    Collected static files served by WhiteNoise, for when its sync-only middleware is
+    left out of the ASGI stack (ASYNC_VIEWS). Only static requests run in a thread.
+    """
+    from asgiref.wsgi import WsgiToAsgi
+    from whitenoise import WhiteNoise
+
+    def not_found(environ, start_response):
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'Not Found']
+
+    return WsgiToAsgi(WhiteNoise(not_found, root=settings.STATIC_ROOT, prefix=settings.STATIC_URL))
+
+
+if 'whitenoise.middleware.WhiteNoiseMiddleware' in settings.MIDDLEWARE:
+    application = django_application
+else:
+    static = static_application()
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(settings.STATIC_URL):
+            return await static(scope, receive, send)
+        return await django_application(scope, receive, send)
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -57,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -68,6 +70,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Async versions of the AniList-bound views (anime.async_views). gunicorn.conf.py turns this
+# on for GUNICORN_ASGI deployments; under WSGI each async request would get its own event loop.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() == 'true'
+if ASYNC_VIEWS:
+    # WhiteNoiseMiddleware is sync-only: under ASGI it would hold a thread for every
+    # request. xstagelabs.asgi serves static files in front of Django instead.
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'xstagelabs.urls'
 
 TEMPLATES = [
@@ -154,25 +164,151 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Builds request.user from the token's claims; no User query per request.
+        'users.authentication.ProfileJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=int(os.getenv('JWT_ACCESS_TOKEN_LIFETIME', '1'))),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_LIFETIME', '7'))),
+    # Refreshed access tokens get current profile claims (users.authentication).
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.ProfileTokenRefreshSerializer',
 }
 
+# How long a user's token state (exists, active, password digest) is trusted from the shared
+# cache before ProfileJWTAuthentication re-reads the User row. Saving or deleting the User
+# drops it immediately; 0 reads the row on every request.
+JWT_REVOCATION_CHECK_TTL = int(os.getenv('JWT_REVOCATION_CHECK_TTL', '60'))
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development
 
+# Caches
+# The 'anilist' alias is shared by all gunicorn workers; point it at a file, database or
+# memcached/redis backend in production. Local memory is only per-process. On file and
+# database backends the rate budget and refresh locks serialize through an fcntl lock
+# file (core.cachelock), which only covers workers on one host; use redis or memcached
+# when workers span hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'anilist': {
+        'BACKEND': os.getenv('ANILIST_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('ANILIST_CACHE_LOCATION', '/tmp/anilist_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 # AniList API Configuration
 ANILIST_API_URL = os.getenv('ANILIST_API_URL')
 
+# AniList response cache: in-process LRU size and per-query-kind TTLs (seconds)
+ANILIST_CACHE_ALIAS = 'anilist'
+ANILIST_LOCAL_CACHE_SIZE = int(os.getenv('ANILIST_LOCAL_CACHE_SIZE', '512'))
+ANILIST_CACHE_TTLS = {
+    'genres': 3 * 24 * 60 * 60,
+    'details': 6 * 60 * 60,
+    'recommendations': 30 * 60,
+    'search': 10 * 60,
+    'default': 10 * 60,
+}
+
+# Stale-while-revalidate: how long past its TTL a cached AniList response may still be
+# served while a background refresh runs. Past this window requests block on AniList.
+ANILIST_CACHE_STALE_TTLS = {
+    'genres': 7 * 24 * 60 * 60,
+    'details': 24 * 60 * 60,
+    'recommendations': 6 * 60 * 60,
+    'search': 60 * 60,
+    'default': 60 * 60,
+}
+SWR_MAX_WORKERS = int(os.getenv('SWR_MAX_WORKERS', '4'))
+
+# AniList rate governor, shared by all workers through the 'anilist' cache. Calls queue for
+# up to ANILIST_QUEUE_TIMEOUT seconds for a slot; 429/5xx are retried with jittered backoff.
+ANILIST_RATE_LIMIT = int(os.getenv('ANILIST_RATE_LIMIT', '90'))  # requests per minute
+ANILIST_MAX_CONCURRENCY = int(os.getenv('ANILIST_MAX_CONCURRENCY', '8'))  # per worker
+ANILIST_QUEUE_TIMEOUT = float(os.getenv('ANILIST_QUEUE_TIMEOUT', '5'))
+ANILIST_MAX_RETRIES = int(os.getenv('ANILIST_MAX_RETRIES', '3'))
+# Pooled upstream connections per worker for the async client (ASYNC_VIEWS).
+ANILIST_ASYNC_POOL_SIZE = int(os.getenv('ANILIST_ASYNC_POOL_SIZE', '20'))
+# Seconds AniListAPI.get_anime_details waits to merge concurrent lookups into one id_in query.
+ANILIST_BATCH_WINDOW = float(os.getenv('ANILIST_BATCH_WINDOW', '0.005'))
+
+# Recommendations older than AnimeRecommendationsView.CACHE_DURATION are served stale and
+# refreshed in the background until they reach this age.
+RECOMMENDATIONS_HARD_EXPIRY = timedelta(hours=int(os.getenv('RECOMMENDATIONS_HARD_EXPIRY_HOURS', '168')))
+
+# Length of the ranking materialized per user; longer than the 10 served so that anime
+# watched since the last materialization can be dropped at read time.
+RECOMMENDATIONS_MATERIALIZED_SIZE = int(os.getenv('RECOMMENDATIONS_MATERIALIZED_SIZE', '50'))
+# Leading recommendations stored pre-serialized, so a clean hit needs no anime query.
+RECOMMENDATIONS_SNAPSHOT_SIZE = 10
+# Share of item-item collaborative filtering (AnimeNeighbors, manage.py build_item_neighbors)
+# in the ranking of users who rated anime; the rest is the genre ranking. 0 disables it.
+RECOMMENDATIONS_CF_WEIGHT = float(os.getenv('RECOMMENDATIONS_CF_WEIGHT', '0.5'))
+
+# Rendered CachedAnimeSerializer JSON kept per worker (anime.fragments), keyed by
+# anime_id + updated_at.
+ANIME_FRAGMENT_CACHE_SIZE = int(os.getenv('ANIME_FRAGMENT_CACHE_SIZE', '10000'))
+
+# Descriptions on list endpoints (search, recommendations) are cut to this many
+# characters; only anime detail responses carry the full text.
+ANIME_DESCRIPTION_TRUNCATE = int(os.getenv('ANIME_DESCRIPTION_TRUNCATE', '300'))
+
+# /api/anime/batch/: most distinct ids per request. Row freshness (re-fetch from AniList
+# after this age, by status) can be overridden with ANIME_DETAIL_MAX_AGES, see anime.details.
+ANIME_BATCH_MAX_IDS = int(os.getenv('ANIME_BATCH_MAX_IDS', '100'))
+
+# Genre catalog: each worker keeps the Genre table in memory and compares its version with
+# the shared 'anilist' cache at most this often (seconds), reloading after a refresh.
+GENRE_CATALOG_CHECK_INTERVAL = float(os.getenv('GENRE_CATALOG_CHECK_INTERVAL', '5'))
+
+# Rendered /anime/recommendations/ responses per user (anime.response_cache), in the shared
+# 'anilist' cache and dropped whenever the user's profile version is bumped. 0 disables.
+RECOMMENDATION_RESPONSE_CACHE_TTL = int(os.getenv('RECOMMENDATION_RESPONSE_CACHE_TTL', '600'))
+
+# Worker warmup (gunicorn post_worker_init, anime.warmup): how many recently materialized
+# recommendation lists to scan for the anime whose fragments are pre-rendered.
+WARMUP_HOT_RECOMMENDATIONS = int(os.getenv('WARMUP_HOT_RECOMMENDATIONS', '200'))
+
+# Request instrumentation (core.middleware.TimingMiddleware): Server-Timing header on every
+# response, Prometheus histograms at /metrics. Set METRICS_DIR to a directory shared by the
+# gunicorn workers (cleared at server start) so a scrape sums all of them. /metrics requires
+# METRICS_TOKEN as a Bearer token; with no token set it is only served when DEBUG is on.
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'true').lower() == 'true'
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# AniList payloads are logged at DEBUG for this fraction of calls, capped at this many chars.
+PAYLOAD_LOG_SAMPLE_RATE = float(os.getenv('PAYLOAD_LOG_SAMPLE_RATE', '0.01'))
+PAYLOAD_LOG_MAX_CHARS = int(os.getenv('PAYLOAD_LOG_MAX_CHARS', '2000'))
+
+# Local genre recommender: minimum CachedAnime rows before it replaces AniList's ranking,
+# and how often (seconds) each worker pulls rows upserted by other workers.
+RECOMMENDER_MIN_CATALOG = int(os.getenv('RECOMMENDER_MIN_CATALOG', '500'))
+RECOMMENDER_SYNC_INTERVAL = float(os.getenv('RECOMMENDER_SYNC_INTERVAL', '5'))
+
+# Local search: answer /api/anime/search/ from CachedAnime when at least
+# LOCAL_SEARCH_MIN_RESULTS titles match (description-only matches don't count) and
+# the page is within the (capped) local count.
+LOCAL_SEARCH_ENABLED = os.getenv('LOCAL_SEARCH_ENABLED', 'True') == 'True'
+LOCAL_SEARCH_MIN_RESULTS = int(os.getenv('LOCAL_SEARCH_MIN_RESULTS', '10'))
+LOCAL_SEARCH_COUNT_CAP = 1000
+
 # Swagger settings
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
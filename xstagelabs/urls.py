@@ -20,22 +20,29 @@ from django.views.generic import TemplateView
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from rest_framework_simplejwt.views import TokenRefreshView
+from core.schema import LazySchemaView
+from core.views import metrics
 from users.views import UserRegistrationView, UserLoginView, UserPreferencesView
-from anime.views import AnimeSearchView, AnimeRecommendationsView
+from anime.urls import AnimeGenresView, AnimeSearchView, AnimeRecommendationsView  # sync or async (ASYNC_VIEWS)
 
-# Schema view for Swagger documentation
-schema_view = get_schema_view(
-    openapi.Info(
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
         title="Anime Recommendation System API",
         default_version='v1',
         description="A REST API service for an Anime Recommendation System using AniList GraphQL API",
         terms_of_service="https://www.google.com/policies/terms/",
         contact=openapi.Contact(email="contact@example.com"),
         license=openapi.License(name="BSD License"),
-    ),
+    )
+
+
+# Schema view for Swagger documentation (drf_yasg is imported on the first docs request)
+schema_view = LazySchemaView(
+    api_info,
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
@@ -56,6 +63,10 @@ urlpatterns = [
     # Anime endpoints
     path('anime/search/', AnimeSearchView.as_view(), name='anime-search'),
     path('anime/recommendations/', AnimeRecommendationsView.as_view(), name='anime-recommendations'),
+    path('anime/genres/', AnimeGenresView.as_view(), name='anime-genres'),
+    
+    # Prometheus metrics
+    path('metrics', metrics, name='metrics'),
     
     # User preferences endpoint
     path('user/preferences/', UserPreferencesView.as_view(), name='user-preferences'),